@@ -1,6 +1,6 @@
 {  
     "name": "Tu Pedido v2 - Sistema Comidas Rápidas",  
-    "version": "2.3.0",
+    "version": "2.4.0",
     "summary": "Sistema completo de gestión de pedidos con notificaciones en tiempo real",
     "description": """
     Sistema completo de gestión de pedidos para restaurantes de comida rápida.
@@ -21,6 +21,7 @@
     "depends": ["sale", "website_sale", "portal", "point_of_sale", "pos_restaurant"],
     "data": [  
         "security/ir.model.access.csv",
+        "data/ir_cron.xml",
         "views/sale_order_views.xml",
         "views/dashboard_action.xml",
         "views/pos_notifications_views.xml",
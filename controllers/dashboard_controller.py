@@ -1,235 +1,173 @@
 from odoo import http, fields
 from odoo.http import request
+from odoo.osv import expression
 import json
 from datetime import datetime, timedelta
 import logging
+from psycopg2 import errors as pg_errors
+
+from ..models.sale_order import ESTADOS_COCINA_ACTIVOS
 
 _logger = logging.getLogger(__name__)
 
+ESTADOS_DASHBOARD = [
+    ('nuevo', 'Nuevo'),
+    ('aceptado', 'Aceptado'), 
+    ('preparacion', 'En Preparación'),
+    ('terminado', 'Terminado'),
+    ('despachado', 'Despachado/Retirado'),
+    ('rechazado', 'Rechazado')
+]
+
+DOMINIO_VENTA_ACTIVO = [
+    ('estado_rapido', 'in', ESTADOS_COCINA_ACTIVOS)
+]
+
+DOMINIO_POS_ACTIVO = [
+    ('enviado_a_cocina', '=', True),
+    ('estado_rapido', 'in', ESTADOS_COCINA_ACTIVOS)
+]
+
+# Revisiones del dashboard: más allá de esta brecha se reenvía el tablero completo
+MAX_BRECHA_REVISION = timedelta(minutes=10)
+MARGEN_REVISION = timedelta(seconds=30)
+
 class PedidoDashboardController(http.Controller):
 
     # Ruta HTTP eliminada - se usa solo client action
     
     @http.route('/tu_pedido_v2/dashboard_data', type='json', auth='user')
-    def dashboard_data(self):
-        # Obtener todos los pedidos activos (sin filtro de fecha)
-        pedidos_venta = request.env['sale.order'].sudo().search([
-            ('estado_rapido', '!=', False),
-            ('estado_rapido', '!=', 'entregado'),
-            ('estado_rapido', '!=', 'rechazado')
-        ])
-        
-        # Corregir pedidos sin estado que tienen tracking en nota_cocina
-        pedidos_sin_estado = request.env['sale.order'].sudo().search([
-            ('estado_rapido', '=', False),
-            ('nota_cocina', 'ilike', '[REF:')
-        ])
-        
-        for pedido in pedidos_sin_estado:
-            pedido.write({
-                'estado_rapido': 'nuevo',
-                'tiempo_inicio_estado': datetime.now(),
-                'tiempo_inicio_total': datetime.now(),
-                'sonido_activo': True
-            })
-        
-        # Corregir pedidos web sin estado
-        pedidos_web_sin_estado = request.env['sale.order'].sudo().search([
-            ('website_id', '!=', False),
-            ('estado_rapido', '=', False),
-            ('state', '=', 'sale')
-        ])
-        
-        for pedido in pedidos_web_sin_estado:
-            pedido.write({
-                'estado_rapido': 'nuevo',
-                'tiempo_inicio_estado': datetime.now(),
-                'tiempo_inicio_total': datetime.now(),
-                'sonido_activo': True
-            })
-            pedido._detectar_tipo_entrega()
-        
-        # Volver a buscar incluyendo los corregidos
-        pedidos_venta = request.env['sale.order'].sudo().search([
-            ('estado_rapido', '!=', False),
-            ('estado_rapido', '!=', 'entregado'),
-            ('estado_rapido', '!=', 'rechazado')
-        ])
-        
-        # Logs de depuración removidos para producción
-        
-        # Debug logs removidos para producción
-        
-        # Obtener pedidos PoS enviados a cocina
-        pedidos_pos = request.env['pos.order'].sudo().search([
-            ('enviado_a_cocina', '=', True),
-            ('estado_rapido', '!=', False),
-            ('estado_rapido', '!=', 'entregado'),
-            ('estado_rapido', '!=', 'rechazado')
-        ]) if 'pos.order' in request.env else request.env['pos.order'].sudo().browse([])
-        
-        # Debug logs removidos para producción
-        
-        estados = [
-            ('nuevo', 'Nuevo'),
-            ('aceptado', 'Aceptado'), 
-            ('preparacion', 'En Preparación'),
-            ('terminado', 'Terminado'),
-            ('despachado', 'Despachado/Retirado'),
-            ('rechazado', 'Rechazado')
+    def dashboard_data(self, revision=None, limite=None, despues=None):
+        """Datos del dashboard de cocina.
+
+        Sin ``revision`` (primera carga) o cuando la revisión recibida es demasiado
+        antigua se devuelve el tablero completo. En otro caso solo se devuelven los
+        pedidos creados o modificados desde esa revisión y los que salieron del
+        tablero, junto con la nueva revisión que el cliente debe reenviar.
+
+        El tablero completo llega por páginas de hasta ``limite`` pedidos por modelo
+        (200 como máximo), ordenados por entrada a cocina ``(tiempo_inicio_total, id)``
+        descendente. Los pedidos pendientes se listan siempre; los despachados solo
+        dentro de la ventana de cocina. ``siguiente`` trae el cursor de cada
+        modelo (``venta`` y ``pos``, ``false`` si no hay más); se envía como
+        ``despues`` para recibir la página siguiente en ``orders``.
+
+        Es de solo lectura: la normalización de pedidos la hacen los hooks de
+        sale.order y el cron ``_cron_normalizar_pedidos_cocina``.
+        """
+        serializer = request.env['tu_pedido.dashboard.serializer'].sudo()
+        limite = serializer.limite_listado(limite)
+
+        if despues:
+            tarjetas, siguiente = self._pagina_tarjetas(DOMINIO_VENTA_ACTIVO, DOMINIO_POS_ACTIVO, limite, despues)
+            result = {'completo': False, 'orders': tarjetas, 'removed': [], 'siguiente': siguiente}
+        else:
+            nueva_revision = fields.Datetime.to_string(request.env.cr.now())
+            desde = self._parse_revision(revision)
+            result = self._cambios_dashboard(desde, limite) if desde is not None else None
+            if result is None:
+                result = self._columnas_dashboard(limite)
+            result['revision'] = nueva_revision
+        result['canal'] = request.env['sale.order']._canal_cocina(request.env.company.id)
+        # Reloj del servidor para que el cliente calcule los minutos de cada tarjeta
+        result['server_time'] = serializer.marca_tiempo(fields.Datetime.now())
+        return result
+
+    def _parse_revision(self, revision):
+        """Convertir la revisión del cliente en fecha, o None si hay que enviar todo"""
+        if not revision:
+            return None
+        try:
+            desde = fields.Datetime.to_datetime(revision)
+        except (TypeError, ValueError):
+            return None
+        if not desde or request.env.cr.now() - desde > MAX_BRECHA_REVISION:
+            return None
+        # Margen para no perder escrituras de transacciones que confirmaron
+        # después de generar la revisión anterior
+        return desde - MARGEN_REVISION
+
+    def _pagina_tarjetas(self, dominio_venta, dominio_pos, limite, despues=None):
+        """Una página de tarjetas de cada modelo y el cursor de la siguiente.
+
+        Sin ``despues`` se lee la primera página de ambos modelos; con ``despues``
+        solo los modelos cuyo cursor no es ``false``.
+        """
+        serializer = request.env['tu_pedido.dashboard.serializer'].sudo()
+        tarjetas = []
+        siguiente = {}
+        # Pedidos de venta primero y luego los PoS dentro de cada columna
+        for clave, tarjetas_modelo, dominio in (
+            ('venta', serializer.tarjetas_venta, dominio_venta),
+            ('pos', serializer.tarjetas_pos, dominio_pos),
+        ):
+            cursor = despues.get(clave) if despues else None
+            if despues and not cursor:
+                siguiente[clave] = False
+                continue
+            pagina = tarjetas_modelo(dominio, limite, cursor)
+            tarjetas += pagina
+            siguiente[clave] = serializer.cursor_tarjeta(pagina[-1]) if len(pagina) == limite else False
+        return tarjetas, siguiente
+
+    def _columnas_dashboard(self, limite):
+        """Primera página del tablero completo agrupada por estado"""
+        serializer = request.env['tu_pedido.dashboard.serializer'].sudo()
+        tarjetas, siguiente = self._pagina_tarjetas(DOMINIO_VENTA_ACTIVO, DOMINIO_POS_ACTIVO, limite)
+        return {
+            'completo': True,
+            'columns': serializer.agrupar_por_estado(tarjetas, ESTADOS_DASHBOARD),
+            'siguiente': siguiente,
+        }
+
+    def _cambios_dashboard(self, desde, limite):
+        """Pedidos tocados desde ``desde``: los del tablero como tarjeta, el resto como eliminados.
+
+        Se informa como eliminado todo pedido que pasó por cocina y ya no cumple
+        el dominio del tablero (entregado, rechazado, cancelado o fuera de la
+        ventana), más los eliminados y retirados de cocina que anota
+        ``tu_pedido.baja.cocina``. Devuelve None si los cambios no caben en una
+        página: el cliente recibe entonces el tablero completo.
+        """
+        serializer = request.env['tu_pedido.dashboard.serializer'].sudo()
+        ventana = serializer.ventana_cocina()
+        dominio_tocado = [('write_date', '>=', desde)]
+        # Despachados que salieron de la ventana de cocina sin escribirse desde ``desde``
+        dominio_vencido = [
+            ('estado_rapido', '=', 'despachado'),
+            ('tiempo_inicio_total', '<', ventana),
+            ('tiempo_inicio_total', '>=', ventana - (request.env.cr.now() - desde)),
         ]
-        
-        columnas = []
-        for estado_key, estado_nombre in estados:
-            orders_data = []
-            
-            # Procesar pedidos de venta
-            ordenes_venta = pedidos_venta.filtered(lambda p: p.estado_rapido == estado_key)
-            for orden in ordenes_venta:
-                # Verificar delivery para pedidos terminados
-                if estado_key == 'terminado' and hasattr(orden, 'es_para_envio'):
-                    orden._detectar_tipo_entrega()
-                
-                productos = self._get_productos_sale_order(orden)
-                
-                # Forzar detección de tipo de entrega si no se ha hecho
-                if hasattr(orden, 'es_para_envio') and not orden.es_para_envio and not getattr(orden, 'direccion_entrega_completa', ''):
-                    orden._detectar_tipo_entrega()
-                
-                # Verificar cancelación de sale.order y PoS correspondiente
-                is_cancelled = orden.state == 'cancel'
-                motivo_cancelacion = ''
-                
-                # Verificar si hay nota de cancelación en nota_cocina
-                if '[CANCELADO]' in (orden.nota_cocina or ''):
-                    is_cancelled = True
-                    motivo_cancelacion = 'Pedido cancelado desde PoS'
-                elif orden.state == 'cancel':
-                    motivo_cancelacion = 'Pedido cancelado desde Ventas'
-                
-                # Debug para cancelaciones
-                if is_cancelled:
-                    _logger.info(f"DEBUG: Pedido cancelado detectado: {orden.name}, motivo: {motivo_cancelacion}")
-                
-                orders_data.append({
-                    'id': orden.id,
-                    'name': self._format_table_name(orden.name),
-                    'partner_id': [orden.partner_id.id, orden.partner_id.name or 'Cliente'],
-                    'estado_rapido': orden.estado_rapido,
-                    'nota_cocina': getattr(orden, 'nota_cocina', '') or '',
-                    'productos': productos,
-                    'tiempo_estado': orden.tiempo_estado_minutos,
-                    'tiempo_total': orden.tiempo_total_minutos,
-                    'sonido_activo': getattr(orden, 'sonido_activo', False),
-                    'cliente_confirmo_recepcion': getattr(orden, 'cliente_confirmo_recepcion', False),
-                    'tiene_reclamo': getattr(orden, 'tiene_reclamo', False),
-                    'descripcion_reclamo': getattr(orden, 'descripcion_reclamo', '') or '',
-                    'productos_modificados': getattr(orden, 'productos_modificados', False),
-                    'productos_snapshot': bool(getattr(orden, 'productos_snapshot', False)),
-                    'es_para_envio': getattr(orden, 'es_para_envio', False),
-                    'direccion_entrega_completa': getattr(orden, 'direccion_entrega_completa', '') or '',
-                    'pedido_cancelado': is_cancelled,
-                    'motivo_cancelacion': motivo_cancelacion,
-                    'tipo_pedido': 'web' if orden.website_id else 'pos',
-                    'mesa': '',
-                    'comensales': 0,
-                    'create_date': orden.create_date.isoformat() if orden.create_date else datetime.now().isoformat()
-                })
-            
-            # Procesar pedidos PoS si existen
-            if pedidos_pos:
-                # Solo mostrar pedidos en su estado actual, cancelados mantienen su estado pero con indicador
-                ordenes_pos = pedidos_pos.filtered(lambda p: p.estado_rapido == estado_key)
-                
-                for orden in ordenes_pos:
-                    productos = self._get_productos_pos_order(orden)
-                    
-                    # Obtener información de ubicación
-                    mesa_info = ''
-                    if getattr(orden, 'is_delivery', False):
-                        direccion = getattr(orden, 'direccion_delivery', '') or 'Sin dirección'
-                        telefono = getattr(orden, 'telefono_delivery', '') or 'Sin teléfono'
-                        mesa_info = f"📍 {direccion} | 📞 {telefono}"
-                    elif hasattr(orden, 'table_id') and orden.table_id:
-                        mesa_info = f"Mesa {orden.table_id.table_number}"
-                    
-                    # Obtener notas de cocina
-                    nota_cocina = ''
-                    # Nota general de la orden
-                    if hasattr(orden, 'general_note') and orden.general_note:
-                        nota_cocina = orden.general_note
-                    
-                    # Agregar notas de las líneas de productos
-                    line_notes = []
-                    for line in orden.lines:
-                        if hasattr(line, 'customer_note') and line.customer_note:
-                            line_notes.append(f"{line.product_id.name}: {line.customer_note}")
-                        elif hasattr(line, 'note') and line.note:
-                            line_notes.append(f"{line.product_id.name}: {line.note}")
-                    
-                    if line_notes:
-                        if nota_cocina:
-                            nota_cocina += " | " + " | ".join(line_notes)
-                        else:
-                            nota_cocina = " | ".join(line_notes)
-                    
-                    # Determinar el nombre a mostrar: Delivery, Piso Mesa# o tracking_number
-                    display_name = orden.tracking_number  # Por defecto
-                    if getattr(orden, 'is_delivery', False):
-                        display_name = f"🚚 DELIVERY {orden.tracking_number}"
-                    elif hasattr(orden, 'table_id') and orden.table_id:
-                        floor_name = orden.table_id.floor_id.name if orden.table_id.floor_id else 'Piso'
-                        table_num = orden.table_id.table_number
-                        display_name = f"{floor_name} Mesa {table_num}"  # Added space
-                    
-                    orders_data.append({
-                        'id': f'pos_{orden.id}',
-                        'name': display_name,
-                        'partner_id': [orden.partner_id.id if orden.partner_id else 0, orden.partner_id.name if orden.partner_id else 'Cliente PoS'],
-                        'estado_rapido': orden.estado_rapido,
-                        'nota_cocina': nota_cocina,
-                        'productos': productos,
-                        'tiempo_estado': orden.tiempo_estado_minutos,
-                        'tiempo_total': orden.tiempo_total_minutos,
-                        'sonido_activo': orden.sonido_activo,
-                        'cliente_confirmo_recepcion': False,
-                        'tiene_reclamo': False,
-                        'descripcion_reclamo': '',
-                        'productos_modificados': False,
-                        'es_para_envio': getattr(orden, 'is_delivery', False),
-                        'direccion_entrega_completa': getattr(orden, 'direccion_delivery', '') or '',
-                        'pedido_cancelado': orden.state == 'cancel',
-                        'motivo_cancelacion': 'Pedido cancelado desde PoS' if orden.state == 'cancel' else '',
-                        'tipo_pedido': 'pos',
-                        'mesa': mesa_info,
-                        'comensales': getattr(orden, 'customer_count', 0) or 0,
-                        'create_date': orden.create_date.isoformat() if orden.create_date else datetime.now().isoformat()
-                    })
-            
-            columnas.append({
-                'key': estado_key,
-                'title': estado_nombre,
-                'orders': orders_data,
-                'count': len(orders_data)
-            })
-        
-        return {'columns': columnas}
-    
-    def _format_table_name(self, name):
-        """Format table name to separate floor and table number"""
-        if not name:
-            return name
-        
-        # Look for pattern like "TerrazaMesa3" -> "Terraza Mesa 3"
-        import re
-        # Match pattern: letters + "Mesa" + numbers
-        match = re.match(r'^([A-Za-z]+)(Mesa)(\d+)$', name)
-        if match:
-            floor = match.group(1)
-            table_num = match.group(3)
-            return f"{floor} Mesa {table_num}"
-        
-        return name
+
+        orders_data, siguiente = self._pagina_tarjetas(
+            dominio_tocado + DOMINIO_VENTA_ACTIVO, dominio_tocado + DOMINIO_POS_ACTIVO, limite,
+        )
+        removidos = {}
+        # Pedidos que pasaron por cocina: en PoS, estado_rapido vale 'nuevo' por
+        # defecto y solo cuentan los enviados a cocina
+        for clave, modelo, dominio_tablero, dominio_cocina in (
+            ('venta', 'sale.order', DOMINIO_VENTA_ACTIVO, [('estado_rapido', '!=', False)]),
+            ('pos', 'pos.order', DOMINIO_POS_ACTIVO, [('enviado_a_cocina', '=', True)]),
+        ):
+            fuera_del_tablero = ['!'] + expression.normalize_domain(
+                dominio_tablero + serializer.dominio_ventana(ventana)
+            )
+            dominio_fuera = expression.AND([
+                dominio_cocina,
+                expression.OR([expression.AND([dominio_tocado, fuera_del_tablero]), dominio_vencido]),
+            ])
+            removidos[clave] = request.env[modelo].sudo().search(dominio_fuera, limit=limite).ids
+        bajas = request.env['tu_pedido.baja.cocina'].sudo()._tarjetas_desde(desde, limite)
+        if (any(siguiente.values()) or len(bajas) == limite
+                or any(len(ids) == limite for ids in removidos.values())):
+            return None
+        removed = removidos['venta'] + [f'pos_{pos_id}' for pos_id in removidos['pos']] + bajas
+
+        return {
+            'completo': False,
+            'orders': orders_data,
+            'removed': removed,
+        }
     
     def _check_pos_cancellation(self, sale_order):
         """Check if corresponding PoS order is cancelled"""
@@ -261,50 +199,6 @@ class PedidoDashboardController(http.Controller):
             _logger.info(f"DEBUG: Error checking PoS cancellation: {e}")
             return False
     
-    def _get_productos_sale_order(self, orden):
-        """Obtener productos de sale.order"""
-        productos = []
-        completados = orden.get_productos_completados()
-        
-        for line in orden.order_line:
-            producto_info = {
-                'id': line.id,  # ID de la línea para poder marcarla
-                'name': line.name,  # Usar line.name que contiene el nombre completo con combos
-                'qty': line.product_uom_qty,
-                'uom': line.product_uom.name,
-                'attributes': [],
-                'completado': line.id in completados  # Si está marcado como completado
-            }
-            
-            # Agregar atributos del producto si existen
-            if hasattr(line, 'product_no_variant_attribute_value_ids'):
-                for attr in line.product_no_variant_attribute_value_ids:
-                    producto_info['attributes'].append({
-                        'attribute': attr.attribute_id.name,
-                        'value': attr.name
-                    })
-            if hasattr(line, 'product_template_attribute_value_ids'):
-                for attr in line.product_template_attribute_value_ids:
-                    producto_info['attributes'].append({
-                        'attribute': attr.attribute_id.name,
-                        'value': attr.name
-                    })
-            
-            productos.append(producto_info)
-        return productos
-    
-    def _get_productos_pos_order(self, orden):
-        """Obtener productos de pos.order"""
-        productos = []
-        for line in orden.lines:
-            productos.append({
-                'name': line.product_id.name,
-                'qty': line.qty,
-                'uom': line.product_id.uom_id.name,
-                'attributes': []  # PoS no maneja atributos complejos
-            })
-        return productos
-
     @http.route('/tu_pedido_v2/cambiar_estado', type='json', auth='user')
     def cambiar_estado(self, order_id, nuevo_estado):
         try:
@@ -318,10 +212,79 @@ class PedidoDashboardController(http.Controller):
                 orden = request.env['sale.order'].sudo().browse(order_id)
             
             if orden.exists():
-                orden.action_cambiar_estado(nuevo_estado)
+                if not orden.action_cambiar_estado(nuevo_estado):
+                    return {'success': False, 'message': 'Error al cambiar estado'}
                 return {'success': True, 'message': f'Estado cambiado a {nuevo_estado}'}
             else:
                 return {'success': False, 'message': 'Orden no encontrada'}
+        except pg_errors.SerializationFailure:
+            raise  # Odoo reintenta la petición completa
+        except Exception as e:
+            return {'success': False, 'message': str(e)}
+
+    @http.route('/tu_pedido_v2/cambiar_estado_lote', type='json', auth='user')
+    def cambiar_estado_lote(self, cambios):
+        """Cambiar el estado de varios pedidos en una sola llamada.
+
+        ``cambios`` es una lista de ``{'order_id': 12 | 'pos_5', 'nuevo_estado': ...}``;
+        ``nuevo_estado`` puede ser ``'siguiente'``. Los pedidos se agrupan por modelo
+        y estado destino, y cada grupo se aplica con un solo ``action_cambiar_estado``
+        (todo o nada). Si un grupo falla se reintenta pedido por pedido, de modo que
+        el resultado de cada pedido es el suyo y no el de su grupo.
+        """
+        try:
+            estados_validos = dict(request.env['sale.order']._fields['estado_rapido'].selection)
+            resultados = {}
+            grupos = {}
+            for cambio in cambios or []:
+                order_id = cambio.get('order_id')
+                nuevo_estado = cambio.get('nuevo_estado')
+                if str(order_id).startswith('pos_'):
+                    modelo, real_id = 'pos.order', str(order_id).replace('pos_', '')
+                else:
+                    modelo, real_id = 'sale.order', str(order_id)
+                if not real_id.isdigit():
+                    resultados[order_id] = {'order_id': order_id, 'success': False, 'message': 'Orden no encontrada'}
+                    continue
+                grupos.setdefault(modelo, {})[int(real_id)] = (order_id, nuevo_estado)
+            
+            por_destino = {}
+            for modelo, pedidos in grupos.items():
+                for orden in request.env[modelo].sudo().browse(list(pedidos)).exists():
+                    order_id, nuevo_estado = pedidos.pop(orden.id)
+                    if nuevo_estado == 'siguiente':
+                        nuevo_estado = orden._siguiente_estado_cocina()
+                    if nuevo_estado not in estados_validos:
+                        resultados[order_id] = {'order_id': order_id, 'success': False, 'message': 'Estado no válido'}
+                        continue
+                    clave = (modelo, nuevo_estado)
+                    por_destino.setdefault(clave, [request.env[modelo].sudo().browse(), []])
+                    por_destino[clave][0] |= orden
+                    por_destino[clave][1].append(order_id)
+                for order_id, _nuevo_estado in pedidos.values():
+                    resultados[order_id] = {'order_id': order_id, 'success': False, 'message': 'Orden no encontrada'}
+            
+            for (modelo, nuevo_estado), (ordenes, order_ids) in por_destino.items():
+                if ordenes.action_cambiar_estado(nuevo_estado):
+                    exitos = [True] * len(ordenes)
+                elif len(ordenes) > 1:
+                    exitos = [orden.action_cambiar_estado(nuevo_estado) for orden in ordenes]
+                else:
+                    exitos = [False]
+                for order_id, ok in zip(order_ids, exitos):
+                    resultados[order_id] = {
+                        'order_id': order_id,
+                        'success': bool(ok),
+                        'estado_rapido': nuevo_estado,
+                        'message': f'Estado cambiado a {nuevo_estado}' if ok else 'Error al cambiar estado',
+                    }
+            
+            return {
+                'success': True,
+                'resultados': [resultados[cambio.get('order_id')] for cambio in cambios or [] if cambio.get('order_id') in resultados],
+            }
+        except pg_errors.SerializationFailure:
+            raise  # Odoo reintenta la petición completa
         except Exception as e:
             return {'success': False, 'message': str(e)}
 
@@ -333,7 +296,8 @@ class PedidoDashboardController(http.Controller):
                 real_id = int(order_id.replace('pos_', ''))
                 orden = request.env['pos.order'].sudo().browse(real_id)
                 if orden.exists():
-                    orden.action_cambiar_estado('aceptado')
+                    if not orden.action_cambiar_estado('aceptado'):
+                        return {'success': False, 'message': 'Error al aceptar el pedido'}
                     return {'success': True, 'message': 'Pedido PoS aceptado'}
             else:
                 orden = request.env['sale.order'].sudo().browse(order_id)
@@ -346,6 +310,8 @@ class PedidoDashboardController(http.Controller):
                     return {'success': True, 'message': 'Pedido aceptado'}
             
             return {'success': False, 'message': 'Orden no encontrada'}
+        except pg_errors.SerializationFailure:
+            raise  # Odoo reintenta la petición completa
         except Exception as e:
             return {'success': False, 'message': str(e)}
 
@@ -357,7 +323,8 @@ class PedidoDashboardController(http.Controller):
                 real_id = int(order_id.replace('pos_', ''))
                 orden = request.env['pos.order'].sudo().browse(real_id)
                 if orden.exists():
-                    orden.action_cambiar_estado('rechazado')
+                    if not orden.action_cambiar_estado('rechazado'):
+                        return {'success': False, 'message': 'Error al rechazar el pedido'}
                     return {'success': True, 'message': 'Pedido PoS rechazado'}
             else:
                 orden = request.env['sale.order'].sudo().browse(order_id)
@@ -370,6 +337,8 @@ class PedidoDashboardController(http.Controller):
                     return {'success': True, 'message': 'Pedido rechazado'}
             
             return {'success': False, 'message': 'Orden no encontrada'}
+        except pg_errors.SerializationFailure:
+            raise  # Odoo reintenta la petición completa
         except Exception as e:
             return {'success': False, 'message': str(e)}
 
@@ -392,6 +361,8 @@ class PedidoDashboardController(http.Controller):
                     return {'success': False, 'message': 'Error al cambiar estado'}
             else:
                 return {'success': False, 'message': 'Orden no encontrada'}
+        except pg_errors.SerializationFailure:
+            raise  # Odoo reintenta la petición completa
         except Exception as e:
             return {'success': False, 'message': str(e)}
 
@@ -405,6 +376,8 @@ class PedidoDashboardController(http.Controller):
                 return {'success': True, 'message': 'Pedido enviado a cocina'}
             else:
                 return {'success': False, 'message': 'Pedido no encontrado'}
+        except pg_errors.SerializationFailure:
+            raise  # Odoo reintenta la petición y el reintento encuentra el pedido
         except Exception as e:
             return {'success': False, 'message': str(e)}
 
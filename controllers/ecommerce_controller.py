@@ -1,7 +1,32 @@
 from odoo import http, fields
+from odoo.exceptions import AccessError
 from odoo.http import request
+from odoo.tools import consteq
 from odoo.addons.website_sale.controllers.main import WebsiteSale
+from datetime import timezone
+import hashlib
 import json
+from werkzeug.http import http_date
+
+# Estados de cocina tal como los ve el cliente
+ESTADOS_CLIENTE = {
+    'nuevo': {'nombre': 'Recibido', 'progreso': 10, 'descripcion': 'Tu pedido ha sido recibido'},
+    'aceptado': {'nombre': 'Confirmado', 'progreso': 25, 'descripcion': 'Tu pedido ha sido confirmado'},
+    'preparacion': {'nombre': 'En Preparación', 'progreso': 50, 'descripcion': 'Estamos preparando tu pedido'},
+    'terminado': {'nombre': 'Listo', 'progreso': 75, 'descripcion': 'Tu pedido está listo'},
+    'despachado': {'nombre': 'Despachado', 'progreso': 90, 'descripcion': 'Tu pedido ha sido despachado'},
+    'entregado': {'nombre': 'Entregado', 'progreso': 100, 'descripcion': 'Pedido entregado exitosamente'},
+    'rechazado': {'nombre': 'Rechazado', 'progreso': 0, 'descripcion': 'Lo sentimos, tu pedido fue rechazado'}
+}
+ESTADO_CLIENTE_DESCONOCIDO = {'nombre': 'Desconocido', 'progreso': 0, 'descripcion': 'Estado desconocido'}
+
+# Cache-Control de las APIs de seguimiento. Con el access_token en la URL la respuesta
+# es la misma para cualquiera que la pida y puede guardarla un proxy o CDN ('public');
+# sin token depende de la sesión del usuario y queda en su navegador ('private').
+# El estado se reutiliza unos segundos; las líneas pueden cambiar después de confirmar
+# y se revalidan siempre con ETag
+CACHE_ESTADO_PEDIDO = 'max-age=10'
+CACHE_LINEAS_PEDIDO = 'no-cache'
 
 class EcommerceController(http.Controller):
 
@@ -24,42 +49,39 @@ class EcommerceController(http.Controller):
             }
 
     @http.route('/tu_pedido_v2/estado_pedido/<int:order_id>', type='json', auth='public')
-    def estado_pedido(self, order_id):
-        """API para que el cliente consulte el estado de su pedido"""
+    def estado_pedido(self, order_id, access_token=None):
+        """API para que el cliente consulte el estado de su pedido.
+
+        Requiere el ``access_token`` del pedido como las APIs de seguimiento; al ser
+        JSON-RPC (POST) no es cacheable: las páginas que consultan seguido deben usar
+        ``/estado`` y ``/productos``.
+        """
         try:
-            order = request.env['sale.order'].sudo().browse(order_id)
-            if not order.exists():
+            order, _por_token = self._pedido_seguimiento(order_id, access_token)
+            if not order:
                 return {
                     'success': False,
                     'error': 'Pedido no encontrado'
                 }
             
             # Mapear estados para el cliente
-            estados_cliente = {
-                'nuevo': {'nombre': 'Recibido', 'progreso': 10, 'descripcion': 'Tu pedido ha sido recibido'},
-                'aceptado': {'nombre': 'Confirmado', 'progreso': 25, 'descripcion': 'Tu pedido ha sido confirmado'},
-                'preparacion': {'nombre': 'En Preparación', 'progreso': 50, 'descripcion': 'Estamos preparando tu pedido'},
-                'terminado': {'nombre': 'Listo', 'progreso': 75, 'descripcion': 'Tu pedido está listo'},
-                'despachado': {'nombre': 'Despachado', 'progreso': 90, 'descripcion': 'Tu pedido ha sido despachado'},
-                'entregado': {'nombre': 'Entregado', 'progreso': 100, 'descripcion': 'Pedido entregado exitosamente'},
-                'rechazado': {'nombre': 'Rechazado', 'progreso': 0, 'descripcion': 'Lo sentimos, tu pedido fue rechazado'}
-            }
-            
-            estado_actual = estados_cliente.get(order.estado_rapido, {
-                'nombre': 'Desconocido', 
-                'progreso': 0, 
-                'descripcion': 'Estado desconocido'
-            })
+            estado_actual = ESTADOS_CLIENTE.get(order.estado_rapido, ESTADO_CLIENTE_DESCONOCIDO)
             
+            serializer = request.env['tu_pedido.dashboard.serializer'].sudo()
+            ahora = fields.Datetime.now()
+            inicio = order.tiempo_inicio_total
             return {
                 'success': True,
+                'server_time': serializer.marca_tiempo(ahora),
                 'pedido': {
                     'id': order.id,
                     'nombre': order.name,
                     'cliente': order.partner_id.name,
                     'estado_codigo': order.estado_rapido,
                     'estado': estado_actual,
-                    'tiempo_transcurrido': order.tiempo_total_minutos,
+                    'tiempo_inicio_total': serializer.marca_tiempo(inicio),
+                    # Compatibilidad: los clientes nuevos calculan los minutos con tiempo_inicio_total y server_time
+                    'tiempo_transcurrido': int((ahora - inicio).total_seconds() // 60) if inicio else 0,
                     'puede_confirmar_recepcion': order.estado_rapido == 'despachado' and not order.cliente_confirmo_recepcion,
                     'productos': [{
                         'nombre': line.product_id.name,
@@ -74,6 +96,111 @@ class EcommerceController(http.Controller):
                 'error': str(e)
             }
 
+    @http.route('/tu_pedido_v2/estado_pedido/<int:order_id>/estado', type='http', auth='public', methods=['GET'])
+    def estado_pedido_ligero(self, order_id, access_token=None):
+        """Solo el estado del pedido, para las páginas de seguimiento que consultan seguido.
+
+        Requiere el ``access_token`` del pedido, como el portal, salvo para usuarios con
+        acceso de lectura. Lee pocos campos sin recorrer líneas y responde con ``ETag``,
+        ``Last-Modified`` y un ``Cache-Control`` corto, público cuando se accede con
+        el token, de modo que el navegador o un proxy resuelvan la mayoría de las
+        consultas. Los minutos se calculan con
+        ``tiempo_inicio_total`` y la cabecera ``Date`` de la respuesta.
+        """
+        try:
+            order, por_token = self._pedido_seguimiento(order_id, access_token)
+            if not order:
+                return self._respuesta_no_encontrado()
+            pedido = order.read([
+                'estado_rapido', 'tiempo_inicio_total', 'cliente_confirmo_recepcion', 'write_date',
+            ])[0]
+            estado = ESTADOS_CLIENTE.get(pedido['estado_rapido'], ESTADO_CLIENTE_DESCONOCIDO)
+            datos = {
+                'id': pedido['id'],
+                'estado_codigo': pedido['estado_rapido'],
+                'progreso': estado['progreso'],
+                'tiempo_inicio_total': request.env['tu_pedido.dashboard.serializer'].marca_tiempo(pedido['tiempo_inicio_total']),
+                'puede_confirmar_recepcion': pedido['estado_rapido'] == 'despachado' and not pedido['cliente_confirmo_recepcion'],
+            }
+            return self._respuesta_cacheable(datos, CACHE_ESTADO_PEDIDO, por_token, pedido['write_date'])
+        except Exception as e:
+            return request.make_response(f'Error: {str(e)}', status=500)
+
+    @http.route('/tu_pedido_v2/estado_pedido/<int:order_id>/productos', type='http', auth='public', methods=['GET'])
+    def productos_pedido(self, order_id, access_token=None):
+        """Líneas del pedido para la página de seguimiento, cacheables por separado del estado.
+
+        Requiere el ``access_token`` del pedido. La cocina puede cambiar las líneas
+        después de confirmar, así que el navegador las revalida siempre con ``ETag``
+        y solo descarga la lista cuando cambió.
+        """
+        try:
+            order, por_token = self._pedido_seguimiento(order_id, access_token)
+            if not order:
+                return self._respuesta_no_encontrado()
+            lineas = request.env['sale.order.line'].sudo().search_read(
+                [('order_id', '=', order.id)], ['product_id', 'product_uom_qty', 'price_unit'],
+            )
+            datos = {
+                'id': order.id,
+                'productos': [{
+                    'nombre': linea['product_id'][1] if linea['product_id'] else '',
+                    'cantidad': linea['product_uom_qty'],
+                    'precio': linea['price_unit'],
+                } for linea in lineas],
+            }
+            return self._respuesta_cacheable(datos, CACHE_LINEAS_PEDIDO, por_token)
+        except Exception as e:
+            return request.make_response(f'Error: {str(e)}', status=500)
+
+    def _pedido_seguimiento(self, order_id, access_token=None):
+        """Pedido (en sudo) si quien consulta tiene su ``access_token`` o puede leerlo;
+        si no, un recordset vacío, igual que para un pedido inexistente.
+
+        Devuelve también si el acceso fue por token: solo esas respuestas pueden
+        guardarse en cachés compartidas.
+        """
+        order = request.env['sale.order'].sudo().browse(order_id).exists()
+        if not order:
+            return order, False
+        if access_token and order.access_token and consteq(order.access_token, str(access_token)):
+            return order, True
+        try:
+            order.with_user(request.env.user).check_access('read')
+        except AccessError:
+            return order.browse(), False
+        return order, False
+
+    def _respuesta_no_encontrado(self):
+        return request.make_response(json.dumps({'error': 'Pedido no encontrado'}), headers=[
+            ('Content-Type', 'application/json'), ('Cache-Control', 'no-store'),
+        ], status=404)
+
+    def _respuesta_cacheable(self, datos, cache_control, publica, ultima_modificacion=None):
+        """Respuesta JSON con ``ETag`` (y ``Last-Modified`` si se indica); 304 sin
+        cuerpo cuando la petición condicional coincide. ``publica`` permite guardarla
+        en cachés compartidas"""
+        cuerpo = json.dumps(datos, sort_keys=True)
+        huella = hashlib.sha1(cuerpo.encode('utf-8')).hexdigest()
+        cache_control = f"{'public' if publica else 'private'}, {cache_control}"
+        cabeceras = [('ETag', f'"{huella}"'), ('Cache-Control', cache_control)]
+        if ultima_modificacion:
+            ultima_modificacion = ultima_modificacion.replace(microsecond=0)
+            cabeceras.append(('Last-Modified', http_date(ultima_modificacion.replace(tzinfo=timezone.utc))))
+        
+        peticion = request.httprequest
+        if peticion.if_none_match:
+            no_modificado = peticion.if_none_match.contains(huella)
+        else:
+            modificado_desde = peticion.if_modified_since
+            no_modificado = bool(
+                ultima_modificacion and modificado_desde
+                and ultima_modificacion <= modificado_desde.replace(tzinfo=None)
+            )
+        if no_modificado:
+            return request.make_response('', headers=cabeceras, status=304)
+        return request.make_response(cuerpo, headers=[('Content-Type', 'application/json')] + cabeceras)
+
     @http.route('/tu_pedido_v2/confirmar_recepcion/<int:order_id>', type='json', auth='public')
     def confirmar_recepcion(self, order_id):
         """API para que el cliente confirme que recibió su pedido"""
@@ -1,170 +1,58 @@
 from odoo import http
 from odoo.http import request
+import hashlib
 import json
 
 class PosNotificationsController(http.Controller):
     
-    def _format_table_name(self, name):
-        """Formatear nombre de mesa para separar piso y número"""
-        if not name:
-            return name
-        
-        import re
-        # Buscar patrón: letras + "Mesa" + números
-        match = re.match(r'^([A-Za-z]+)(Mesa)(\d+)$', name)
-        if match:
-            floor = match.group(1)
-            table_num = match.group(3)
-            return f"{floor} Mesa {table_num}"
-        
-        return name
+    @http.route('/tu_pedido_v2/pos_feed', type='http', auth='user', methods=['GET'])
+    def pos_feed(self, session_id=None):
+        """Notificaciones del PoS en una sola llamada: ``{"delivery": [...], "pickup": [...], "web": [...]}``.
+
+        Con ``session_id`` los pedidos web indican si la terminal ya los vio. Responde
+        con ``ETag``; si coincide con el ``If-None-Match`` recibido devuelve 304 sin cuerpo.
+        """
+        try:
+            session_id = int(session_id) if session_id and str(session_id).isdigit() else None
+            feed = request.env['tu_pedido.dashboard.serializer'].sudo().feed_pos(session_id)
+            cuerpo = json.dumps(feed, sort_keys=True)
+            huella = hashlib.sha1(cuerpo.encode('utf-8')).hexdigest()
+            cabeceras = [('ETag', f'"{huella}"'), ('Cache-Control', 'no-cache')]
+            if request.httprequest.if_none_match.contains(huella):
+                return request.make_response('', headers=cabeceras, status=304)
+            return request.make_response(cuerpo, headers=[('Content-Type', 'application/json')] + cabeceras)
+        except Exception as e:
+            return request.make_response(f'Error: {str(e)}', status=500)
 
     @http.route('/tu_pedido_v2/pos_delivery_notifications', type='json', auth='user')
     def get_pos_delivery_notifications(self):
-        """Obtener notificaciones de delivery para el PoS"""
-        notifications = []
-        
-        # Buscar pedidos delivery terminados (tanto PoS como Sale)
-        # PoS orders
-        pos_delivery_orders = request.env['pos.order'].sudo().search([
-            ('is_delivery', '=', True),
-            ('estado_rapido', '=', 'terminado')
-        ])
-        
-        for order in pos_delivery_orders:
-            order_name = order.tracking_number or order.name
-            # Formatear nombre si es de mesa
-            if order_name and not order.tracking_number:
-                order_name = self._format_table_name(order_name)
-            
-            notifications.append({
-                'id': f'pos_{order.id}',
-                'order_name': order_name,
-                'cliente': order.partner_id.name if order.partner_id else 'Cliente PoS',
-                'direccion': order.direccion_delivery or 'Sin dirección',
-                'telefono': order.telefono_delivery or 'Sin teléfono',
-                'tipo': 'pos'
-            })
-        
-        # Sale orders (pedidos web)
-        sale_delivery_orders = request.env['sale.order'].sudo().search([
-            ('es_para_envio', '=', True),
-            ('estado_rapido', '=', 'terminado')
-        ])
-        
-        for order in sale_delivery_orders:
-            # Determinar tipo real: web si tiene website_id, pos si tiene tracking en nota_cocina
-            tipo = 'web'
-            if not order.website_id and order.nota_cocina and '[REF:' in order.nota_cocina:
-                tipo = 'pos'
-            
-            order_name = order.name
-            # Formatear nombre si es de mesa (pedidos PoS creados como sale.order)
-            if not order.website_id and order.nota_cocina and '[REF:' in order.nota_cocina:
-                order_name = self._format_table_name(order_name)
-            
-            notifications.append({
-                'id': f'sale_{order.id}',
-                'order_name': order_name,
-                'cliente': order.partner_id.name,
-                'direccion': order.direccion_entrega_completa or 'Sin dirección',
-                'telefono': order.partner_id.phone or order.partner_id.mobile or 'Sin teléfono',
-                'tipo': tipo
-            })
-        
-        return {'notifications': notifications}
+        """Obtener notificaciones de delivery para el PoS (ver ``/tu_pedido_v2/pos_feed``)"""
+        return {'notifications': request.env['tu_pedido.dashboard.serializer'].sudo().feed_pos()['delivery']}
     
     @http.route('/tu_pedido_v2/pos_pickup_notifications', type='json', auth='user')
     def get_pos_pickup_notifications(self):
-        """Obtener notificaciones de pedidos listos para retirar"""
-        notifications = []
-        
-        # Buscar pedidos para retirar terminados (tanto PoS como Sale)
-        # PoS orders
-        pos_pickup_orders = request.env['pos.order'].sudo().search([
-            ('is_delivery', '=', False),
-            ('estado_rapido', '=', 'terminado')
-        ])
-        
-        for order in pos_pickup_orders:
-            order_name = order.tracking_number or order.name
-            # Formatear nombre si es de mesa
-            if order_name and not order.tracking_number:
-                order_name = self._format_table_name(order_name)
-            
-            notifications.append({
-                'id': f'pos_{order.id}',
-                'order_name': order_name,
-                'cliente': order.partner_id.name if order.partner_id else 'Cliente PoS',
-                'telefono': order.telefono_delivery or 'Sin teléfono',
-                'tipo': 'pos'
-            })
-        
-        # Sale orders (pedidos web para retirar)
-        sale_pickup_orders = request.env['sale.order'].sudo().search([
-            ('es_para_envio', '=', False),
-            ('estado_rapido', '=', 'terminado')
-        ])
-        
-        for order in sale_pickup_orders:
-            # Determinar tipo real: web si tiene website_id, pos si tiene tracking en nota_cocina
-            tipo = 'web'
-            if not order.website_id and order.nota_cocina and '[REF:' in order.nota_cocina:
-                tipo = 'pos'
-            
-            order_name = order.name
-            # Formatear nombre si es de mesa (pedidos PoS creados como sale.order)
-            if not order.website_id and order.nota_cocina and '[REF:' in order.nota_cocina:
-                order_name = self._format_table_name(order_name)
-            
-            notifications.append({
-                'id': f'sale_{order.id}',
-                'order_name': order_name,
-                'cliente': order.partner_id.name,
-                'telefono': order.partner_id.phone or order.partner_id.mobile or 'Sin teléfono',
-                'tipo': tipo
-            })
-        
-        return {'notifications': notifications}
+        """Obtener notificaciones de pedidos listos para retirar (ver ``/tu_pedido_v2/pos_feed``)"""
+        return {'notifications': request.env['tu_pedido.dashboard.serializer'].sudo().feed_pos()['pickup']}
     
     @http.route('/tu_pedido_v2/pos_web_notifications', type='json', auth='user')
-    def get_pos_web_notifications(self):
-        """Obtener notificaciones de pedidos web nuevos para el PoS"""
-        notifications = []
-        
-        # Buscar pedidos web no despachados (nuevo, aceptado, preparación, terminado)
-        web_orders = request.env['sale.order'].sudo().search([
-            ('website_id', '!=', False),
-            ('estado_rapido', 'in', ['nuevo', 'aceptado', 'preparacion', 'terminado'])
-        ])
-        
-        for order in web_orders:
-            # Preparar productos
-            productos_resumen = []
-            for line in order.order_line[:3]:
-                productos_resumen.append(f"{line.product_uom_qty}x {line.name}")
-            
-            productos_text = ', '.join(productos_resumen)
-            if len(order.order_line) > 3:
-                productos_text += f" y {len(order.order_line) - 3} más"
-            
-            notifications.append({
-                'id': order.id,
-                'order_name': order.name,
-                'cliente': order.partner_id.name,
-                'telefono': order.partner_id.phone or order.partner_id.mobile or 'Sin teléfono',
-                'direccion': order.direccion_entrega_completa or 'Retiro en local',
-                'es_para_envio': order.es_para_envio,
-                'productos': productos_text,
-                'amount_total': order.amount_total,
-                'create_date': order.create_date.isoformat()
-            })
-            
-            # Marcar como visto para evitar duplicados en la primera carga
-            if order.sonido_activo:
-                order.sonido_activo = False
-        
-        return {'notifications': notifications}
+    def get_pos_web_notifications(self, session_id=None):
+        """Obtener notificaciones de pedidos web para el PoS (solo lectura).
+
+        Lo ya visto por la terminal se confirma con ``/tu_pedido_v2/pos_notificaciones_vistas``.
+        """
+        return {'notifications': request.env['tu_pedido.dashboard.serializer'].sudo().feed_pos(session_id)['web']}
+    
+    @http.route('/tu_pedido_v2/pos_notificaciones_vistas', type='json', auth='user')
+    def pos_notificaciones_vistas(self, session_id, pedido_web_ids):
+        """Confirmar que la terminal vio los pedidos web ``pedido_web_ids``"""
+        try:
+            sesion = request.env['pos.session'].sudo().browse(int(session_id)).exists()
+            if not sesion:
+                return {'success': False, 'message': 'Sesión PoS no encontrada'}
+            vistos = request.env['tu_pedido.notificacion.vista'].sudo()._confirmar_vistos(sesion.id, pedido_web_ids)
+            return {'success': True, 'vistos': vistos}
+        except Exception as e:
+            return {'success': False, 'message': str(e)}
 
     @http.route('/tu_pedido_v2/mark_delivery_dispatched', type='json', auth='user')
     def mark_delivery_dispatched(self):
@@ -1,8 +1,10 @@
-from odoo import http
+from odoo import http, fields
 from odoo.http import request
 import json
 from datetime import datetime
 import logging
+from psycopg2 import errors as pg_errors
+from ..models.product import clasificar_tipo_entrega
 
 _logger = logging.getLogger(__name__)
 
@@ -21,23 +23,12 @@ class PosSimpleController(http.Controller):
             if not tracking_number or not products:
                 return {'success': False, 'message': 'Datos incompletos'}
             
+            referencia = self._referencia_cocina_simple(tracking_number, kwargs.get('session_id'))
+            
             # Verificar si ya fue enviado y manejar modificaciones
-            existing_order = self._buscar_orden_existente_simple(tracking_number)
+            existing_order = self._buscar_orden_existente_simple(referencia)
             if existing_order:
-                print(f"DEBUG: Pedido {tracking_number} ya existe, verificando cambios")
-                actualizado = self._actualizar_orden_desde_boton(existing_order, products, general_note, table_name, tracking_number)
-                if actualizado:
-                    return {
-                        'success': True,
-                        'message': f'Pedido {tracking_number} actualizado',
-                        'order_id': existing_order.id
-                    }
-                else:
-                    return {
-                        'success': True,
-                        'message': f'Pedido {tracking_number} sin cambios',
-                        'order_id': existing_order.id
-                    }
+                return self._responder_orden_existente(existing_order, products, general_note, table_name, tracking_number)
 
             # Ya no necesitamos sesiones
 
@@ -62,11 +53,7 @@ class PosSimpleController(http.Controller):
             
             # Detectar si es delivery por productos
             is_delivery = any(
-                'envio' in product_data.get('name', '').lower() or 
-                'envío' in product_data.get('name', '').lower() or
-                'delivery' in product_data.get('name', '').lower() or
-                'entrega' in product_data.get('name', '').lower() or
-                'estandar' in product_data.get('name', '').lower()
+                clasificar_tipo_entrega(product_data.get('name')) == 'envio'
                 for product_data in products
             )
             
@@ -81,66 +68,20 @@ class PosSimpleController(http.Controller):
                 'state': 'draft',
                 'es_para_envio': is_delivery,
                 'estado_rapido': 'nuevo',  # IMPORTANTE: Establecer estado inicial
+                'referencia_cocina': referencia,
+                'nota_cocina': self._build_kitchen_notes(general_note, products, table_name, tracking_number),  # Incluir tracking para identificación
                 'tiempo_inicio_estado': datetime.now(),
                 'tiempo_inicio_total': datetime.now(),
                 'sonido_activo': True,
             }
 
-            # Crear la orden
-            order = request.env['sale.order'].sudo().create(order_vals)
-            
-            # Actualizar con campos personalizados que existen
-            try:
-                order.write({
-                    'nota_cocina': self._build_kitchen_notes(general_note, products, table_name, tracking_number),  # Incluir tracking para identificación
-                })
-                print(f"DEBUG: Pedido creado con estado_rapido: {order.estado_rapido}")
-            except Exception as e:
-                print(f"DEBUG: Error actualizando campos: {e}")
-
-            # Crear líneas de productos simples
-            for product_data in products:
-                # Buscar producto por nombre exacto
-                product = request.env['product.product'].sudo().search([
-                    ('name', '=', product_data.get('name', ''))
-                ], limit=1)
-                
-                if not product:
-                    # Crear producto con nombre exacto (Problema 2)
-                    product = request.env['product.product'].sudo().create({
-                        'name': product_data.get('name', 'Producto PoS'),
-                        'type': 'consu',
-                        'list_price': 0.0,
-                    })
-
-                # Problema 2: usar el nombre exacto del producto
-                product_name = product_data.get('name', '')
-                product_note = product_data.get('note', '')
-                
-                # Construir nombre con combo items si existen
-                combo_items = product_data.get('combo_items', [])
-                if combo_items:
-                    combo_names = [item.get('name', '') for item in combo_items]
-                    combo_text = f" ({', '.join(combo_names)})"
-                    final_product_name = f"{product_name}{combo_text}"
-                else:
-                    final_product_name = product_name
-                
-                # Agregar nota si existe
-                if product_note:
-                    final_product_name = f"{final_product_name} - {product_note}"
-                
-                line_vals = {
-                    'order_id': order.id,
-                    'product_id': product.id,
-                    'product_uom_qty': product_data.get('qty', 1),
-                    'price_unit': 0.0,
-                    'name': final_product_name,
-                }
-                main_line = request.env['sale.order.line'].sudo().create(line_vals)
+            # Crear la orden, o recuperar la que creó un envío concurrente del mismo ticket
+            order, creado = request.env['sale.order'].sudo()._ingerir_pedido_cocina(order_vals)
+            if not creado:
+                return self._responder_orden_existente(order, products, general_note, table_name, tracking_number)
 
-            # Commit para que aparezca inmediatamente
-            request.env.cr.commit()
+            # Crear líneas de productos en un solo create
+            order._crear_lineas_desde_pos(products)
 
             print(f"DEBUG: Pedido final - es_para_envio: {order.es_para_envio}")
             
@@ -152,9 +93,27 @@ class PosSimpleController(http.Controller):
                 'order_id': order.id
             }
 
+        except pg_errors.SerializationFailure:
+            raise  # Odoo reintenta la petición y el reintento encuentra el pedido
         except Exception as e:
             return {'success': False, 'message': str(e)}
     
+    def _responder_orden_existente(self, existing_order, products, general_note, table_name, tracking_number):
+        """Respuesta para un ticket ya enviado: error si terminó, si no actualizarlo"""
+        if existing_order.estado_rapido in ('entregado', 'rechazado'):
+            return {
+                'success': False,
+                'message': f'Pedido {tracking_number} ya fue finalizado en cocina',
+                'order_id': existing_order.id
+            }
+        print(f"DEBUG: Pedido {tracking_number} ya existe, verificando cambios")
+        actualizado = self._actualizar_orden_desde_boton(existing_order, products, general_note, table_name, tracking_number)
+        return {
+            'success': True,
+            'message': f'Pedido {tracking_number} actualizado' if actualizado else f'Pedido {tracking_number} sin cambios',
+            'order_id': existing_order.id
+        }
+    
     def _pedido_ya_enviado_a_cocina(self, tracking_number, table_name):
         """Verificar si el pedido ya fue enviado a cocina usando pos_reference"""
         try:
@@ -170,13 +129,11 @@ class PosSimpleController(http.Controller):
             if not pos_reference:
                 return False
             
-            # Buscar en sale.order si ya existe con este tracking_number
-            existing_sale_orders = request.env['sale.order'].sudo().search([
-                ('nota_cocina', 'ilike', f'[REF:{tracking_number}]'),  # Buscar identificador único
-                ('estado_rapido', '!=', False)
-            ])
+            # Buscar en sale.order si ya existe con esta referencia de cocina
+            referencia = request.env['sale.order']._formatear_referencia_cocina(pos_order.session_id.id, tracking_number)
+            existing_sale_order = request.env['sale.order']._buscar_por_referencia_cocina(referencia)
             
-            if existing_sale_orders:
+            if existing_sale_order.estado_rapido:
                 print(f"DEBUG: Pedido con tracking {tracking_number} ya existe en dashboard")
                 return True
             
@@ -186,20 +143,39 @@ class PosSimpleController(http.Controller):
             print(f"DEBUG: Error verificando duplicados: {e}")
             return False
     
-    def _buscar_orden_existente_simple(self, tracking_number):
-        """Buscar orden existente por tracking number que permita modificaciones"""
-        return request.env['sale.order'].sudo().search([
-            ('nota_cocina', 'ilike', f'[REF:{tracking_number}]'),
-            ('estado_rapido', 'not in', [False, 'entregado', 'rechazado'])
-        ], limit=1)
+    def _referencia_cocina_simple(self, tracking_number, session_id=None):
+        """Referencia única del pedido en cocina a partir de la sesión PoS y el tracking.
+
+        Siempre devuelve una referencia, para que un envío repetido no cree otro pedido.
+        Clientes PoS anteriores no envían la sesión: se usa la del pos.order con ese
+        tracking, o la sesión abierta del usuario (o cualquiera abierta). Sin sesiones
+        abiertas el tracking se acota al día.
+        """
+        if not session_id:
+            pos_order = request.env['pos.order'].sudo().search([
+                ('tracking_number', '=', tracking_number),
+                ('session_id.state', '!=', 'closed')
+            ], order='id desc', limit=1)
+            session_id = pos_order.session_id.id
+        if not session_id:
+            Session = request.env['pos.session'].sudo()
+            session_id = (
+                Session.search([('state', '=', 'opened'), ('user_id', '=', request.env.uid)], order='id desc', limit=1)
+                or Session.search([('state', '=', 'opened')], order='id desc', limit=1)
+            ).id
+        if not session_id:
+            session_id = f"dia{fields.Date.context_today(request.env.user).strftime('%Y%m%d')}"
+        return request.env['sale.order']._formatear_referencia_cocina(session_id, tracking_number)
+    
+    def _buscar_orden_existente_simple(self, referencia):
+        """Buscar orden existente por referencia de cocina (incluye finalizadas)"""
+        return request.env['sale.order']._buscar_por_referencia_cocina(referencia)
     
     def _actualizar_orden_desde_boton(self, sale_order, products, general_note, table_name, tracking_number):
         """Actualizar orden existente desde el botón"""
         try:
-            # Verificar si hay cambios ANTES de actualizar
-            hay_cambios = self._hay_cambios_productos_boton(sale_order, products)
-            
-            if not hay_cambios:
+            # Aplicar solo las diferencias de líneas; sin diferencias no hay nada que actualizar
+            if not sale_order._aplicar_lineas_cocina(sale_order._vals_lineas_desde_pos(products)):
                 return False  # No hay cambios
             
             print(f"DEBUG: Actualizando pedido {tracking_number} con cambios")
@@ -207,48 +183,6 @@ class PosSimpleController(http.Controller):
             # Si el pedido ya fue aceptado o terminado, marcar como modificado
             if sale_order.estado_rapido not in ['nuevo']:
                 sale_order.write({'productos_modificados': True})
-                request.env.cr.commit()
-            
-            # Eliminar líneas existentes
-            sale_order.order_line.unlink()
-            
-            # Crear nuevas líneas
-            for product_data in products:
-                product = request.env['product.product'].sudo().search([
-                    ('name', '=', product_data.get('name', ''))
-                ], limit=1)
-                
-                if not product:
-                    product = request.env['product.product'].sudo().create({
-                        'name': product_data.get('name', 'Producto PoS'),
-                        'type': 'consu',
-                        'list_price': 0.0,
-                    })
-
-                product_name = product_data.get('name', '')
-                product_note = product_data.get('note', '')
-                
-                # Construir nombre con combo items si existen
-                combo_items = product_data.get('combo_items', [])
-                if combo_items:
-                    combo_names = [item.get('name', '') for item in combo_items]
-                    combo_text = f" ({', '.join(combo_names)})"
-                    final_product_name = f"{product_name}{combo_text}"
-                else:
-                    final_product_name = product_name
-                
-                # Agregar nota si existe
-                if product_note:
-                    final_product_name = f"{final_product_name} - {product_note}"
-                
-                line_vals = {
-                    'order_id': sale_order.id,
-                    'product_id': product.id,
-                    'product_uom_qty': product_data.get('qty', 1),
-                    'price_unit': 0.0,
-                    'name': final_product_name,
-                }
-                main_line = request.env['sale.order.line'].sudo().create(line_vals)
             
             # Actualizar notas
             sale_order.write({
@@ -262,32 +196,6 @@ class PosSimpleController(http.Controller):
             print(f"DEBUG: Error actualizando desde botón: {e}")
             return False
     
-    def _hay_cambios_productos_boton(self, sale_order, products):
-        """Verificar cambios desde el botón"""
-        try:
-            # Hash de productos del botón
-            button_hash = []
-            for product in products:
-                name = product.get('name', '')
-                note = product.get('note', '')
-                full_name = f"{name} - {note}" if note else name
-                item = f"{name}|{product.get('qty', 1)}|{full_name}"
-                button_hash.append(item)
-            button_hash.sort()
-            
-            # Hash de productos existentes
-            sale_hash = []
-            for line in sale_order.order_line:
-                if not line.name.startswith('  →'):
-                    item = f"{line.product_id.name}|{int(line.product_uom_qty)}|{line.name}"
-                    sale_hash.append(item)
-            sale_hash.sort()
-            
-            return button_hash != sale_hash
-            
-        except Exception as e:
-            return True
-    
     def _build_kitchen_notes(self, general_note, products, table_name, tracking_number):
         """Construir notas de cocina completas con identificador único"""
         notes = []
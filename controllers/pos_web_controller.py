@@ -1,6 +1,8 @@
-from odoo import http
+from odoo import http, fields
 from odoo.http import request
-from datetime import datetime, timedelta
+
+from ..models.sale_order import ESTADOS_COCINA_ACTIVOS
+from ..models.dashboard_serializer import ORDEN_LISTADO_COCINA
 
 class PosWebController(http.Controller):
 
@@ -8,13 +10,13 @@ class PosWebController(http.Controller):
     def pedidos_web_activos(self):
         """Obtener pedidos web activos para mostrar en PoS"""
         try:
+            serializer = request.env['tu_pedido.dashboard.serializer']
             # Buscar pedidos web activos (no entregados ni rechazados)
             pedidos = request.env['sale.order'].sudo().search([
                 ('website_id', '!=', False),  # Solo pedidos web
-                ('estado_rapido', 'not in', ['entregado', 'rechazado']),
+                ('estado_rapido', 'in', ESTADOS_COCINA_ACTIVOS),
                 ('state', '=', 'sale'),  # Solo confirmados
-                ('create_date', '>=', datetime.now() - timedelta(hours=12))  # Últimas 12 horas
-            ], order='create_date desc', limit=10)
+            ] + serializer.dominio_ventana(), order=ORDEN_LISTADO_COCINA, limit=10)  # Despachados: solo dentro de la ventana de cocina
 
             pedidos_data = []
             for pedido in pedidos:
@@ -39,13 +41,14 @@ class PosWebController(http.Controller):
                     'total_productos': len(pedido.order_line),
                     'amount_total': pedido.amount_total,
                     'create_date': pedido.create_date.isoformat(),
-                    'tiempo_transcurrido': pedido.tiempo_total_minutos
+                    'tiempo_inicio_total': serializer.marca_tiempo(pedido.tiempo_inicio_total),
                 })
 
             return {
                 'success': True,
                 'pedidos': pedidos_data,
-                'count': len(pedidos_data)
+                'count': len(pedidos_data),
+                'server_time': serializer.marca_tiempo(fields.Datetime.now()),
             }
 
         except Exception as e:
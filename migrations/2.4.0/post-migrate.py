@@ -0,0 +1,142 @@
+import json
+import logging
+
+from odoo import SUPERUSER_ID, api
+
+from odoo.addons.tu_pedido_v2.models.sale_order import (
+    ESTADOS_COCINA_ACTIVOS, ESTADOS_SNAPSHOT_COCINA, hash_linea_cocina,
+)
+
+_logger = logging.getLogger(__name__)
+
+
+def migrate(cr, version):
+    rellenar_referencia_cocina(cr)
+    migrar_snapshots_productos(cr)
+    rellenar_etiquetas_cocina(cr)
+    resumir_historial_archivado(cr)
+    sincronizar_analytics(cr)
+
+
+def rellenar_referencia_cocina(cr):
+    """Rellenar referencia_cocina desde las etiquetas [REF:tracking] de nota_cocina.
+
+    El tracking se reinicia en cada sesión PoS, así que la sesión se toma del
+    pos.order con ese tracking cuya sesión estaba abierta al crear el pedido.
+    Si varios pedidos quedan con la misma referencia se conserva el más reciente.
+    """
+    cr.execute(r"""
+        WITH etiquetas AS (
+            SELECT so.id, so.create_date,
+                   (regexp_match(so.nota_cocina, '\[REF:([^\]]+)\]'))[1] AS tracking
+              FROM sale_order so
+             WHERE so.referencia_cocina IS NULL
+               AND so.nota_cocina LIKE '%[REF:%'
+        ), por_pedido AS (
+            SELECT DISTINCT ON (e.id) e.id, ps.id || '-' || e.tracking AS referencia
+              FROM etiquetas e
+              JOIN pos_order po ON po.tracking_number = e.tracking
+              JOIN pos_session ps ON ps.id = po.session_id
+             WHERE ps.start_at <= e.create_date
+               AND (ps.stop_at IS NULL OR ps.stop_at >= e.create_date)
+          ORDER BY e.id, po.id DESC
+        ), por_referencia AS (
+            SELECT DISTINCT ON (referencia) id, referencia
+              FROM por_pedido
+          ORDER BY referencia, id DESC
+        )
+        UPDATE sale_order so
+           SET referencia_cocina = r.referencia
+          FROM por_referencia r
+         WHERE so.id = r.id
+           AND NOT EXISTS (SELECT 1 FROM sale_order o WHERE o.referencia_cocina = r.referencia)
+    """)
+    _logger.info("referencia_cocina rellenada en %s pedidos", cr.rowcount)
+
+
+def migrar_snapshots_productos(cr):
+    """Pasar el JSON de ``productos_snapshot`` a filas de ``tu_pedido.snapshot.linea``.
+
+    Solo importa el snapshot de los pedidos que la cocina sigue controlando; cada
+    producto se asocia a la línea actual con el mismo producto y nombre, y los que
+    ya no tienen línea quedan como eliminados. Después se borra la columna.
+    """
+    cr.execute("""
+        SELECT 1 FROM information_schema.columns
+         WHERE table_name = 'sale_order' AND column_name = 'productos_snapshot'
+    """)
+    if not cr.fetchone():
+        return
+    
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    cr.execute("""
+        SELECT id, productos_snapshot FROM sale_order
+         WHERE productos_snapshot IS NOT NULL AND estado_rapido IN %s
+    """, [ESTADOS_SNAPSHOT_COCINA])
+    vals_list = []
+    for order_id, snapshot in cr.fetchall():
+        try:
+            productos = json.loads(snapshot)
+        except ValueError:
+            continue
+        lineas = {}
+        for line in env['sale.order.line'].search([('order_id', '=', order_id)]):
+            lineas.setdefault((line.product_id.id, line.name), []).append(line.id)
+        for producto in productos:
+            candidatas = lineas.get((producto.get('product_id'), producto.get('name')))
+            vals_list.append({
+                'pedido_id': order_id,
+                'version': 1,
+                'linea_id': candidatas.pop(0) if candidatas else 0,
+                'huella': hash_linea_cocina(producto.get('product_id'), producto.get('product_uom_qty'), producto.get('name')),
+                'product_id': producto.get('product_id'),
+                'name': producto.get('name'),
+                'product_uom_qty': producto.get('product_uom_qty') or 0,
+                'price_unit': producto.get('price_unit') or 0,
+            })
+    productos_existentes = set(env['product.product'].with_context(active_test=False).browse(
+        {vals['product_id'] for vals in vals_list if vals['product_id']}
+    ).exists().ids)
+    for vals in vals_list:
+        if vals['product_id'] not in productos_existentes:
+            vals['product_id'] = False
+    filas = env['tu_pedido.snapshot.linea'].create(vals_list)
+    cr.execute("""
+        UPDATE sale_order SET snapshot_version = 1
+         WHERE productos_snapshot IS NOT NULL AND estado_rapido IN %s
+    """, [ESTADOS_SNAPSHOT_COCINA])
+    cr.execute("ALTER TABLE sale_order DROP COLUMN productos_snapshot")
+    _logger.info("productos_snapshot migrado a %s filas de tu_pedido.snapshot.linea", len(filas))
+
+
+def rellenar_etiquetas_cocina(cr):
+    """Calcular ``etiqueta_cocina`` de los pedidos activos (el historial queda vacío
+    y los serializadores usan el nombre como respaldo)."""
+    cr.execute(r"""
+        UPDATE sale_order
+           SET etiqueta_cocina = regexp_replace(name, '^([A-Za-z]+)Mesa(\d+)$', '\1 Mesa \2')
+         WHERE etiqueta_cocina IS NULL AND estado_rapido IN %s
+    """, [ESTADOS_COCINA_ACTIVOS])
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['pos.order']._recalcular_etiquetas_cocina([])
+
+
+def resumir_historial_archivado(cr):
+    """Los reportes solo leen el historial activo: sumar al resumen diario el
+    historial que ya estaba archivado antes de existir el resumen.
+    """
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    cr.execute("SELECT 1 FROM tu_pedido_estado_resumen LIMIT 1")
+    if cr.fetchone():
+        return
+    cr.execute(env['tu_pedido.estado.resumen']._sql_resumir(
+        "(SELECT * FROM tu_pedido_estado_historial WHERE NOT active)"
+    ))
+
+
+def sincronizar_analytics(cr):
+    """Las migraciones escriben pedidos por SQL sin pasar por los hooks de cocina:
+    recalcular la tabla de analytics completa con los valores finales.
+    """
+    env = api.Environment(cr, SUPERUSER_ID, {})
+    env['tu_pedido.analytics']._sincronizar_pedidos()
@@ -0,0 +1,61 @@
+def migrate(cr, version):
+    """tu_pedido.analytics pasa de vista SQL a tabla: eliminar la vista anterior"""
+    cr.execute("DROP VIEW IF EXISTS tu_pedido_analytics CASCADE")
+    rellenar_periodos_historial(cr)
+    crear_columnas_etiqueta_cocina(cr)
+    rellenar_entrada_cocina(cr)
+    eliminar_indices_reemplazados(cr)
+
+
+def rellenar_periodos_historial(cr):
+    """Crear y rellenar por SQL las columnas de período del historial de estados.
+
+    Si las columnas existen al actualizar, el ORM no recalcula los campos almacenados
+    registro por registro sobre todo el historial.
+    """
+    cr.execute("""
+        ALTER TABLE tu_pedido_estado_historial
+            ADD COLUMN IF NOT EXISTS active boolean,
+            ADD COLUMN IF NOT EXISTS fecha_dia date,
+            ADD COLUMN IF NOT EXISTS semana_iso varchar,
+            ADD COLUMN IF NOT EXISTS dia_semana varchar
+    """)
+    cr.execute("UPDATE tu_pedido_estado_historial SET active = TRUE WHERE active IS NULL")
+    cr.execute("""
+        UPDATE tu_pedido_estado_historial
+           SET fecha_dia = fecha_cambio::date,
+               semana_iso = to_char(fecha_cambio, 'IYYY-"W"IW'),
+               dia_semana = EXTRACT(isodow FROM fecha_cambio)::integer::text
+         WHERE fecha_dia IS NULL AND fecha_cambio IS NOT NULL
+    """)
+
+
+def crear_columnas_etiqueta_cocina(cr):
+    """Crear vacías las columnas ``etiqueta_cocina`` para que el ORM no las calcule
+    sobre todo el historial de pedidos; la post-migración rellena los activos.
+    """
+    cr.execute("ALTER TABLE sale_order ADD COLUMN IF NOT EXISTS etiqueta_cocina varchar")
+    cr.execute("ALTER TABLE pos_order ADD COLUMN IF NOT EXISTS etiqueta_cocina varchar")
+
+
+def rellenar_entrada_cocina(cr):
+    """Los listados de cocina se ordenan y acotan por ``tiempo_inicio_total``:
+    completarlo en los pedidos de cocina que no lo tienen.
+    """
+    cr.execute("""
+        UPDATE sale_order
+           SET tiempo_inicio_total = COALESCE(tiempo_inicio_estado, create_date)
+         WHERE tiempo_inicio_total IS NULL AND estado_rapido IS NOT NULL
+    """)
+    cr.execute("""
+        UPDATE pos_order
+           SET tiempo_inicio_total = COALESCE(tiempo_inicio_estado, create_date)
+         WHERE tiempo_inicio_total IS NULL AND enviado_a_cocina
+    """)
+
+
+def eliminar_indices_reemplazados(cr):
+    """El índice de pedidos web activos pasa a ordenar por entrada a cocina
+    (``sale_order_tu_pedido_web_entrada_idx``): quitar el anterior.
+    """
+    cr.execute("DROP INDEX IF EXISTS sale_order_tu_pedido_web_activo_idx")
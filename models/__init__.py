@@ -1,7 +1,14 @@
+from . import estado_mixin
 from . import sale_order
+from . import snapshot_linea
 from . import pos_order
+from . import dashboard_serializer
 from . import pos_session
+from . import restaurant
+from . import product
 from . import payment_transaction
 from . import analytics_report
 from . import estado_historial
-from . import tiempo_diario_estado
\ No newline at end of file
+from . import tiempo_diario_estado
+from . import notificacion_vista
+from . import baja_cocina
@@ -1,17 +1,125 @@
 from odoo import models, fields, api, tools
 from datetime import datetime, timedelta
+import functools
 import json
+import threading
+import time
+
+# Caché de métricas en tiempo real compartida por todos los usuarios del proceso,
+# por base de datos, compañía y día: {(db, company_id, fecha): (expira, metricas)}.
+# Solo se invalida en el worker que confirma el cambio; los demás sirven sus
+# métricas hasta que vence el TTL, por eso se mantiene corto y acotado.
+_cache_metricas = {}
+_cache_metricas_lock = threading.Lock()
+_cache_metricas_stats = {'hits': 0, 'misses': 0}
+TTL_METRICAS_DEFECTO = 10
+TTL_METRICAS_MAXIMO = 60
+
+
+def _invalidar_cache_metricas(dbname):
+    """Descartar las métricas en caché de una base de datos"""
+    with _cache_metricas_lock:
+        for clave in [clave for clave in _cache_metricas if clave[0] == dbname]:
+            del _cache_metricas[clave]
+
+# Columnas de la tabla de hechos calculadas a partir de sale_order / pos_order
+COLUMNAS_ANALYTICS = [
+    'fecha', 'hora', 'pedido_nombre', 'cliente_id', 'cliente_nombre',
+    'estado_actual', 'tiempo_preparacion', 'tiempo_total', 'tipo_pedido',
+    'tipo_entrega', 'monto_total', 'cantidad_productos', 'hora_del_dia',
+    'dia_semana', 'mes', 'company_id',
+]
+
+SQL_SINCRONIZAR_VENTAS = """
+    INSERT INTO tu_pedido_analytics (pedido_id, {columnas}, create_uid, create_date, write_uid, write_date)
+    SELECT so.id,
+           DATE(so.create_date),
+           so.create_date,
+           so.name,
+           so.partner_id,
+           rp.name,
+           so.estado_rapido,
+           GREATEST(0, EXTRACT(EPOCH FROM (NOW() AT TIME ZONE 'UTC' - so.tiempo_inicio_estado)) / 60)::integer,
+           GREATEST(0, EXTRACT(EPOCH FROM (NOW() AT TIME ZONE 'UTC' - so.tiempo_inicio_total)) / 60)::integer,
+           CASE WHEN so.website_id IS NOT NULL THEN 'web' ELSE 'pos' END,
+           CASE WHEN so.es_para_envio THEN 'delivery' ELSE 'pickup' END,
+           so.amount_total,
+           COALESCE(lineas.cantidad, 0),
+           EXTRACT(hour FROM so.create_date)::integer,
+           (EXTRACT(isodow FROM so.create_date)::integer - 1)::varchar,
+           EXTRACT(month FROM so.create_date)::integer::varchar,
+           so.company_id,
+           %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+      FROM sale_order so
+      LEFT JOIN res_partner rp ON rp.id = so.partner_id
+      LEFT JOIN (
+            SELECT order_id, COUNT(*) AS cantidad
+              FROM sale_order_line
+             WHERE {filtro_lineas}
+          GROUP BY order_id
+      ) lineas ON lineas.order_id = so.id
+     WHERE so.estado_rapido IS NOT NULL
+       AND {filtro}
+    ON CONFLICT (pedido_id) WHERE pedido_id IS NOT NULL
+    DO UPDATE SET {actualizar}
+"""
+
+SQL_SINCRONIZAR_POS = """
+    INSERT INTO tu_pedido_analytics (pos_order_id, {columnas}, create_uid, create_date, write_uid, write_date)
+    SELECT po.id,
+           DATE(po.date_order),
+           po.date_order,
+           po.name,
+           po.partner_id,
+           rp.name,
+           po.estado_rapido,
+           GREATEST(0, EXTRACT(EPOCH FROM (NOW() AT TIME ZONE 'UTC' - po.tiempo_inicio_estado)) / 60)::integer,
+           GREATEST(0, EXTRACT(EPOCH FROM (NOW() AT TIME ZONE 'UTC' - po.tiempo_inicio_total)) / 60)::integer,
+           'pos',
+           CASE WHEN po.is_delivery THEN 'delivery' ELSE 'pickup' END,
+           po.amount_total,
+           COALESCE(lineas.cantidad, 0),
+           EXTRACT(hour FROM po.date_order)::integer,
+           (EXTRACT(isodow FROM po.date_order)::integer - 1)::varchar,
+           EXTRACT(month FROM po.date_order)::integer::varchar,
+           po.company_id,
+           %(uid)s, NOW() AT TIME ZONE 'UTC', %(uid)s, NOW() AT TIME ZONE 'UTC'
+      FROM pos_order po
+      LEFT JOIN res_partner rp ON rp.id = po.partner_id
+      LEFT JOIN (
+            SELECT order_id, COUNT(*) AS cantidad
+              FROM pos_order_line
+             WHERE {filtro_lineas}
+          GROUP BY order_id
+      ) lineas ON lineas.order_id = po.id
+     WHERE po.estado_rapido IS NOT NULL
+       AND po.enviado_a_cocina
+       AND {filtro}
+    ON CONFLICT (pos_order_id) WHERE pos_order_id IS NOT NULL
+    DO UPDATE SET {actualizar}
+"""
+
 
 class TuPedidoAnalytics(models.Model):
+    """Tabla de hechos de pedidos de cocina.
+
+    Se mantiene de forma incremental: cada transacción que cambia pedidos del
+    tablero reescribe solo sus filas (ver ``sale.order._publicar_eventos_cocina``).
+    Los tiempos quedan congelados en el último cambio del pedido, así que para los
+    entregados reflejan la duración real del pedido. Todo cambio de estado o de
+    los inicios de tiempo pasa por ``write`` y vuelve a sincronizar la fila; lo que
+    se modifique por SQL (migraciones) debe llamar a ``_sincronizar_pedidos``.
+    """
     _name = 'tu_pedido.analytics'
     _description = 'Analytics de Pedidos'
-    _auto = False
     _order = 'fecha desc, hora desc'
 
     # Campos principales
-    fecha = fields.Date(string='Fecha')
+    fecha = fields.Date(string='Fecha', index=True)
     hora = fields.Datetime(string='Hora')
-    pedido_id = fields.Many2one('sale.order', string='Pedido')
+    pedido_id = fields.Many2one('sale.order', string='Pedido', ondelete='cascade')
+    pos_order_id = fields.Many2one('pos.order', string='Pedido PoS', ondelete='cascade')
+    company_id = fields.Many2one('res.company', string='Compañía', index=True)
     pedido_nombre = fields.Char(string='Número Pedido')
     cliente_id = fields.Many2one('res.partner', string='Cliente')
     cliente_nombre = fields.Char(string='Cliente')
@@ -39,7 +147,7 @@ class TuPedidoAnalytics(models.Model):
     tipo_entrega = fields.Selection([
         ('delivery', 'Delivery'),
         ('pickup', 'Retiro en Local'),
-    ], string='Tipo Entrega')
+    ], string='Tipo Entrega', index=True)
     
     # Métricas financieras
     monto_total = fields.Float(string='Monto Total')
@@ -96,83 +204,203 @@ class TuPedidoAnalytics(models.Model):
                 record.categoria_tiempo = 'muy_lento'
 
     def init(self):
-        """Crear vista SQL para analytics"""
-        tools.drop_view_if_exists(self.env.cr, self._table)
-        self.env.cr.execute("""
-            CREATE OR REPLACE VIEW %s AS (
-                SELECT 
-                    row_number() OVER () AS id,
-                    DATE(so.create_date) as fecha,
-                    so.create_date as hora,
-                    so.id as pedido_id,
-                    so.name as pedido_nombre,
-                    so.partner_id as cliente_id,
-                    rp.name as cliente_nombre,
-                    so.estado_rapido as estado_actual,
-                    CASE 
-                        WHEN so.tiempo_inicio_estado IS NOT NULL AND NOW() > so.tiempo_inicio_estado 
-                        THEN GREATEST(0, EXTRACT(EPOCH FROM (NOW() - so.tiempo_inicio_estado))/60)::integer
-                        ELSE 0
-                    END as tiempo_preparacion,
-                    CASE 
-                        WHEN so.tiempo_inicio_total IS NOT NULL AND NOW() > so.tiempo_inicio_total 
-                        THEN GREATEST(0, EXTRACT(EPOCH FROM (NOW() - so.tiempo_inicio_total))/60)::integer
-                        ELSE 0
-                    END as tiempo_total,
-                    CASE 
-                        WHEN so.website_id IS NOT NULL THEN 'web'
-                        ELSE 'pos'
-                    END as tipo_pedido,
-                    CASE 
-                        WHEN so.es_para_envio = true THEN 'delivery'
-                        ELSE 'pickup'
-                    END as tipo_entrega,
-                    so.amount_total as monto_total,
-                    (SELECT COUNT(*) FROM sale_order_line sol WHERE sol.order_id = so.id) as cantidad_productos,
-                    EXTRACT(hour FROM so.create_date) as hora_del_dia,
-                    EXTRACT(dow FROM so.create_date) as dia_semana,
-                    EXTRACT(month FROM so.create_date) as mes
-                FROM sale_order so
-                LEFT JOIN res_partner rp ON rp.id = so.partner_id
-                WHERE so.estado_rapido IS NOT NULL
-                
-                UNION ALL
-                
-                SELECT 
-                    row_number() OVER () + 100000 AS id,
-                    DATE(po.date_order) as fecha,
-                    po.date_order as hora,
-                    po.id as pedido_id,
-                    po.name as pedido_nombre,
-                    po.partner_id as cliente_id,
-                    rp.name as cliente_nombre,
-                    po.estado_rapido as estado_actual,
-                    CASE 
-                        WHEN po.tiempo_inicio_estado IS NOT NULL AND NOW() > po.tiempo_inicio_estado 
-                        THEN GREATEST(0, EXTRACT(EPOCH FROM (NOW() - po.tiempo_inicio_estado))/60)::integer
-                        ELSE 0
-                    END as tiempo_preparacion,
-                    CASE 
-                        WHEN po.tiempo_inicio_total IS NOT NULL AND NOW() > po.tiempo_inicio_total 
-                        THEN GREATEST(0, EXTRACT(EPOCH FROM (NOW() - po.tiempo_inicio_total))/60)::integer
-                        ELSE 0
-                    END as tiempo_total,
-                    'pos' as tipo_pedido,
-                    CASE 
-                        WHEN po.is_delivery = true THEN 'delivery'
-                        ELSE 'pickup'
-                    END as tipo_entrega,
-                    po.amount_total as monto_total,
-                    (SELECT COUNT(*) FROM pos_order_line pol WHERE pol.order_id = po.id) as cantidad_productos,
-                    EXTRACT(hour FROM po.date_order) as hora_del_dia,
-                    EXTRACT(dow FROM po.date_order) as dia_semana,
-                    EXTRACT(month FROM po.date_order) as mes
-                FROM pos_order po
-                LEFT JOIN res_partner rp ON rp.id = po.partner_id
-                WHERE po.estado_rapido IS NOT NULL
-                    AND po.enviado_a_cocina = true
-            )
-        """ % self._table)
+        """Índices únicos parciales para el upsert.
+
+        La carga completa de la tabla la hace la migración 2.4.0: al instalar el
+        módulo todavía no hay pedidos que hayan pasado por cocina.
+        """
+        tools.create_index(
+            self._cr, 'tu_pedido_analytics_pedido_uniq', self._table,
+            ['pedido_id'], unique=True, where="pedido_id IS NOT NULL",
+        )
+        tools.create_index(
+            self._cr, 'tu_pedido_analytics_pos_order_uniq', self._table,
+            ['pos_order_id'], unique=True, where="pos_order_id IS NOT NULL",
+        )
+
+    @api.model
+    def _sincronizar_pedidos(self, sale_order_ids=None, pos_order_ids=None):
+        """Insertar o actualizar las filas de los pedidos indicados.
+
+        Sin ids se recalcula la tabla completa (carga inicial).
+        """
+        self.env.flush_all()
+        actualizar = ', '.join(f"{columna} = EXCLUDED.{columna}" for columna in COLUMNAS_ANALYTICS)
+        actualizar += ", write_uid = EXCLUDED.write_uid, write_date = EXCLUDED.write_date"
+        consultas = []
+        if sale_order_ids is None and pos_order_ids is None:
+            consultas = [(SQL_SINCRONIZAR_VENTAS, None), (SQL_SINCRONIZAR_POS, None)]
+        else:
+            if sale_order_ids:
+                consultas.append((SQL_SINCRONIZAR_VENTAS, list(sale_order_ids)))
+            if pos_order_ids:
+                consultas.append((SQL_SINCRONIZAR_POS, list(pos_order_ids)))
+
+        for consulta, ids in consultas:
+            alias = 'so' if consulta is SQL_SINCRONIZAR_VENTAS else 'po'
+            self.env.cr.execute(consulta.format(
+                columnas=', '.join(COLUMNAS_ANALYTICS),
+                filtro=f"{alias}.id = ANY(%(ids)s)" if ids else "TRUE",
+                filtro_lineas="order_id = ANY(%(ids)s)" if ids else "TRUE",
+                actualizar=actualizar,
+            ), {'ids': ids, 'uid': self.env.uid})
+        self.invalidate_model()
+        if consultas:
+            # Las métricas cambian con los pedidos: invalidar al confirmar la transacción
+            self.env.cr.postcommit.add(functools.partial(_invalidar_cache_metricas, self.env.cr.dbname))
+
+    @api.model
+    def _metricas_tiempo_real(self, company_id=None):
+        """Métricas del día de la compañía, servidas desde la caché del proceso.
+
+        El TTL en segundos se configura con el parámetro del sistema
+        ``tu_pedido_v2.metricas_cache_ttl`` y es el retraso máximo con el que
+        otros workers ven un cambio de pedidos (ver ``_ttl_metricas``).
+        """
+        company_id = company_id or self.env.company.id
+        hoy = fields.Date.today()
+        clave = (self.env.cr.dbname, company_id, hoy)
+        ahora = time.monotonic()
+        with _cache_metricas_lock:
+            entrada = _cache_metricas.get(clave)
+            if entrada and entrada[0] > ahora:
+                _cache_metricas_stats['hits'] += 1
+                return dict(entrada[1])
+            _cache_metricas_stats['misses'] += 1
+
+        metricas = self._calcular_metricas_tiempo_real(company_id, hoy)
+        ttl = self._ttl_metricas()
+        with _cache_metricas_lock:
+            # Limpiar entradas vencidas (días anteriores incluidos)
+            for vencida in [c for c, (expira, _m) in _cache_metricas.items() if expira <= ahora]:
+                del _cache_metricas[vencida]
+            _cache_metricas[clave] = (ahora + ttl, metricas)
+        return dict(metricas)
+
+    @api.model
+    def _ttl_metricas(self):
+        """Segundos de vida de las métricas en caché, entre 0 y TTL_METRICAS_MAXIMO"""
+        ttl = self.env['ir.config_parameter'].sudo().get_param('tu_pedido_v2.metricas_cache_ttl')
+        try:
+            ttl = int(ttl) if ttl else TTL_METRICAS_DEFECTO
+        except (TypeError, ValueError):
+            ttl = TTL_METRICAS_DEFECTO
+        return max(0, min(ttl, TTL_METRICAS_MAXIMO))
+
+    @api.model
+    def _estadisticas_cache_metricas(self):
+        """Contadores de aciertos y fallos de la caché de métricas de este proceso"""
+        with _cache_metricas_lock:
+            return dict(_cache_metricas_stats, entradas=len(_cache_metricas))
+
+    @api.model
+    def _calcular_metricas_tiempo_real(self, company_id, hoy):
+        dominio = [('company_id', '=', company_id)]
+        dominio_hoy = dominio + [('fecha', '=', hoy)]
+
+        [(pedidos_hoy, ingresos_hoy, tiempo_promedio_hoy)] = self._read_group(
+            dominio_hoy, [], ['__count', 'monto_total:sum', 'tiempo_total:avg']
+        )
+        entregados_hoy = self.search_count(dominio_hoy + [('estado_actual', '=', 'entregado')])
+        pedidos_hora_actual = self.search_count(dominio_hoy + [('hora_del_dia', '=', fields.Datetime.now().hour)])
+        pedidos_ayer = self.search_count(dominio + [('fecha', '=', hoy - timedelta(days=1))])
+        pedidos_semana = self.search_count(dominio + [
+            ('fecha', '>=', hoy - timedelta(days=7)),
+            ('fecha', '<', hoy),
+        ])
+        [(pedidos_30_dias, tiempo_promedio_30_dias)] = self._read_group(
+            dominio + [('fecha', '>=', hoy - timedelta(days=30)), ('fecha', '<', hoy)],
+            [], ['__count', 'tiempo_total:avg'],
+        )
+
+        return {
+            'pedidos_hoy': pedidos_hoy,
+            'pedidos_ayer': pedidos_ayer,
+            'variacion_diaria': ((pedidos_hoy - pedidos_ayer) / pedidos_ayer * 100) if pedidos_ayer else 0,
+            'promedio_semanal': round(pedidos_semana / 7, 1),
+            'tiempo_promedio_hoy': tiempo_promedio_hoy or 0,
+            'ingresos_hoy': ingresos_hoy or 0,
+            'eficiencia_hoy': entregados_hoy / pedidos_hoy * 100 if pedidos_hoy else 0,
+            'pedidos_por_hora_actual': pedidos_hora_actual,
+            'pedidos_promedio_30_dias': pedidos_30_dias / 30,
+            'tiempo_promedio_30_dias': tiempo_promedio_30_dias or 0,
+        }
+
+    @api.model
+    def _resumen_periodo(self, fecha_inicio, fecha_fin, limite_productos=10):
+        """Métricas agregadas de un rango de fechas calculadas con GROUP BY en SQL"""
+        dominio = [('fecha', '>=', fecha_inicio), ('fecha', '<=', fecha_fin)]
+
+        pedidos_por_hora = {
+            hora: cantidad
+            for hora, cantidad in self._read_group(dominio, ['hora_del_dia'], ['__count'])
+        }
+
+        promedios = dict(self._read_group(dominio, ['estado_actual'], ['tiempo_total:avg']))
+        tiempos_por_estado = {
+            estado: promedios.get(estado) or 0
+            for estado in ['nuevo', 'aceptado', 'preparacion', 'terminado', 'despachado', 'entregado']
+        }
+
+        por_tipo = {}
+        for tipo_entrega, estado, cantidad in self._read_group(dominio, ['tipo_entrega', 'estado_actual'], ['__count']):
+            totales = por_tipo.setdefault(tipo_entrega, {'total': 0, 'entregados': 0})
+            totales['total'] += cantidad
+            if estado == 'entregado':
+                totales['entregados'] += cantidad
+
+        def eficiencia(tipo_entrega):
+            totales = por_tipo.get(tipo_entrega)
+            return totales['entregados'] / totales['total'] * 100 if totales else 0
+
+        [(total_pedidos, ingresos_total, tiempo_promedio)] = self._read_group(
+            dominio, [], ['__count', 'monto_total:sum', 'tiempo_total:avg']
+        )
+
+        return {
+            'pedidos_por_hora': pedidos_por_hora,
+            'tiempos_por_estado': tiempos_por_estado,
+            'top_productos': self._top_productos(fecha_inicio, fecha_fin, limite_productos),
+            'total_pedidos': total_pedidos,
+            'ingresos_total': ingresos_total or 0,
+            'tiempo_promedio': tiempo_promedio or 0,
+            'eficiencia_delivery': eficiencia('delivery'),
+            'eficiencia_pickup': eficiencia('pickup'),
+        }
+
+    @api.model
+    def _top_productos(self, fecha_inicio, fecha_fin, limite):
+        """Productos más pedidos sumando líneas de pedidos de venta y PoS de cocina"""
+        desde = fields.Datetime.to_datetime(fecha_inicio)
+        hasta = fields.Datetime.to_datetime(fecha_fin) + timedelta(days=1)
+
+        acumulado = {}
+        lineas_venta = self.env['sale.order.line']._read_group(
+            [
+                ('order_id.estado_rapido', '!=', False),
+                ('order_id.create_date', '>=', desde),
+                ('order_id.create_date', '<', hasta),
+                ('display_type', '=', False),
+            ],
+            ['product_id'], ['product_uom_qty:sum', 'price_total:sum'],
+        )
+        lineas_pos = self.env['pos.order.line']._read_group(
+            [
+                ('order_id.enviado_a_cocina', '=', True),
+                ('order_id.estado_rapido', '!=', False),
+                ('order_id.date_order', '>=', desde),
+                ('order_id.date_order', '<', hasta),
+            ],
+            ['product_id'], ['qty:sum', 'price_subtotal_incl:sum'],
+        )
+        for producto, cantidad, ingresos in lineas_venta + lineas_pos:
+            if not producto:
+                continue
+            datos = acumulado.setdefault(producto, {'nombre': producto.name, 'cantidad': 0, 'ingresos': 0.0})
+            datos['cantidad'] += cantidad or 0
+            datos['ingresos'] += ingresos or 0.0
+
+        return sorted(acumulado.values(), key=lambda datos: datos['cantidad'], reverse=True)[:limite]
 
 
 class TuPedidoMetricasRealTime(models.TransientModel):
@@ -192,34 +420,11 @@ class TuPedidoMetricasRealTime(models.TransientModel):
     
     @api.depends('fecha_inicio', 'fecha_fin')
     def _compute_metricas(self):
+        # Las métricas son las mismas para todos los registros: una sola consulta a la caché
+        metricas = self.env['tu_pedido.analytics']._metricas_tiempo_real()
         for record in self:
-            # Pedidos de hoy
-            pedidos_hoy = self.env['tu_pedido.analytics'].search_count([
-                ('fecha', '=', fields.Date.today())
-            ])
-            record.pedidos_hoy = pedidos_hoy
-            
-            # Promedio histórico (últimos 30 días)
-            fecha_30_dias = fields.Date.today() - timedelta(days=30)
-            pedidos_historicos = self.env['tu_pedido.analytics'].search([
-                ('fecha', '>=', fecha_30_dias),
-                ('fecha', '<', fields.Date.today())
-            ])
-            record.pedidos_promedio = len(pedidos_historicos) / 30 if pedidos_historicos else 0
-            
-            # Tiempo promedio
-            tiempos = pedidos_historicos.mapped('tiempo_total')
-            record.tiempo_promedio = sum(tiempos) / len(tiempos) if tiempos else 0
-            
-            # Ingresos de hoy
-            ingresos = self.env['tu_pedido.analytics'].search([
-                ('fecha', '=', fields.Date.today())
-            ])
-            record.ingresos_hoy = sum(ingresos.mapped('monto_total'))
-            
-            # Eficiencia
-            completados = self.env['tu_pedido.analytics'].search_count([
-                ('fecha', '=', fields.Date.today()),
-                ('estado_actual', '=', 'entregado')
-            ])
-            record.eficiencia_general = (completados / pedidos_hoy * 100) if pedidos_hoy > 0 else 0
\ No newline at end of file
+            record.pedidos_hoy = metricas['pedidos_hoy']
+            record.pedidos_promedio = metricas['pedidos_promedio_30_dias']
+            record.tiempo_promedio = metricas['tiempo_promedio_30_dias']
+            record.ingresos_hoy = metricas['ingresos_hoy']
+            record.eficiencia_general = metricas['eficiencia_hoy']
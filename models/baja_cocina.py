@@ -0,0 +1,42 @@
+from odoo import models, fields, api
+from datetime import timedelta
+
+# Las revisiones del dashboard caducan a los 10 minutos: un día de bajas sobra
+RETENCION_BAJAS_COCINA = timedelta(days=1)
+
+
+class BajaCocina(models.Model):
+    """Pedidos que salieron del tablero de cocina sin que una consulta lo pueda ver.
+
+    Un pedido eliminado, o un pedido PoS retirado de cocina, ya no aparece en
+    ``write_date >= revision``: se anota aquí para que el modo incremental del
+    dashboard lo informe en ``removed``. Es una tabla propia y no un parámetro
+    del sistema para no invalidar la caché del registro en cada eliminación.
+    """
+    _name = 'tu_pedido.baja.cocina'
+    _description = 'Pedidos retirados del tablero de cocina'
+    _order = 'fecha desc, id desc'
+
+    modelo = fields.Char(string='Modelo', required=True)
+    pedido_id = fields.Integer(string='Pedido', required=True)
+    fecha = fields.Datetime(string='Fecha', required=True, index=True)
+
+    @api.model
+    def _registrar(self, pedidos):
+        """Anotar la baja de ``pedidos`` (sale.order o pos.order) con un solo insert"""
+        if pedidos:
+            ahora = self.env.cr.now()
+            self.create([{'modelo': pedidos._name, 'pedido_id': pedido_id, 'fecha': ahora} for pedido_id in pedidos.ids])
+
+    @api.model
+    def _tarjetas_desde(self, desde, limite):
+        """Ids de tarjeta (``12`` o ``pos_5``) dados de baja desde ``desde``"""
+        bajas = self.search_read([('fecha', '>=', desde)], ['modelo', 'pedido_id'], limit=limite)
+        return [
+            f"pos_{baja['pedido_id']}" if baja['modelo'] == 'pos.order' else baja['pedido_id']
+            for baja in bajas
+        ]
+
+    @api.autovacuum
+    def _gc_bajas_antiguas(self):
+        self.search([('fecha', '<', fields.Datetime.now() - RETENCION_BAJAS_COCINA)]).unlink()
@@ -0,0 +1,421 @@
+from odoo import models, fields, api
+from datetime import datetime, timedelta
+import json
+from .sale_order import PREDICADO_COCINA_ACTIVO
+
+# Listados de cocina acotados: a lo sumo LIMITE_LISTADO_COCINA por página, paginados
+# por (tiempo_inicio_total, id) descendente, es decir por la entrada a cocina. La
+# ventana solo descarta pedidos que la cocina ya terminó; los pendientes se listan
+# siempre, por antiguos que sean
+LIMITE_LISTADO_COCINA = 200
+VENTANA_COCINA_HORAS = 12
+PARAMETRO_VENTANA_COCINA = 'tu_pedido_v2.ventana_cocina_horas'
+ORDEN_LISTADO_COCINA = 'tiempo_inicio_total desc nulls first, id desc'
+ESTADOS_COCINA_PENDIENTES = ('nuevo', 'aceptado', 'preparacion', 'terminado')
+
+CAMPOS_VENTA = [
+    'name', 'partner_id', 'estado_rapido', 'nota_cocina', 'state', 'website_id',
+    'tiempo_inicio_estado', 'tiempo_inicio_total', 'sonido_activo',
+    'cliente_confirmo_recepcion', 'tiene_reclamo', 'descripcion_reclamo',
+    'productos_modificados', 'snapshot_version', 'productos_completados',
+    'es_para_envio', 'direccion_entrega_completa', 'etiqueta_cocina', 'create_date',
+]
+
+CAMPOS_POS = [
+    'tracking_number', 'partner_id', 'estado_rapido', 'general_note', 'state',
+    'tiempo_inicio_estado', 'tiempo_inicio_total', 'sonido_activo',
+    'is_delivery', 'direccion_delivery', 'telefono_delivery',
+    'table_id', 'etiqueta_cocina', 'customer_count', 'create_date',
+]
+
+
+class DashboardSerializer(models.AbstractModel):
+    _name = 'tu_pedido.dashboard.serializer'
+    _description = 'Serializador de tarjetas del dashboard de cocina'
+
+    @api.model
+    def ventana_cocina(self):
+        """Entrada a cocina más antigua de los pedidos terminados que se siguen listando"""
+        horas = self.env['ir.config_parameter'].sudo().get_param(PARAMETRO_VENTANA_COCINA)
+        try:
+            horas = float(horas) if horas else VENTANA_COCINA_HORAS
+        except ValueError:
+            horas = VENTANA_COCINA_HORAS
+        return fields.Datetime.now() - timedelta(hours=horas)
+
+    @api.model
+    def limite_listado(self, limite=None):
+        """Tamaño de página pedido por el cliente, entre 1 y LIMITE_LISTADO_COCINA"""
+        try:
+            limite = int(limite or LIMITE_LISTADO_COCINA)
+        except (TypeError, ValueError):
+            limite = LIMITE_LISTADO_COCINA
+        return max(1, min(limite, LIMITE_LISTADO_COCINA))
+
+    @api.model
+    def dominio_ventana(self, ventana=None):
+        """Pedidos pendientes en cocina, o que entraron a cocina después de ``ventana``"""
+        return [
+            '|', ('estado_rapido', 'in', ESTADOS_COCINA_PENDIENTES),
+            ('tiempo_inicio_total', '>=', ventana or self.ventana_cocina()),
+        ]
+
+    @api.model
+    def dominio_listado(self, dominio, despues=None):
+        """Acotar ``dominio`` a la ventana de cocina y, con ``despues``, a la página siguiente.
+
+        ``despues`` es el cursor ``[entrada_cocina, id]`` del último pedido recibido
+        (ver ``cursor_tarjeta``); el orden es ``ORDEN_LISTADO_COCINA``, con los
+        pedidos sin hora de entrada a cocina primero.
+        """
+        dominio = list(dominio) + self.dominio_ventana()
+        if despues:
+            ultimo_id = int(despues[1])
+            if despues[0]:
+                fecha = datetime.fromisoformat(str(despues[0]))
+                dominio += [
+                    '|', ('tiempo_inicio_total', '<', fecha),
+                    '&', ('tiempo_inicio_total', '=', fecha), ('id', '<', ultimo_id),
+                ]
+            else:
+                dominio += [
+                    '|', ('tiempo_inicio_total', '!=', False),
+                    '&', ('tiempo_inicio_total', '=', False), ('id', '<', ultimo_id),
+                ]
+        return dominio
+
+    @api.model
+    def cursor_tarjeta(self, tarjeta):
+        """Cursor de paginación a partir de la última tarjeta de una página"""
+        return [tarjeta['entrada_cocina'] or False, int(str(tarjeta['id']).replace('pos_', ''))]
+
+    @api.model
+    def tarjetas_venta(self, dominio, limite=None, despues=None):
+        """Tarjetas de sale.order con una cantidad de consultas fija.
+
+        Pedidos, líneas, valores de atributos y clientes se leen en lotes con
+        listas de campos explícitas, sin recorrer relaciones registro a registro.
+        Devuelve una página acotada (ver ``dominio_listado``).
+        """
+        pedidos = self.env['sale.order'].search_read(
+            self.dominio_listado(dominio, despues), CAMPOS_VENTA,
+            order=ORDEN_LISTADO_COCINA, limit=self.limite_listado(limite),
+        )
+        if not pedidos:
+            return []
+
+        Linea = self.env['sale.order.line']
+        campos_atributos = [
+            campo for campo in ('product_no_variant_attribute_value_ids', 'product_template_attribute_value_ids')
+            if campo in Linea._fields
+        ]
+        lineas = Linea.search_read(
+            [('order_id', 'in', [p['id'] for p in pedidos])],
+            ['order_id', 'name', 'product_uom_qty', 'product_uom'] + campos_atributos,
+            order='order_id, sequence, id',
+        )
+
+        atributos = {}
+        valores_ids = {valor_id for linea in lineas for campo in campos_atributos for valor_id in linea[campo]}
+        if valores_ids:
+            for valor in self.env['product.template.attribute.value'].browse(valores_ids).read(['name', 'attribute_id']):
+                atributos[valor['id']] = {
+                    'attribute': valor['attribute_id'][1] if valor['attribute_id'] else '',
+                    'value': valor['name'],
+                }
+
+        lineas_por_pedido = {}
+        for linea in lineas:
+            lineas_por_pedido.setdefault(linea['order_id'][0], []).append(linea)
+
+        clientes = self._nombres_clientes(pedidos)
+        ahora = fields.Datetime.now()
+        tarjetas = []
+        for pedido in pedidos:
+            completados = self._ids_completados(pedido['productos_completados'])
+            productos = []
+            for linea in lineas_por_pedido.get(pedido['id'], []):
+                productos.append({
+                    'id': linea['id'],
+                    'name': linea['name'],
+                    'qty': linea['product_uom_qty'],
+                    'uom': linea['product_uom'][1] if linea['product_uom'] else '',
+                    'attributes': [atributos[v] for campo in campos_atributos for v in linea[campo] if v in atributos],
+                    'completado': linea['id'] in completados,
+                })
+
+            nota_cocina = pedido['nota_cocina'] or ''
+            if '[CANCELADO]' in nota_cocina:
+                is_cancelled = True
+                motivo_cancelacion = 'Pedido cancelado desde PoS'
+            elif pedido['state'] == 'cancel':
+                is_cancelled = True
+                motivo_cancelacion = 'Pedido cancelado desde Ventas'
+            else:
+                is_cancelled = False
+                motivo_cancelacion = ''
+
+            partner_id = pedido['partner_id'][0] if pedido['partner_id'] else False
+            tarjetas.append({
+                'id': pedido['id'],
+                'name': pedido['etiqueta_cocina'] or pedido['name'],
+                'partner_id': [partner_id, clientes.get(partner_id) or 'Cliente'],
+                'estado_rapido': pedido['estado_rapido'],
+                'nota_cocina': nota_cocina,
+                'productos': productos,
+                'tiempo_inicio_estado': self.marca_tiempo(pedido['tiempo_inicio_estado']),
+                'tiempo_inicio_total': self.marca_tiempo(pedido['tiempo_inicio_total']),
+                'sonido_activo': pedido['sonido_activo'],
+                'cliente_confirmo_recepcion': pedido['cliente_confirmo_recepcion'],
+                'tiene_reclamo': pedido['tiene_reclamo'],
+                'descripcion_reclamo': pedido['descripcion_reclamo'] or '',
+                'productos_modificados': pedido['productos_modificados'],
+                'productos_snapshot': bool(pedido['snapshot_version']),
+                'es_para_envio': pedido['es_para_envio'],
+                'direccion_entrega_completa': pedido['direccion_entrega_completa'] or '',
+                'pedido_cancelado': is_cancelled,
+                'motivo_cancelacion': motivo_cancelacion,
+                'tipo_pedido': 'web' if pedido['website_id'] else 'pos',
+                'mesa': '',
+                'comensales': 0,
+                'create_date': (pedido['create_date'] or ahora).isoformat(),
+                'entrada_cocina': pedido['tiempo_inicio_total'] and pedido['tiempo_inicio_total'].isoformat(),
+            })
+        return tarjetas
+
+    @api.model
+    def tarjetas_pos(self, dominio, limite=None, despues=None):
+        """Tarjetas de pos.order con una cantidad de consultas fija, en una página acotada"""
+        pedidos = self.env['pos.order'].search_read(
+            self.dominio_listado(dominio, despues), CAMPOS_POS,
+            order=ORDEN_LISTADO_COCINA, limit=self.limite_listado(limite),
+        )
+        if not pedidos:
+            return []
+
+        Linea = self.env['pos.order.line']
+        campo_nota = next((campo for campo in ('customer_note', 'note') if campo in Linea._fields), None)
+        lineas = Linea.search_read(
+            [('order_id', 'in', [p['id'] for p in pedidos])],
+            ['order_id', 'product_id', 'qty'] + ([campo_nota] if campo_nota else []),
+            order='order_id, id',
+        )
+
+        productos_ids = {linea['product_id'][0] for linea in lineas if linea['product_id']}
+        productos_info = {
+            producto['id']: producto
+            for producto in self.env['product.product'].browse(productos_ids).read(['name', 'uom_id'])
+        }
+
+        mesas_ids = {pedido['table_id'][0] for pedido in pedidos if pedido['table_id']}
+        numeros_mesa = {
+            mesa['id']: mesa['table_number']
+            for mesa in self.env['restaurant.table'].browse(mesas_ids).read(['table_number'])
+        }
+
+        lineas_por_pedido = {}
+        for linea in lineas:
+            lineas_por_pedido.setdefault(linea['order_id'][0], []).append(linea)
+
+        clientes = self._nombres_clientes(pedidos)
+        ahora = fields.Datetime.now()
+        tarjetas = []
+        for pedido in pedidos:
+            productos = []
+            notas_lineas = []
+            for linea in lineas_por_pedido.get(pedido['id'], []):
+                producto = productos_info.get(linea['product_id'][0], {}) if linea['product_id'] else {}
+                nombre = producto.get('name', '')
+                productos.append({
+                    'name': nombre,
+                    'qty': linea['qty'],
+                    'uom': producto['uom_id'][1] if producto.get('uom_id') else '',
+                    'attributes': []  # PoS no maneja atributos complejos
+                })
+                if campo_nota and linea[campo_nota]:
+                    notas_lineas.append(f"{nombre}: {linea[campo_nota]}")
+
+            nota_cocina = ' | '.join(filter(None, [pedido['general_note'] or ''] + notas_lineas))
+
+            if pedido['is_delivery']:
+                direccion = pedido['direccion_delivery'] or 'Sin dirección'
+                telefono = pedido['telefono_delivery'] or 'Sin teléfono'
+                mesa_info = f"📍 {direccion} | 📞 {telefono}"
+            elif pedido['table_id']:
+                mesa_info = f"Mesa {numeros_mesa.get(pedido['table_id'][0])}"
+            else:
+                mesa_info = ''
+
+            partner_id = pedido['partner_id'][0] if pedido['partner_id'] else 0
+            cancelado = pedido['state'] == 'cancel'
+            tarjetas.append({
+                'id': f"pos_{pedido['id']}",
+                'name': pedido['etiqueta_cocina'] or pedido['tracking_number'],
+                'partner_id': [partner_id, clientes.get(partner_id) or 'Cliente PoS'],
+                'estado_rapido': pedido['estado_rapido'],
+                'nota_cocina': nota_cocina,
+                'productos': productos,
+                'tiempo_inicio_estado': self.marca_tiempo(pedido['tiempo_inicio_estado']),
+                'tiempo_inicio_total': self.marca_tiempo(pedido['tiempo_inicio_total']),
+                'sonido_activo': pedido['sonido_activo'],
+                'cliente_confirmo_recepcion': False,
+                'tiene_reclamo': False,
+                'descripcion_reclamo': '',
+                'productos_modificados': False,
+                'es_para_envio': pedido['is_delivery'],
+                'direccion_entrega_completa': pedido['direccion_delivery'] or '',
+                'pedido_cancelado': cancelado,
+                'motivo_cancelacion': 'Pedido cancelado desde PoS' if cancelado else '',
+                'tipo_pedido': 'pos',
+                'mesa': mesa_info,
+                'comensales': pedido['customer_count'] or 0,
+                'create_date': (pedido['create_date'] or ahora).isoformat(),
+                'entrada_cocina': pedido['tiempo_inicio_total'] and pedido['tiempo_inicio_total'].isoformat(),
+            })
+        return tarjetas
+
+    @api.model
+    def agrupar_por_estado(self, tarjetas, estados):
+        """Repartir las tarjetas en columnas del tablero en una sola pasada"""
+        por_estado = {clave: [] for clave, _nombre in estados}
+        for tarjeta in tarjetas:
+            if tarjeta['estado_rapido'] in por_estado:
+                por_estado[tarjeta['estado_rapido']].append(tarjeta)
+        return [{
+            'key': clave,
+            'title': nombre,
+            'orders': por_estado[clave],
+            'count': len(por_estado[clave]),
+        } for clave, nombre in estados]
+
+    @api.model
+    def feed_pos(self, session_id=None):
+        """Notificaciones del PoS (envío, retiro y web) con una consulta por modelo.
+
+        Cada fila trae en ``lista`` la lista a la que pertenece, calculada en SQL a
+        partir de ``estado_rapido`` y del indicador de envío. Con ``session_id``, los
+        pedidos web llevan ``visto`` si esa terminal los confirmó
+        (``tu_pedido.notificacion.vista``); la lectura no escribe en los pedidos.
+        Cada consulta se limita a la ventana de cocina (ver ``dominio_ventana``) y a
+        LIMITE_LISTADO_COCINA filas.
+        """
+        self.env.flush_all()
+        parametros = {
+            'desde': self.ventana_cocina(), 'limite': LIMITE_LISTADO_COCINA,
+            'pendientes': ESTADOS_COCINA_PENDIENTES,
+            'sesion': int(session_id) if session_id else None,
+        }
+        feed = {'delivery': [], 'pickup': [], 'web': []}
+
+        self.env.cr.execute(f"""
+            SELECT po.id, po.name, po.tracking_number, po.etiqueta_cocina, po.direccion_delivery, po.telefono_delivery,
+                   rp.name AS cliente,
+                   CASE WHEN po.is_delivery THEN 'delivery' ELSE 'pickup' END AS lista
+              FROM pos_order po
+              LEFT JOIN res_partner rp ON rp.id = po.partner_id
+             WHERE po.{PREDICADO_COCINA_ACTIVO}
+               AND po.estado_rapido = 'terminado'
+               AND po.enviado_a_cocina
+               AND (po.estado_rapido IN %(pendientes)s OR po.tiempo_inicio_total >= %(desde)s)
+          ORDER BY po.tiempo_inicio_total DESC NULLS FIRST, po.id DESC
+             LIMIT %(limite)s
+        """, parametros)
+        for fila in self.env.cr.dictfetchall():
+            notificacion = {
+                'id': f"pos_{fila['id']}",
+                'order_name': fila['etiqueta_cocina'] or fila['tracking_number'] or fila['name'],
+                'cliente': fila['cliente'] or 'Cliente PoS',
+                'telefono': fila['telefono_delivery'] or 'Sin teléfono',
+                'tipo': 'pos',
+            }
+            if fila['lista'] == 'delivery':
+                notificacion['direccion'] = fila['direccion_delivery'] or 'Sin dirección'
+            feed[fila['lista']].append(notificacion)
+
+        # Las tres primeras líneas solo se agregan para los pedidos web
+        self.env.cr.execute(f"""
+            SELECT so.id, so.name, so.etiqueta_cocina, so.es_para_envio, so.direccion_entrega_completa,
+                   so.amount_total, so.create_date,
+                   so.website_id IS NOT NULL AS es_web,
+                   COALESCE(so.nota_cocina LIKE '%%[REF:%%', FALSE) AS desde_pos,
+                   rp.name AS cliente,
+                   COALESCE(NULLIF(rp.phone, ''), NULLIF(rp.mobile, '')) AS telefono,
+                   CASE WHEN so.estado_rapido = 'terminado' AND so.es_para_envio THEN 'delivery'
+                        WHEN so.estado_rapido = 'terminado' THEN 'pickup'
+                   END AS lista,
+                   so.estado_rapido != 'despachado' AND so.website_id IS NOT NULL AS en_web,
+                   lineas.cantidades, lineas.nombres, lineas.total,
+                   vista.id IS NOT NULL AS visto
+              FROM sale_order so
+              LEFT JOIN res_partner rp ON rp.id = so.partner_id
+              LEFT JOIN tu_pedido_notificacion_vista vista
+                     ON vista.pedido_id = so.id AND vista.session_id = %(sesion)s
+              LEFT JOIN LATERAL (
+                    SELECT (array_agg(sol.product_uom_qty ORDER BY sol.sequence, sol.id))[1:3] AS cantidades,
+                           (array_agg(sol.name ORDER BY sol.sequence, sol.id))[1:3] AS nombres,
+                           COUNT(*) AS total
+                      FROM sale_order_line sol
+                     WHERE sol.order_id = so.id
+                   ) lineas ON so.website_id IS NOT NULL
+             WHERE so.{PREDICADO_COCINA_ACTIVO}
+               AND (so.estado_rapido = 'terminado' OR so.website_id IS NOT NULL)
+               AND (so.estado_rapido IN %(pendientes)s OR so.tiempo_inicio_total >= %(desde)s)
+          ORDER BY so.tiempo_inicio_total DESC NULLS FIRST, so.id DESC
+             LIMIT %(limite)s
+        """, parametros)
+        for fila in self.env.cr.dictfetchall():
+            # Pedidos PoS creados como sale.order: sin sitio web y con etiqueta [REF:]
+            desde_pos = not fila['es_web'] and fila['desde_pos']
+            telefono = fila['telefono'] or 'Sin teléfono'
+            if fila['lista']:
+                notificacion = {
+                    'id': f"sale_{fila['id']}",
+                    'order_name': (fila['etiqueta_cocina'] or fila['name']) if desde_pos else fila['name'],
+                    'cliente': fila['cliente'],
+                    'telefono': telefono,
+                    'tipo': 'pos' if desde_pos else 'web',
+                }
+                if fila['lista'] == 'delivery':
+                    notificacion['direccion'] = fila['direccion_entrega_completa'] or 'Sin dirección'
+                feed[fila['lista']].append(notificacion)
+            if fila['en_web']:
+                productos = ', '.join(
+                    f"{float(cantidad)}x {nombre}"
+                    for cantidad, nombre in zip(fila['cantidades'] or [], fila['nombres'] or [])
+                )
+                if (fila['total'] or 0) > 3:
+                    productos += f" y {fila['total'] - 3} más"
+                feed['web'].append({
+                    'id': fila['id'],
+                    'order_name': fila['name'],
+                    'cliente': fila['cliente'],
+                    'telefono': telefono,
+                    'direccion': fila['direccion_entrega_completa'] or 'Retiro en local',
+                    'es_para_envio': bool(fila['es_para_envio']),
+                    'productos': productos,
+                    'amount_total': float(fila['amount_total'] or 0),
+                    'create_date': fila['create_date'].isoformat(),
+                    'visto': fila['visto'],
+                })
+        return feed
+
+    @api.model
+    def _nombres_clientes(self, pedidos):
+        """Nombres de los clientes de los pedidos leídos en una sola consulta"""
+        partner_ids = {pedido['partner_id'][0] for pedido in pedidos if pedido['partner_id']}
+        return {
+            partner['id']: partner['name']
+            for partner in self.env['res.partner'].browse(partner_ids).read(['name'])
+        }
+
+    @api.model
+    def _ids_completados(self, productos_completados):
+        try:
+            return set(json.loads(productos_completados or '[]'))
+        except (TypeError, ValueError):
+            return set()
+
+    @api.model
+    def marca_tiempo(self, fecha):
+        """Fecha UTC en ISO 8601 con zona (``...Z``); los minutos transcurridos los calcula el cliente"""
+        return f"{fecha.isoformat(timespec='seconds')}Z" if fecha else False
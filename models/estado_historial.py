@@ -1,5 +1,49 @@
 from odoo import models, fields, api, tools
 from datetime import datetime
+from dateutil.relativedelta import relativedelta
+
+DIAS_SEMANA = [
+    ('1', 'Lunes'), ('2', 'Martes'), ('3', 'Miércoles'),
+    ('4', 'Jueves'), ('5', 'Viernes'), ('6', 'Sábado'), ('7', 'Domingo')
+]
+
+# Parámetro con los meses de historial que quedan activos (0 o vacío: no archivar)
+PARAMETRO_MESES_HISTORIAL = 'tu_pedido_v2.historial_meses_activos'
+LOTE_ARCHIVO_HISTORIAL = 10000
+
+ESTADOS_HISTORIAL = [
+    ('nuevo', 'Nuevo'),
+    ('aceptado', 'Aceptado'),
+    ('preparacion', 'En Preparación'),
+    ('terminado', 'Terminado'),
+    ('despachado', 'Despachado/Retirado'),
+    ('entregado', 'Entregado'),
+    ('rechazado', 'Rechazado'),
+]
+
+# Posición de cada estado (1..7) para armar ids deterministas en las vistas de reporte
+SQL_POSICION_ESTADO = "array_position(ARRAY[%s]::varchar[], {columna}::varchar)" % ", ".join(
+    f"'{estado}'" for estado, _nombre in ESTADOS_HISTORIAL
+)
+
+# Tiempos por estado de los reportes: el historial activo fila por fila y el
+# archivado ya resumido por día y estado (``tu_pedido.estado.resumen``). Sin
+# funciones de ventana, para que los filtros de las vistas lleguen a los índices
+SQL_TIEMPOS_ESTADO = """
+    SELECT eh.fecha_dia AS fecha, eh.estado_anterior AS estado, 1 AS total_pedidos,
+           eh.minutos_en_estado_anterior AS tiempo_total,
+           eh.minutos_en_estado_anterior AS tiempo_minimo,
+           eh.minutos_en_estado_anterior AS tiempo_maximo,
+           eh.dia_semana, eh.semana_iso, eh.mes, eh.año
+      FROM tu_pedido_estado_historial eh
+     WHERE eh.active
+       AND eh.estado_anterior IS NOT NULL
+       AND eh.minutos_en_estado_anterior >= 0
+    UNION ALL
+    SELECT r.fecha_dia, r.estado, r.total_pedidos, r.tiempo_total, r.tiempo_minimo,
+           r.tiempo_maximo, r.dia_semana, r.semana_iso, r.mes, r.año
+      FROM tu_pedido_estado_resumen r
+"""
 
 class EstadoHistorial(models.Model):
     _name = 'tu_pedido.estado.historial'
@@ -7,6 +51,7 @@ class EstadoHistorial(models.Model):
     _order = 'fecha_cambio desc'
 
     pedido_id = fields.Many2one('sale.order', string='Pedido', required=True, ondelete='cascade')
+    active = fields.Boolean(default=True, index=True)
     pedido_nombre = fields.Char(related='pedido_id.name', string='Número Pedido', store=True)
     
     estado_anterior = fields.Selection([
@@ -41,16 +86,130 @@ class EstadoHistorial(models.Model):
     ], string='Mes', compute='_compute_periodo', store=True)
     
     año = fields.Integer(string='Año', compute='_compute_periodo', store=True)
+    # Día (UTC), semana ISO ("2025-W07") y día ISO de la semana: los reportes agrupan
+    # por estas columnas indexadas en lugar de por expresiones sobre fecha_cambio
+    fecha_dia = fields.Date(string='Día', compute='_compute_periodo', store=True, index=True)
+    semana_iso = fields.Char(string='Semana ISO', compute='_compute_periodo', store=True, index=True)
+    dia_semana = fields.Selection(DIAS_SEMANA, string='Día de la Semana', compute='_compute_periodo', store=True)
+    
+    def init(self):
+        super().init()
+        # Reportes por período y estado, y línea de tiempo de cada pedido
+        tools.create_index(
+            self._cr, 'tu_pedido_estado_historial_fecha_estado_idx', self._table,
+            ['fecha_cambio', 'estado_anterior'],
+        )
+        tools.create_index(
+            self._cr, 'tu_pedido_estado_historial_pedido_fecha_idx', self._table,
+            ['pedido_id', 'fecha_cambio'],
+        )
+        # Rama del historial activo en las vistas de reporte
+        tools.create_index(
+            self._cr, 'tu_pedido_estado_historial_activo_dia_idx', self._table,
+            ['fecha_dia', 'estado_anterior'], where="active",
+        )
     
     @api.depends('fecha_cambio')
     def _compute_periodo(self):
         for record in self:
             if record.fecha_cambio:
+                iso = record.fecha_cambio.isocalendar()
                 record.mes = str(record.fecha_cambio.month)
                 record.año = record.fecha_cambio.year
+                record.fecha_dia = record.fecha_cambio.date()
+                record.semana_iso = f"{iso[0]}-W{iso[1]:02d}"
+                record.dia_semana = str(iso[2])
             else:
                 record.mes = False
                 record.año = False
+                record.fecha_dia = False
+                record.semana_iso = False
+                record.dia_semana = False
+    
+    @api.model
+    def _cron_archivar_historial(self, limite=LOTE_ARCHIVO_HISTORIAL):
+        """Archivar el historial más antiguo que los meses configurados.
+
+        Cada lote se archiva y se suma a ``tu_pedido.estado.resumen`` en una sola
+        sentencia: los reportes leen del historial solo las filas activas y del
+        resumen una fila por día y estado, así que dejan de recorrer el historial
+        antiguo. Se vuelve a programar mientras queden registros por archivar.
+        """
+        meses = int(self.env['ir.config_parameter'].sudo().get_param(PARAMETRO_MESES_HISTORIAL) or 0)
+        if meses <= 0:
+            return
+        limite_fecha = fields.Datetime.now() - relativedelta(months=meses)
+        self.flush_model()
+        self.env.cr.execute("""
+            WITH archivados AS (
+                UPDATE tu_pedido_estado_historial SET active = FALSE
+                 WHERE id IN (
+                    SELECT id FROM tu_pedido_estado_historial
+                     WHERE active AND fecha_cambio < %s
+                     ORDER BY fecha_cambio LIMIT %s
+                 )
+                RETURNING id, fecha_dia, estado_anterior, minutos_en_estado_anterior,
+                          dia_semana, semana_iso, mes, año
+            ), resumen AS (
+                """ + self.env['tu_pedido.estado.resumen']._sql_resumir('archivados') + """
+            )
+            SELECT count(*) FROM archivados
+        """, [limite_fecha, limite])
+        archivados = self.env.cr.fetchone()[0]
+        self.invalidate_model(['active'])
+        if archivados == limite:
+            self.env.ref('tu_pedido_v2.ir_cron_archivar_historial_estados')._trigger()
+
+
+class EstadoResumen(models.Model):
+    """Historial de estados archivado, resumido por día y estado.
+
+    Lo completa ``tu_pedido.estado.historial._cron_archivar_historial`` con las
+    filas que archiva; las vistas de reporte lo suman al historial activo. Las
+    filas archivadas a mano (sin pasar por el cron) no se resumen.
+    """
+    _name = 'tu_pedido.estado.resumen'
+    _description = 'Resumen diario del historial de estados archivado'
+    _order = 'fecha_dia desc, estado'
+
+    fecha_dia = fields.Date(string='Día', required=True, index=True)
+    estado = fields.Selection(ESTADOS_HISTORIAL, string='Estado', required=True)
+    total_pedidos = fields.Integer(string='Total Pedidos')
+    tiempo_total = fields.Integer(string='Tiempo Total (min)')
+    tiempo_minimo = fields.Integer(string='Tiempo Mínimo (min)')
+    tiempo_maximo = fields.Integer(string='Tiempo Máximo (min)')
+    dia_semana = fields.Selection(DIAS_SEMANA, string='Día de la Semana')
+    semana_iso = fields.Char(string='Semana ISO')
+    mes = fields.Char(string='Mes')
+    año = fields.Integer(string='Año', index=True)
+
+    _sql_constraints = [
+        ('dia_estado_unico', 'unique(fecha_dia, estado)', 'Solo un resumen por día y estado.'),
+    ]
+
+    @api.model
+    def _sql_resumir(self, origen):
+        """INSERT que suma al resumen las filas de historial de ``origen`` (tabla o CTE)"""
+        return f"""
+            INSERT INTO tu_pedido_estado_resumen
+                   (fecha_dia, estado, total_pedidos, tiempo_total, tiempo_minimo, tiempo_maximo,
+                    dia_semana, semana_iso, mes, año, create_date, write_date)
+            SELECT h.fecha_dia, h.estado_anterior, count(*), sum(h.minutos_en_estado_anterior),
+                   min(h.minutos_en_estado_anterior), max(h.minutos_en_estado_anterior),
+                   h.dia_semana, h.semana_iso, h.mes, h.año,
+                   now() at time zone 'UTC', now() at time zone 'UTC'
+              FROM {origen} h
+             WHERE h.estado_anterior IS NOT NULL
+               AND h.minutos_en_estado_anterior >= 0
+               AND h.fecha_dia IS NOT NULL
+             GROUP BY h.fecha_dia, h.estado_anterior, h.dia_semana, h.semana_iso, h.mes, h.año
+            ON CONFLICT (fecha_dia, estado) DO UPDATE SET
+                total_pedidos = tu_pedido_estado_resumen.total_pedidos + EXCLUDED.total_pedidos,
+                tiempo_total = tu_pedido_estado_resumen.tiempo_total + EXCLUDED.tiempo_total,
+                tiempo_minimo = LEAST(tu_pedido_estado_resumen.tiempo_minimo, EXCLUDED.tiempo_minimo),
+                tiempo_maximo = GREATEST(tu_pedido_estado_resumen.tiempo_maximo, EXCLUDED.tiempo_maximo),
+                write_date = EXCLUDED.write_date
+        """
 
 
 class EstadoAnalytics(models.Model):
@@ -88,28 +247,24 @@ class EstadoAnalytics(models.Model):
     def init(self):
         """Crear vista SQL para analytics por estado"""
         tools.drop_view_if_exists(self.env.cr, self._table)
+        # El id sale de la clave del grupo (año, mes, estado): un row_number() impediría
+        # llevar los filtros del reporte hasta los índices del historial
         self.env.cr.execute("""
             CREATE OR REPLACE VIEW %s AS (
                 SELECT 
-                    row_number() OVER () AS id,
-                    EXTRACT(year FROM eh.fecha_cambio) as año,
-                    EXTRACT(month FROM eh.fecha_cambio) as mes,
-                    eh.estado_anterior as estado,
-                    COUNT(*) as total_pedidos,
-                    FLOOR(AVG(eh.minutos_en_estado_anterior))::integer as tiempo_promedio,
-                    SUM(eh.minutos_en_estado_anterior) as tiempo_total,
-                    MIN(eh.minutos_en_estado_anterior) as tiempo_minimo,
-                    MAX(eh.minutos_en_estado_anterior) as tiempo_maximo
-                FROM tu_pedido_estado_historial eh
-                WHERE eh.estado_anterior IS NOT NULL 
-                    AND eh.minutos_en_estado_anterior >= 0
-                    AND eh.minutos_en_estado_anterior IS NOT NULL
+                    d.año * 1000 + d.mes::integer * 10 + %s AS id,
+                    d.año as año,
+                    d.mes as mes,
+                    d.estado as estado,
+                    SUM(d.total_pedidos) as total_pedidos,
+                    FLOOR(SUM(d.tiempo_total)::numeric / SUM(d.total_pedidos))::integer as tiempo_promedio,
+                    SUM(d.tiempo_total) as tiempo_total,
+                    MIN(d.tiempo_minimo) as tiempo_minimo,
+                    MAX(d.tiempo_maximo) as tiempo_maximo
+                FROM (%s) d
                 GROUP BY 
-                    EXTRACT(year FROM eh.fecha_cambio),
-                    EXTRACT(month FROM eh.fecha_cambio),
-                    eh.estado_anterior
-                ORDER BY 
-                    EXTRACT(year FROM eh.fecha_cambio) DESC,
-                    EXTRACT(month FROM eh.fecha_cambio) DESC
+                    d.año,
+                    d.mes,
+                    d.estado
             )
-        """ % self._table)
\ No newline at end of file
+        """ % (self._table, SQL_POSICION_ESTADO.format(columna='d.estado'), SQL_TIEMPOS_ESTADO))
\ No newline at end of file
@@ -0,0 +1,109 @@
+from odoo import models, fields
+from odoo.exceptions import UserError, ValidationError
+import logging
+
+_logger = logging.getLogger(__name__)
+
+# Secuencia del botón "siguiente estado"
+SECUENCIA_ESTADOS_COCINA = ('nuevo', 'aceptado', 'preparacion', 'terminado', 'despachado', 'entregado')
+
+# Estado destino -> transición. ``valores`` son métodos ``_valores_transicion_<nombre>``
+# que devuelven, para todo el recordset, ``{id: campos}`` a escribir junto con el
+# estado; ``efectos`` son métodos
+# ``_efecto_transicion_<nombre>`` que se ejecutan sobre el recordset después del write.
+# El mixin los define vacíos y cada modelo implementa los que le corresponden.
+TRANSICIONES_COCINA = {
+    'nuevo': {'valores': ('tipo_entrega',), 'efectos': ()},
+    'aceptado': {'valores': ('tipo_entrega', 'snapshot'), 'efectos': ('snapshot',)},
+    'preparacion': {'valores': (), 'efectos': ()},
+    'terminado': {'valores': ('tipo_entrega',), 'efectos': ('confirmar', 'notificar_envio')},
+    'despachado': {'valores': (), 'efectos': ()},
+    'entregado': {'valores': (), 'efectos': ()},
+    'rechazado': {'valores': (), 'efectos': ()},
+}
+
+
+class EstadoCocinaMixin(models.AbstractModel):
+    _name = 'tu_pedido.estado.mixin'
+    _description = 'Transiciones de estado de pedidos de cocina'
+
+    def action_cambiar_estado(self, nuevo_estado, valores=None):
+        """Cambiar el estado de cocina de todos los pedidos del recordset.
+
+        Los campos de cada pedido (estado, inicio del estado, sonido y los que
+        aporta la transición) se calculan antes de escribir y se aplican con un
+        ``write`` por conjunto de valores; el historial se registra en un solo
+        ``create`` y los efectos corren una vez sobre el recordset. Todo ocurre en
+        un savepoint: si una validación falla se deshace el lote completo y se
+        devuelve False. Los demás errores (p. ej. ``SerializationFailure``) se
+        propagan para que Odoo reintente la petición.
+
+        :param valores: campos adicionales a escribir junto con el estado
+        """
+        try:
+            with self.env.cr.savepoint():
+                transicion = TRANSICIONES_COCINA[nuevo_estado]
+                pedidos = self.filtered(lambda o: o.estado_rapido != nuevo_estado)
+                if not pedidos:
+                    return True
+                ahora = fields.Datetime.now()
+                pedidos._registrar_historial_estados(nuevo_estado, ahora)
+                valores_transicion = [
+                    getattr(pedidos, f'_valores_transicion_{nombre}')() for nombre in transicion['valores']
+                ]
+
+                grupos = {}
+                for pedido in pedidos:
+                    vals = dict(valores or {}, estado_rapido=nuevo_estado, tiempo_inicio_estado=ahora)
+                    # Desactivar sonido cuando sale del estado "nuevo"
+                    if pedido.estado_rapido == 'nuevo':
+                        vals['sonido_activo'] = False
+                    for por_pedido in valores_transicion:
+                        vals.update(por_pedido.get(pedido.id, {}))
+                    grupo = grupos.setdefault(tuple(sorted(vals.items())), [vals, []])
+                    grupo[1].append(pedido.id)
+                for vals, ids in grupos.values():
+                    pedidos.browse(ids).write(vals)
+
+                for nombre in transicion['efectos']:
+                    getattr(pedidos, f'_efecto_transicion_{nombre}')()
+                return True
+        except (UserError, ValidationError) as e:
+            _logger.error(f"Error en action_cambiar_estado: {e}")
+            return False
+
+    def action_siguiente_estado(self):
+        """Avanzar cada pedido al siguiente estado, agrupando por estado destino"""
+        por_destino = {}
+        for pedido in self:
+            siguiente = pedido._siguiente_estado_cocina()
+            if siguiente:
+                por_destino.setdefault(siguiente, []).append(pedido.id)
+        # Lista y no generador: un grupo que falla no debe impedir mover los demás
+        resultados = [self.browse(ids).action_cambiar_estado(estado) for estado, ids in por_destino.items()]
+        return all(resultados)
+
+    def _siguiente_estado_cocina(self):
+        self.ensure_one()
+        if self.estado_rapido not in SECUENCIA_ESTADOS_COCINA:
+            return False
+        indice = SECUENCIA_ESTADOS_COCINA.index(self.estado_rapido)
+        return SECUENCIA_ESTADOS_COCINA[indice + 1] if indice < len(SECUENCIA_ESTADOS_COCINA) - 1 else False
+
+    def _registrar_historial_estados(self, nuevo_estado, ahora):
+        pass
+
+    def _valores_transicion_tipo_entrega(self):
+        return {}
+
+    def _valores_transicion_snapshot(self):
+        return {}
+
+    def _efecto_transicion_snapshot(self):
+        pass
+
+    def _efecto_transicion_confirmar(self):
+        pass
+
+    def _efecto_transicion_notificar_envio(self):
+        pass
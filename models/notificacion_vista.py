@@ -0,0 +1,47 @@
+from odoo import models, fields, api
+
+
+class NotificacionVista(models.Model):
+    """Pedidos web que cada terminal (sesión PoS) ya vio.
+
+    Las consultas de notificaciones son de solo lectura: el estado "visto" se
+    guarda aquí con una fila por sesión y pedido confirmado, en lugar de escribir
+    en ``sale.order`` en cada revisión. Se guardan los ids confirmados y no un
+    máximo: un carrito creado antes que otro puede confirmarse después de que la
+    terminal vio el más nuevo, y tiene que seguir apareciendo como nuevo.
+    """
+    _name = 'tu_pedido.notificacion.vista'
+    _description = 'Pedidos web vistos por terminal PoS'
+
+    session_id = fields.Many2one('pos.session', string='Sesión PoS', required=True, ondelete='cascade')
+    pedido_id = fields.Many2one('sale.order', string='Pedido web', required=True, ondelete='cascade')
+    fecha_ack = fields.Datetime(string='Acuse')
+
+    _sql_constraints = [
+        ('sesion_pedido_unico', 'unique(session_id, pedido_id)', 'Cada pedido se confirma una sola vez por sesión PoS.'),
+    ]
+
+    @api.model
+    def _confirmar_vistos(self, session_id, pedido_ids):
+        """Marcar ``pedido_ids`` como vistos por la sesión con un solo insert.
+
+        Solo se registran pedidos web existentes; los ya confirmados se ignoran.
+        Devuelve los ids efectivamente vistos por la sesión entre los recibidos.
+        """
+        pedido_ids = [int(pedido_id) for pedido_id in pedido_ids or []]
+        if not session_id or not pedido_ids:
+            return []
+        self.env.cr.execute("""
+            INSERT INTO tu_pedido_notificacion_vista
+                   (session_id, pedido_id, fecha_ack, create_uid, create_date, write_uid, write_date)
+            SELECT %(sesion)s, so.id, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC', %(uid)s, now() at time zone 'UTC'
+              FROM sale_order so
+             WHERE so.id = ANY(%(pedidos)s) AND so.website_id IS NOT NULL
+            ON CONFLICT (session_id, pedido_id) DO NOTHING
+        """, {'sesion': int(session_id), 'pedidos': pedido_ids, 'uid': self.env.uid})
+        self.invalidate_model()
+        self.env.cr.execute("""
+            SELECT pedido_id FROM tu_pedido_notificacion_vista
+             WHERE session_id = %s AND pedido_id = ANY(%s)
+        """, (int(session_id), pedido_ids))
+        return [fila[0] for fila in self.env.cr.fetchall()]
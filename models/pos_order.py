@@ -1,7 +1,17 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from psycopg2 import errors as pg_errors
+from .sale_order import ESTADOS_COCINA_ACTIVOS, PREDICADO_COCINA_ACTIVO
+
+# Campos de pos.order cuyo cambio debe refrescar la tarjeta en cocina
+CAMPOS_EVENTO_COCINA = {
+    'estado_rapido', 'enviado_a_cocina', 'state', 'partner_id', 'sonido_activo',
+    'is_delivery', 'direccion_delivery', 'telefono_delivery', 'etiqueta_cocina',
+    'tiempo_inicio_estado', 'tiempo_inicio_total', 'amount_total',
+}
 
 class PosOrder(models.Model):
-    _inherit = 'pos.order'
+    _name = 'pos.order'
+    _inherit = ['pos.order', 'tu_pedido.estado.mixin']
     
 
     
@@ -16,13 +26,11 @@ class PosOrder(models.Model):
     def _pedido_ya_enviado_a_cocina(self, tracking_number):
         """Verificar si el pedido ya fue enviado a cocina usando identificador único"""
         try:
-            # Buscar en sale.order por identificador único en notas
-            existing_sale_orders = self.env['sale.order'].sudo().search([
-                ('nota_cocina', 'ilike', f'[REF:{tracking_number}]'),
-                ('estado_rapido', '!=', False)
-            ])
+            # Buscar en sale.order por referencia de cocina (sesión + tracking)
+            referencia = self.env['sale.order']._formatear_referencia_cocina(self.session_id.id, tracking_number)
+            existing_sale_order = self.env['sale.order']._buscar_por_referencia_cocina(referencia)
             
-            if existing_sale_orders:
+            if existing_sale_order.estado_rapido:
                 print(f"DEBUG: Pedido {tracking_number} ya existe en dashboard")
                 return True
             
@@ -51,8 +59,25 @@ class PosOrder(models.Model):
                     if not record.direccion_delivery and not vals.get('direccion_delivery'):
                         vals['direccion_delivery'] = 'Dirección no especificada'
             
+            # Retirados de cocina: ya no cumplen el dominio del tablero y tienen que
+            # informarse como baja aunque no vuelvan a escribirse
+            retirados = self._en_tablero_cocina() if 'enviado_a_cocina' in vals and not vals['enviado_a_cocina'] else self.browse()
+            
             result = super().write(vals)
             
+            self.env['tu_pedido.baja.cocina'].sudo()._registrar(retirados)
+            
+            if CAMPOS_EVENTO_COCINA.intersection(vals):
+                if vals.get('state') == 'cancel':
+                    evento = 'cancelado'
+                elif 'enviado_a_cocina' in vals:
+                    evento = 'nuevo'
+                elif 'estado_rapido' in vals:
+                    evento = 'estado'
+                else:
+                    evento = 'actualizado'
+                self._encolar_evento_cocina(evento)
+            
             # Detectar cuando cambia el estado (sin bloquear)
             for order in self:
                 try:
@@ -72,6 +97,14 @@ class PosOrder(models.Model):
             print(f"DEBUG: Error en write: {e}")
             return super().write(vals)
     
+    def unlink(self):
+        self.env['tu_pedido.baja.cocina'].sudo()._registrar(self._en_tablero_cocina())
+        return super().unlink()
+    
+    def _en_tablero_cocina(self):
+        """Pedidos enviados a cocina en un estado que se lista en el tablero"""
+        return self.filtered(lambda p: p.enviado_a_cocina and p.estado_rapido in ESTADOS_COCINA_ACTIVOS)
+    
     # Campos para integración con tu_pedido (opcionales para evitar errores IndexedDB)
     estado_rapido = fields.Selection([
         ('nuevo', 'Nuevo'),
@@ -98,6 +131,23 @@ class PosOrder(models.Model):
     tiempo_inicio_total = fields.Datetime(string='Inicio Total', required=False)
     sonido_activo = fields.Boolean(string='Sonido Activo', default=True, required=False)
     enviado_a_cocina = fields.Boolean(string='Enviado a Cocina', default=False, required=False)
+    # Nombre de la tarjeta en cocina ("Terraza Mesa 3", "🚚 DELIVERY 042"); no depende
+    # del piso ni de la mesa: al renombrarlos se recalcula en lote en los pedidos activos
+    etiqueta_cocina = fields.Char(string='Etiqueta en Cocina', compute='_compute_etiqueta_cocina', store=True)
+    
+    def init(self):
+        super().init()
+        # estado_rapido vale 'nuevo' por defecto en todos los pedidos PoS: los
+        # índices parciales se limitan a los enviados a cocina
+        tools.create_index(
+            self._cr, 'pos_order_tu_pedido_activo_idx', self._table,
+            ['estado_rapido', 'is_delivery'],
+            where=f"enviado_a_cocina AND {PREDICADO_COCINA_ACTIVO}",
+        )
+        tools.create_index(
+            self._cr, 'pos_order_tu_pedido_write_date_idx', self._table,
+            ['write_date'], where="enviado_a_cocina",
+        )
     
     # Campos computados para tiempos
     tiempo_estado_minutos = fields.Integer(string='Minutos en Estado', compute='_compute_tiempos', store=False)
@@ -123,6 +173,38 @@ class PosOrder(models.Model):
             else:
                 record.tiempo_total_minutos = 0
     
+    @api.depends('enviado_a_cocina', 'is_delivery', 'tracking_number', 'table_id')
+    def _compute_etiqueta_cocina(self):
+        for order in self:
+            order.etiqueta_cocina = order._etiqueta_cocina() if order.enviado_a_cocina else False
+    
+    def _etiqueta_cocina(self):
+        self.ensure_one()
+        if self.is_delivery:
+            return f"🚚 DELIVERY {self.tracking_number}"
+        if self.table_id:
+            return f"{self.table_id.floor_id.name or 'Piso'} Mesa {self.table_id.table_number}"
+        return self.tracking_number
+    
+    @api.model
+    def _recalcular_etiquetas_cocina(self, dominio):
+        """Recalcular la etiqueta de los pedidos activos en cocina que cumplen ``dominio``.
+
+        Se usa al renombrar pisos o mesas: un ``write`` por etiqueta distinta, que
+        además actualiza las tarjetas del dashboard.
+        """
+        pedidos = self.search(dominio + [
+            ('enviado_a_cocina', '=', True),
+            ('estado_rapido', 'in', ESTADOS_COCINA_ACTIVOS),
+        ])
+        por_etiqueta = {}
+        for pedido in pedidos:
+            etiqueta = pedido._etiqueta_cocina()
+            if etiqueta != pedido.etiqueta_cocina:
+                por_etiqueta.setdefault(etiqueta, []).append(pedido.id)
+        for etiqueta, ids in por_etiqueta.items():
+            self.browse(ids).write({'etiqueta_cocina': etiqueta})
+    
     def action_enviar_a_cocina(self):
         """Enviar pedido PoS al dashboard de cocina"""
         print(f"DEBUG: === ACTION_ENVIAR_A_COCINA INICIADO ===")
@@ -132,14 +214,7 @@ class PosOrder(models.Model):
         print(f"DEBUG: Enviado a cocina: {getattr(self, 'enviado_a_cocina', 'NO DEFINIDO')}")
         self.ensure_one()
         
-        # Verificar si ya fue enviado
-        existing_sale_order = self._buscar_orden_existente(self.tracking_number)
-        if existing_sale_order:
-            print(f"DEBUG: Pedido {self.tracking_number} ya existe, actualizando")
-            self._actualizar_orden_existente(existing_sale_order)
-            return True
-        
-        # Crear orden de venta para el dashboard
+        # Crear orden de venta para el dashboard, o reutilizar la ya enviada
         order_vals = {
             'name': self.name,
             'partner_id': self.partner_id.id if self.partner_id else self.env.ref('base.public_partner').id,
@@ -149,33 +224,16 @@ class PosOrder(models.Model):
             'tiempo_inicio_total': fields.Datetime.now(),
             'sonido_activo': True,
             'nota_cocina': self._obtener_notas_cocina_con_ref(),
+            'referencia_cocina': self._referencia_cocina(),
         }
+        sale_order, creado = self.env['sale.order']._ingerir_pedido_cocina(order_vals)
+        if not creado:
+            print(f"DEBUG: Pedido {self.tracking_number} ya existe, actualizando")
+            self._actualizar_orden_existente(sale_order)
+            return True
         
-        # Crear la orden
-        sale_order = self.env['sale.order'].create(order_vals)
-        
-        # Crear líneas de productos con atributos y combos
-        for line in self.lines:
-            # Solo procesar líneas principales (no items de combo)
-            if hasattr(line, 'combo_parent_id') and line.combo_parent_id:
-                continue  # Saltar items de combo, se procesan con el padre
-            
-            # Construir nombre completo con atributos
-            product_name = self._construir_nombre_con_atributos(line)
-            
-            line_vals = {
-                'order_id': sale_order.id,
-                'product_id': line.product_id.id,
-                'product_uom_qty': line.qty,
-                'price_unit': line.price_unit,
-                'name': product_name,
-            }
-            
-            # Crear línea principal
-            main_line = self.env['sale.order.line'].create(line_vals)
-            
-            # Agregar items de combo si existen
-            self._crear_items_combo_reales(line, sale_order.id)
+        # Crear líneas de productos con atributos y combos en un solo create
+        sale_order._aplicar_lineas_cocina(self._vals_lineas_cocina())
         
         # Detectar tipo de pedido antes de marcar como enviado
         self._detectar_tipo_pedido()
@@ -195,40 +253,24 @@ class PosOrder(models.Model):
         print(f"DEBUG: Enviado a cocina final: {self.enviado_a_cocina}")
         return True
     
-    def _buscar_orden_existente(self, tracking_number):
+    def _referencia_cocina(self):
+        """Referencia única del pedido en cocina (sesión + tracking)"""
+        return self.env['sale.order']._formatear_referencia_cocina(self.session_id.id, self.tracking_number)
+    
+    def _buscar_orden_existente(self):
         """Buscar orden existente en sale.order"""
-        return self.env['sale.order'].sudo().search([
-            ('nota_cocina', 'ilike', f'[REF:{tracking_number}]'),
-            ('estado_rapido', '!=', False)
-        ], limit=1)
+        sale_order = self.env['sale.order']._buscar_por_referencia_cocina(self._referencia_cocina())
+        return sale_order if sale_order.estado_rapido else sale_order.browse()
     
     def _actualizar_orden_existente(self, sale_order):
         """Actualizar orden existente con cambios de productos"""
         try:
             print(f"DEBUG: Actualizando orden existente {sale_order.name}")
             
-            # Verificar si hay cambios en productos
-            if self._hay_cambios_productos(sale_order):
+            # Aplicar solo las diferencias: las líneas sin cambios conservan su marca de completado
+            if sale_order._aplicar_lineas_cocina(self._vals_lineas_cocina()):
                 print(f"DEBUG: Detectados cambios en productos")
                 
-                # Eliminar líneas existentes
-                sale_order.order_line.unlink()
-                
-                # Crear nuevas líneas con productos actuales
-                for line in self.lines:
-                    product_name = self._construir_nombre_con_atributos(line)
-                    
-                    line_vals = {
-                        'order_id': sale_order.id,
-                        'product_id': line.product_id.id,
-                        'product_uom_qty': line.qty,
-                        'price_unit': line.price_unit,
-                        'name': product_name,
-                    }
-                    
-                    main_line = self.env['sale.order.line'].create(line_vals)
-                    self._crear_lineas_combo(line, sale_order.id, main_line.id)
-                
                 # Actualizar notas con nueva información
                 sale_order.write({
                     'nota_cocina': self._obtener_notas_cocina_con_ref(),
@@ -246,37 +288,6 @@ class PosOrder(models.Model):
             print(f"DEBUG: Error actualizando orden existente: {e}")
             return False
     
-    def _hay_cambios_productos(self, sale_order):
-        """Verificar si hay cambios en los productos"""
-        try:
-            print(f"DEBUG: Comparando productos - PoS lines: {len(self.lines)}, Sale lines: {len(sale_order.order_line)}")
-            
-            # Crear hash simple de productos actuales
-            pos_hash = []
-            for line in self.lines:
-                item = f"{line.product_id.id}|{line.qty}|{self._construir_nombre_con_atributos(line)}"
-                pos_hash.append(item)
-            pos_hash.sort()
-            
-            # Crear hash de productos existentes (excluyendo líneas de combo)
-            sale_hash = []
-            for line in sale_order.order_line:
-                if not line.name.startswith('  →'):  # Excluir líneas de combo
-                    item = f"{line.product_id.id}|{int(line.product_uom_qty)}|{line.name}"
-                    sale_hash.append(item)
-            sale_hash.sort()
-            
-            print(f"DEBUG: PoS hash: {pos_hash}")
-            print(f"DEBUG: Sale hash: {sale_hash}")
-            
-            hay_cambios = pos_hash != sale_hash
-            print(f"DEBUG: Hay cambios: {hay_cambios}")
-            return hay_cambios
-            
-        except Exception as e:
-            print(f"DEBUG: Error comparando productos: {e}")
-            return True
-    
     def _obtener_notas_cocina_con_ref(self):
         """Obtener notas para mostrar en cocina con identificador único"""
         notas = []
@@ -334,28 +345,32 @@ class PosOrder(models.Model):
         
         return atributos
     
-    def _crear_items_combo_reales(self, pos_line, sale_order_id):
-        """Crear líneas para los items reales del combo"""
-        try:
-            # Buscar items de combo que tienen este como padre
-            combo_items = [line for line in self.lines 
-                          if hasattr(line, 'combo_parent_id') and 
-                          line.combo_parent_id and 
-                          line.combo_parent_id.id == pos_line.id]
-            
-            for combo_item in combo_items:
-                item_name = self._construir_nombre_con_atributos(combo_item)
-                combo_vals = {
-                    'order_id': sale_order_id,
+    def _vals_lineas_cocina(self):
+        """Valores de las líneas de cocina: cada línea principal seguida de los items de su combo"""
+        items_combo = {}
+        principales = []
+        for line in self.lines:
+            if hasattr(line, 'combo_parent_id') and line.combo_parent_id:
+                items_combo.setdefault(line.combo_parent_id.id, []).append(line)
+            else:
+                principales.append(line)
+        
+        vals_list = []
+        for line in principales:
+            vals_list.append({
+                'product_id': line.product_id.id,
+                'product_uom_qty': line.qty,
+                'price_unit': line.price_unit,
+                'name': self._construir_nombre_con_atributos(line),
+            })
+            for combo_item in items_combo.get(line.id, []):
+                vals_list.append({
                     'product_id': combo_item.product_id.id,
                     'product_uom_qty': combo_item.qty,
                     'price_unit': combo_item.price_unit,
-                    'name': f"  → {item_name}",  # Indentar para mostrar que es parte del combo
-                }
-                self.env['sale.order.line'].create(combo_vals)
-                    
-        except Exception as e:
-            print(f"DEBUG: Error creando items combo: {e}")
+                    'name': f"  → {self._construir_nombre_con_atributos(combo_item)}",  # Indentar para mostrar que es parte del combo
+                })
+        return vals_list
     
     def _es_producto_combo(self, product):
         """Verificar si un producto es tipo combo usando product.combo.item"""
@@ -402,12 +417,9 @@ class PosOrder(models.Model):
             for line in self.lines:
                 print(f"DEBUG: Producto: '{line.product_id.name}'")
             
-            # Verificar si tiene producto "envio estandar" para activar delivery
+            # Verificar si tiene un producto de envío para activar delivery
             has_delivery_product = any(
-                'envio' in line.product_id.name.lower() or 
-                'envío' in line.product_id.name.lower() or
-                'delivery' in line.product_id.name.lower() or
-                'entrega' in line.product_id.name.lower()
+                line.product_id.product_tmpl_id.tipo_entrega_producto == 'envio'
                 for line in self.lines
             )
             
@@ -471,34 +483,12 @@ class PosOrder(models.Model):
             
         return ', '.join(direccion_parts) if direccion_parts else False
     
-    def action_cambiar_estado(self, nuevo_estado):
-        """Cambiar estado del pedido PoS"""
-        self.ensure_one()
-        if self.estado_rapido != nuevo_estado:
-            vals = {
-                'estado_rapido': nuevo_estado,
-                'tiempo_inicio_estado': fields.Datetime.now()
-            }
-            # Desactivar sonido cuando sale del estado "nuevo"
-            if self.estado_rapido == "nuevo" and nuevo_estado != "nuevo":
-                vals['sonido_activo'] = False
-            
-            self.write(vals)
-        return True
-    
-    def action_siguiente_estado(self):
-        """Avanzar al siguiente estado"""
-        estados = ['nuevo', 'aceptado', 'preparacion', 'terminado', 'despachado', 'entregado']
-        if self.estado_rapido in estados:
-            current_index = estados.index(self.estado_rapido)
-            if current_index < len(estados) - 1:
-                next_estado = estados[current_index + 1]
-                self.action_cambiar_estado(next_estado)
-                
-                # Notificar si es delivery y está terminado
-                if next_estado == 'terminado' and self.is_delivery:
-                    self._notificar_delivery_listo()
-        return True
+    def _efecto_transicion_notificar_envio(self):
+        for order in self.filtered('is_delivery'):
+            try:
+                order._notificar_delivery_listo()
+            except Exception as e:
+                print(f"DEBUG: Error notificando delivery PoS {order.name}: {e}")
     
     def _notificar_delivery_listo(self):
         """Notificar que el pedido delivery está listo para envío"""
@@ -521,11 +511,8 @@ class PosOrder(models.Model):
     def _marcar_sale_order_cancelado(self):
         """Marcar sale.order correspondiente como cancelado"""
         try:
-            # Buscar sale.order correspondiente por tracking_number
-            sale_order = self.env['sale.order'].sudo().search([
-                ('nota_cocina', 'ilike', f'[REF:{self.tracking_number}]'),
-                ('estado_rapido', '!=', False)
-            ], limit=1)
+            # Buscar sale.order correspondiente por referencia de cocina
+            sale_order = self._buscar_orden_existente()
             
             if sale_order:
                 # Agregar marca de cancelado en la nota_cocina
@@ -540,6 +527,15 @@ class PosOrder(models.Model):
         except Exception as e:
             print(f"DEBUG: Error marcando sale.order como cancelado: {e}")
     
+    def _id_tarjeta_cocina(self):
+        """Identificador de la tarjeta del pedido en el dashboard"""
+        return f'pos_{self.id}'
+    
+    def _encolar_evento_cocina(self, evento):
+        """Encolar un evento de cocina para los pedidos enviados al tablero"""
+        pedidos = self.filtered(lambda p: p.enviado_a_cocina and p.estado_rapido)
+        self.env['sale.order']._registrar_eventos_cocina(self._name, pedidos.ids, evento)
+    
     @api.model
     def enviar_orden_dashboard(self, order_id):
         """Método específico para ser llamado desde JavaScript del PoS"""
@@ -549,6 +545,8 @@ class PosOrder(models.Model):
                 print(f"DEBUG: enviar_orden_dashboard llamado para {order.name}")
                 return order.action_enviar_a_cocina()
             return True
+        except pg_errors.SerializationFailure:
+            raise  # Odoo reintenta la llamada y el reintento encuentra el pedido
         except Exception as e:
             print(f"DEBUG: Error en enviar_orden_dashboard: {e}")
             return False
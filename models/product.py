@@ -0,0 +1,80 @@
+from odoo import models, fields, api
+from odoo.tools.lru import LRU
+import re
+
+# Palabras clave de los productos de envío y de retiro en tienda (con o sin tilde)
+PATRON_RETIRO = re.compile(r'recolecci[oó]n en tienda|retiro en tienda|pickup', re.IGNORECASE)
+PATRON_ENVIO = re.compile(r'env[ií]o|delivery|shipping|entrega', re.IGNORECASE)
+
+
+def clasificar_tipo_entrega(nombre):
+    """'retiro', 'envio' o False según el nombre del producto; el retiro tiene prioridad"""
+    if not nombre:
+        return False
+    if PATRON_RETIRO.search(nombre):
+        return 'retiro'
+    if PATRON_ENVIO.search(nombre):
+        return 'envio'
+    return False
+
+
+# (base de datos, idioma, nombre) -> id de product.product de los nombres recibidos
+# del PoS; cada id se valida contra la base antes de usarlo
+CACHE_NOMBRES_COCINA = LRU(4096)
+
+
+class ProductTemplate(models.Model):
+    _inherit = 'product.template'
+
+    tipo_entrega_producto = fields.Selection([
+        ('envio', 'Envío'),
+        ('retiro', 'Retiro en tienda'),
+    ], string='Tipo de entrega', compute='_compute_tipo_entrega_producto', store=True,
+        help="Clasificación por nombre usada para detectar pedidos con envío")
+
+    @api.depends('name')
+    def _compute_tipo_entrega_producto(self):
+        for template in self:
+            template.tipo_entrega_producto = clasificar_tipo_entrega(template.name)
+
+
+class ProductProduct(models.Model):
+    _inherit = 'product.product'
+
+    @api.model
+    def _ids_por_nombre_cocina(self, nombres):
+        """Resolver nombres exactos a ids, creando de una vez los productos que falten.
+
+        Los ids ya resueltos se guardan por base de datos e idioma en
+        ``CACHE_NOMBRES_COCINA`` (solo los nombres pedidos) y se validan en cada
+        llamada con una lectura por id: un producto renombrado, archivado o
+        eliminado en cualquier worker se vuelve a buscar por nombre, sin limpiar
+        cachés del registro. Ante nombres repetidos gana el primero según el orden
+        por defecto, igual que la búsqueda por nombre exacto con ``limit=1``.
+        """
+        Product = self.sudo()
+        clave = (self.env.cr.dbname, self.env.lang)
+        nombres = list(dict.fromkeys(nombres))
+        en_cache = {nombre: CACHE_NOMBRES_COCINA.get(clave + (nombre,)) for nombre in nombres}
+        ids_cache = [product_id for product_id in en_cache.values() if product_id]
+        vigentes = {
+            (product['id'], product['name'])
+            for product in (Product.search_read([('id', 'in', ids_cache)], ['name']) if ids_cache else [])
+        }
+        resultado = {nombre: product_id for nombre, product_id in en_cache.items() if (product_id, nombre) in vigentes}
+
+        buscar = [nombre for nombre in nombres if nombre not in resultado]
+        if buscar:
+            for product in Product.search_read([('name', 'in', buscar)], ['name']):
+                resultado.setdefault(product['name'], product['id'])
+        faltantes = [nombre for nombre in nombres if nombre not in resultado]
+        if faltantes:
+            nuevos = Product.create([{
+                'name': nombre,
+                'type': 'consu',
+                'list_price': 0.0,
+            } for nombre in faltantes])
+            resultado.update(zip(faltantes, nuevos.ids))
+        for nombre in buscar:
+            CACHE_NOMBRES_COCINA[clave + (nombre,)] = resultado[nombre]
+        return resultado
@@ -0,0 +1,21 @@
+from odoo import models
+
+
+class RestaurantFloor(models.Model):
+    _inherit = 'restaurant.floor'
+
+    def write(self, vals):
+        result = super().write(vals)
+        if 'name' in vals:
+            self.env['pos.order'].sudo()._recalcular_etiquetas_cocina([('table_id.floor_id', 'in', self.ids)])
+        return result
+
+
+class RestaurantTable(models.Model):
+    _inherit = 'restaurant.table'
+
+    def write(self, vals):
+        result = super().write(vals)
+        if {'table_number', 'floor_id'}.intersection(vals):
+            self.env['pos.order'].sudo()._recalcular_etiquetas_cocina([('table_id', 'in', self.ids)])
+        return result
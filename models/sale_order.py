@@ -1,8 +1,73 @@
-from odoo import models, fields, api
+from odoo import models, fields, api, tools
+from collections import Counter
 from datetime import datetime, timedelta
+import hashlib
+import json
+import logging
+import re
+from psycopg2 import errors as pg_errors
+
+_logger = logging.getLogger(__name__)
+
+
+def hash_linea_cocina(product_id, cantidad, nombre):
+    """Hash estable del contenido de una línea de cocina (producto, cantidad y nombre)"""
+    contenido = f"{product_id or 0}|{round(float(cantidad or 0), 3)}|{nombre or ''}"
+    return hashlib.sha1(contenido.encode('utf-8')).hexdigest()
+
+# "TerrazaMesa3" -> "Terraza Mesa 3"
+PATRON_NOMBRE_MESA = re.compile(r'^([A-Za-z]+)(Mesa)(\d+)$')
+
+
+def formatear_nombre_mesa(name):
+    """Separar piso y número de mesa: "TerrazaMesa3" -> "Terraza Mesa 3" """
+    if not name:
+        return name
+    match = PATRON_NOMBRE_MESA.match(name)
+    if match:
+        return f"{match.group(1)} Mesa {match.group(3)}"
+    return name
+
+# Estados en los que un pedido sigue en el tablero de cocina. Las consultas sobre
+# pedidos activos deben filtrar con ``in`` sobre esta lista para que PostgreSQL
+# pueda usar los índices parciales (un ``not in`` del ORM agrega ``OR IS NULL``)
+ESTADOS_COCINA_ACTIVOS = ('nuevo', 'aceptado', 'preparacion', 'terminado', 'despachado')
+PREDICADO_COCINA_ACTIVO = "estado_rapido IN (%s)" % ", ".join(f"'{estado}'" for estado in ESTADOS_COCINA_ACTIVOS)
+
+# Estados en los que se controla que no cambien los productos aceptados por la cocina
+ESTADOS_SNAPSHOT_COCINA = ('aceptado', 'preparacion', 'terminado', 'despachado')
+# Campos de sale.order.line que forman su huella (ver ``hash_linea_cocina``)
+CAMPOS_HUELLA_LINEA = {'product_id', 'product_uom_qty', 'name'}
+
+# Eventos de cocina publicados por bus.bus; ante varios eventos del mismo pedido
+# en una transacción se publica el de mayor prioridad
+PRIORIDAD_EVENTOS_COCINA = {
+    'actualizado': 0,
+    'lineas': 1,
+    'estado': 2,
+    'nuevo': 3,
+    'cancelado': 4,
+}
+CLAVE_EVENTOS_COCINA = 'tu_pedido_v2.eventos_cocina'
+
+# Pedidos a marcar con productos modificados antes del commit de la transacción
+CLAVE_PRODUCTOS_MODIFICADOS = 'tu_pedido_v2.productos_modificados'
+
+# Pedidos normalizados por ejecución del cron de cocina
+LOTE_NORMALIZACION_COCINA = 200
+
+# Campos de sale.order cuyo cambio debe refrescar la tarjeta en cocina
+# (y la fila de ``tu_pedido.analytics``, que toma de aquí los tiempos)
+CAMPOS_EVENTO_COCINA = {
+    'estado_rapido', 'nota_cocina', 'state', 'partner_id', 'sonido_activo',
+    'productos_modificados', 'productos_completados', 'es_para_envio',
+    'direccion_entrega_completa', 'tiene_reclamo', 'cliente_confirmo_recepcion',
+    'tiempo_inicio_estado', 'tiempo_inicio_total',
+}
 
 class SaleOrder(models.Model):
-    _inherit = "sale.order"
+    _name = "sale.order"
+    _inherit = ["sale.order", "tu_pedido.estado.mixin"]
 
     estado_rapido = fields.Selection([
         ("nuevo", "Nuevo"),
@@ -24,10 +89,38 @@ class SaleOrder(models.Model):
     tiene_reclamo = fields.Boolean(string="Tiene reclamo", default=False)
     descripcion_reclamo = fields.Text(string="Descripción del reclamo")
     productos_modificados = fields.Boolean(string="Productos modificados", default=False)
-    productos_snapshot = fields.Text(string="Snapshot de productos")
+    snapshot_linea_ids = fields.One2many('tu_pedido.snapshot.linea', 'pedido_id', string="Snapshot de productos")
+    snapshot_version = fields.Integer(string="Versión del snapshot", default=0, copy=False, help="0 si el pedido aún no tiene snapshot")
     es_para_envio = fields.Boolean(string="Es para envío", default=False)
     direccion_entrega_completa = fields.Text(string="Dirección de entrega completa")
     productos_completados = fields.Text(string="Productos completados", help="JSON con IDs de líneas completadas")
+    referencia_cocina = fields.Char(
+        string="Referencia cocina", copy=False, readonly=True,
+        help="Sesión PoS y número de seguimiento del pedido enviado a cocina (sesion-tracking)"
+    )
+    etiqueta_cocina = fields.Char(string="Etiqueta en cocina", compute="_compute_etiqueta_cocina", store=True)
+    
+    _sql_constraints = [
+        ('referencia_cocina_unica', 'unique(referencia_cocina)', 'Ya existe un pedido de cocina con esta referencia.'),
+    ]
+    
+    def init(self):
+        super().init()
+        # Índices parciales: solo cubren el conjunto de pedidos activos en cocina,
+        # no el historial de pedidos entregados
+        tools.create_index(
+            self._cr, 'sale_order_tu_pedido_activo_idx', self._table,
+            ['estado_rapido', 'es_para_envio'], where=PREDICADO_COCINA_ACTIVO,
+        )
+        tools.create_index(
+            self._cr, 'sale_order_tu_pedido_web_entrada_idx', self._table,
+            ['tiempo_inicio_total'], where=f"website_id IS NOT NULL AND {PREDICADO_COCINA_ACTIVO}",
+        )
+        # Cambios recientes para el modo incremental del dashboard
+        tools.create_index(
+            self._cr, 'sale_order_tu_pedido_write_date_idx', self._table,
+            ['write_date'], where="estado_rapido IS NOT NULL",
+        )
     
     # Campos computados para mostrar tiempos
     tiempo_estado_minutos = fields.Integer(string="Minutos en estado actual", compute="_compute_tiempos")
@@ -49,6 +142,11 @@ class SaleOrder(models.Model):
             else:
                 record.tiempo_total_minutos = 0
 
+    @api.depends('name')
+    def _compute_etiqueta_cocina(self):
+        for order in self:
+            order.etiqueta_cocina = formatear_nombre_mesa(order.name)
+
     @api.model
     def create(self, vals):
         # Establecer estado "nuevo" solo si no viene del eCommerce
@@ -67,11 +165,21 @@ class SaleOrder(models.Model):
         if result.estado_rapido == 'nuevo':
             result._detectar_tipo_entrega()
         
+        result._encolar_evento_cocina('nuevo')
         return result
     
     def write(self, vals):
         result = super().write(vals)
         
+        if CAMPOS_EVENTO_COCINA.intersection(vals):
+            if 'estado_rapido' in vals:
+                evento = 'estado'
+            elif vals.get('state') == 'cancel' or '[CANCELADO]' in (vals.get('nota_cocina') or ''):
+                evento = 'cancelado'
+            else:
+                evento = 'actualizado'
+            self._encolar_evento_cocina(evento)
+        
         # Si el estado cambia a 'sale' (confirmado) y es del eCommerce
         if vals.get('state') == 'sale' and self.website_id:
             import logging
@@ -86,9 +194,31 @@ class SaleOrder(models.Model):
             self._detectar_tipo_entrega()
             # Notificar nuevo pedido web al PoS
             self._notificar_pedido_web_pos()
+        elif {'partner_id', 'partner_shipping_id'}.intersection(vals):
+            # La dirección de entrega depende del cliente
+            self.filtered(lambda o: o.es_para_envio and o.estado_rapido not in (False, 'entregado', 'rechazado'))._detectar_tipo_entrega()
         
         return result
     
+    def unlink(self):
+        # Solo los pedidos que están en el tablero necesitan informarse como baja
+        self.env['tu_pedido.baja.cocina'].sudo()._registrar(
+            self.filtered(lambda o: o.estado_rapido in ESTADOS_COCINA_ACTIVOS)
+        )
+        return super().unlink()
+    
+    def _tocar_pedidos_cocina(self):
+        """Actualizar ``write_date`` de los pedidos del tablero cuyas líneas cambiaron,
+        para que el modo incremental del dashboard vuelva a enviar su tarjeta"""
+        pedidos = self.filtered(lambda o: o.estado_rapido in ESTADOS_COCINA_ACTIVOS)
+        if pedidos:
+            pedidos.flush_recordset(['write_date'])
+            self.env.cr.execute(
+                "UPDATE sale_order SET write_date = %s WHERE id = ANY(%s)",
+                [self.env.cr.now(), pedidos.ids],
+            )
+            pedidos.invalidate_recordset(['write_date'])
+    
     def action_confirm(self):
         """Override para interceptar confirmación de pedidos web"""
         result = super().action_confirm()
@@ -128,64 +258,50 @@ class SaleOrder(models.Model):
             'context': {'default_order_id': self.id}
         }
 
-    def action_cambiar_estado(self, nuevo_estado):
-        try:
-            estado_anterior = self.estado_rapido
-            tiempo_anterior = self.tiempo_inicio_estado
-            
-            # Calcular tiempo en estado anterior
+    def _registrar_historial_estados(self, nuevo_estado, ahora):
+        """Registrar en un solo create el tiempo que cada pedido pasó en su estado anterior"""
+        historial = []
+        for order in self:
+            if not order.estado_rapido:
+                continue
             minutos_en_estado = 0
-            if tiempo_anterior and estado_anterior:
-                ahora = fields.Datetime.now()
-                if ahora > tiempo_anterior:
-                    delta = ahora - tiempo_anterior
-                    minutos_en_estado = max(0, int(delta.total_seconds() / 60))
-            
-            # Registrar cambio en historial
-            if estado_anterior and estado_anterior != nuevo_estado:
-                self.env['tu_pedido.estado.historial'].create({
-                    'pedido_id': self.id,
-                    'estado_anterior': estado_anterior,
-                    'estado_nuevo': nuevo_estado,
-                    'fecha_cambio': fields.Datetime.now(),
-                    'minutos_en_estado_anterior': minutos_en_estado
-                })
-            
-            self.estado_rapido = nuevo_estado
-            self.tiempo_inicio_estado = fields.Datetime.now()
-            
-            # Desactivar sonido cuando cambia de estado "nuevo"
-            if estado_anterior == "nuevo" and nuevo_estado != "nuevo":
-                self.sonido_activo = False
-            
-            # Si llega a "aceptado", crear snapshot de productos
-            if nuevo_estado == "aceptado":
-                self._crear_snapshot_productos()
-                self.productos_modificados = False
-                self._detectar_tipo_entrega()
-            
-            # Si llega a "nuevo", detectar tipo de entrega
-            if nuevo_estado == "nuevo":
-                self._detectar_tipo_entrega()
-            
-            # Si llega a "terminado", confirmar la orden de venta y notificar delivery
-            if nuevo_estado == "terminado":
-                try:
-                    if self.state == "draft":
-                        self.action_confirm()
-                except:
-                    pass  # Ignorar errores de confirmación
-                
-                # Notificar si es delivery
-                if self.es_para_envio:
-                    self._notificar_delivery_terminado()
-            
-            return True
-        except Exception as e:
-            import logging
-            _logger = logging.getLogger(__name__)
-            _logger.error(f"Error en action_cambiar_estado: {e}")
-            return False
+            if order.tiempo_inicio_estado and ahora > order.tiempo_inicio_estado:
+                minutos_en_estado = max(0, int((ahora - order.tiempo_inicio_estado).total_seconds() / 60))
+            historial.append({
+                'pedido_id': order.id,
+                'estado_anterior': order.estado_rapido,
+                'estado_nuevo': nuevo_estado,
+                'fecha_cambio': ahora,
+                'minutos_en_estado_anterior': minutos_en_estado
+            })
+        if historial:
+            self.env['tu_pedido.estado.historial'].create(historial)
+    
+    def _valores_transicion_tipo_entrega(self):
+        return self._valores_tipo_entrega()
+    
+    def _valores_transicion_snapshot(self):
+        # La versión se escribe con el estado; las filas se guardan en el efecto
+        return {
+            order.id: {'productos_modificados': False, 'snapshot_version': order.snapshot_version + 1}
+            for order in self
+        }
+    
+    def _efecto_transicion_snapshot(self):
+        self._guardar_filas_snapshot()
+    
+    def _efecto_transicion_confirmar(self):
+        """Confirmar la orden de venta de los pedidos aún en borrador"""
+        for order in self.filtered(lambda o: o.state == "draft"):
+            try:
+                with self.env.cr.savepoint():
+                    order.action_confirm()
+            except Exception:
+                pass  # Ignorar errores de confirmación
+    
+    def _efecto_transicion_notificar_envio(self):
+        for order in self.filtered('es_para_envio'):
+            order._notificar_delivery_terminado()
     
     def _crear_pos_order_desde_sale(self):
         """Crear pos.order desde sale.order cuando se acepta en dashboard"""
@@ -245,62 +361,87 @@ class SaleOrder(models.Model):
         except Exception as e:
             print(f"DEBUG: Error creando pos.order: {e}")
     
-    def _crear_snapshot_productos(self):
-        """Crear snapshot de productos al aceptar pedido"""
-        productos_info = []
-        for line in self.order_line:
-            productos_info.append({
-                'product_id': line.product_id.id,
-                'name': line.name,
-                'product_uom_qty': line.product_uom_qty,
-                'price_unit': line.price_unit
-            })
-        import json
-        self.productos_snapshot = json.dumps(productos_info)
+    def _crear_snapshot_productos(self, excluir=None):
+        """Guardar la huella de cada línea como nueva versión del snapshot de productos.
+
+        :param excluir: líneas que no forman parte del snapshot (recién creadas)
+        """
+        for order in self:
+            order.snapshot_version += 1
+        self._guardar_filas_snapshot(excluir)
+    
+    def _guardar_filas_snapshot(self, excluir=None):
+        """Reemplazar las filas del snapshot por las líneas actuales con la versión vigente"""
+        Snapshot = self.env['tu_pedido.snapshot.linea'].sudo()
+        Snapshot.search([('pedido_id', 'in', self.ids)]).unlink()
+        # Las marcas pendientes se refieren al snapshot anterior
+        self.env.cr.precommit.data.get(CLAVE_PRODUCTOS_MODIFICADOS, set()).difference_update(self.ids)
+        vals_list = []
+        for order in self:
+            for line in order.order_line - (excluir or order.order_line.browse()):
+                vals_list.append(Snapshot._vals_desde_linea(line, order.snapshot_version))
+        Snapshot.create(vals_list)
+    
+    def _huellas_snapshot(self):
+        """Huellas del snapshot vigente en una consulta: ``{pedido_id: {linea_id: huella}}``"""
+        huellas = {order.id: {} for order in self}
+        filas = self.env['tu_pedido.snapshot.linea'].sudo().search_read(
+            [('pedido_id', 'in', self.ids)], ['pedido_id', 'linea_id', 'huella']
+        )
+        for fila in filas:
+            huellas[fila['pedido_id'][0]][fila['linea_id']] = fila['huella']
+        return huellas
+    
+    def _detectar_cambios_lineas(self, lineas):
+        """Marcar como modificados los pedidos donde alguna de ``lineas`` difiere del snapshot.
+
+        Solo se comparan las líneas tocadas contra su huella, sin recorrer el pedido completo.
+        """
+        huellas = self._huellas_snapshot()
+        modificados = self.browse()
+        for line in lineas:
+            snapshot = huellas.get(line.order_id.id)
+            if snapshot is not None and snapshot.get(line.id) != line._hash_cocina():
+                modificados |= line.order_id
+        modificados._marcar_productos_modificados()
+    
+    def _marcar_productos_modificados(self):
+        """Acumular los pedidos con productos modificados y marcarlos una sola vez antes del commit"""
+        if not self:
+            return
+        precommit = self.env.cr.precommit
+        pendientes = precommit.data.get(CLAVE_PRODUCTOS_MODIFICADOS)
+        if pendientes is None:
+            pendientes = precommit.data[CLAVE_PRODUCTOS_MODIFICADOS] = set()
+            precommit.add(self._aplicar_productos_modificados)
+        pendientes.update(self.ids)
+    
+    def _aplicar_productos_modificados(self):
+        """Marcar en un solo ``write`` los pedidos acumulados en la transacción"""
+        ids = self.env.cr.precommit.data.pop(CLAVE_PRODUCTOS_MODIFICADOS, set())
+        pedidos = self.env['sale.order'].sudo().browse(ids).exists().filtered(lambda o: not o.productos_modificados)
+        if pedidos:
+            pedidos.write({'productos_modificados': True})
+            self.env.flush_all()
     
     def _detectar_cambios_productos(self):
         """Detectar si hubo cambios en productos después de aceptar"""
         if self.estado_rapido in ['nuevo', 'entregado', 'rechazado']:
             return
         
-        # Si no hay snapshot, crearlo ahora (primera vez que se detecta cambio)
-        if not self.productos_snapshot:
-            # Crear snapshot temporal con productos actuales menos el último cambio
-            # Para poder comparar, necesitamos simular el estado anterior
-            self.productos_modificados = True
-            self.env.cr.commit()
+        # Sin snapshot no hay base para comparar
+        if not self.snapshot_version:
+            self._marcar_productos_modificados()
             return
         
         # Si ya está marcado como modificado, no volver a verificar
         if self.productos_modificados:
             return
         
-        try:
-            import json
-            productos_originales = json.loads(self.productos_snapshot)
-            productos_actuales = []
-            
-            for line in self.order_line:
-                productos_actuales.append({
-                    'product_id': line.product_id.id,
-                    'name': line.name,
-                    'product_uom_qty': line.product_uom_qty,
-                    'price_unit': line.price_unit
-                })
-            
-            # Comparar usando JSON strings ordenados
-            productos_orig_str = json.dumps(productos_originales, sort_keys=True)
-            productos_actual_str = json.dumps(productos_actuales, sort_keys=True)
-            
-            hay_cambios = productos_orig_str != productos_actual_str
-            
-            if hay_cambios:
-                self.productos_modificados = True
-                self.env.cr.commit()
-                
-        except Exception as e:
-            self.productos_modificados = True
-            self.env.cr.commit()
+        huellas_snapshot = Counter(self._huellas_snapshot()[self.id].values())
+        huellas_actuales = Counter(line._hash_cocina() for line in self.order_line)
+        if huellas_snapshot != huellas_actuales:
+            self._marcar_productos_modificados()
     
     def action_detectar_cambios_manual(self):
         """Botón manual para detectar cambios"""
@@ -320,63 +461,39 @@ class SaleOrder(models.Model):
     def get_detalles_cambios(self):
         """Obtener detalles de los cambios en productos"""
         # Si no hay snapshot, crearlo ahora con los productos actuales como base
-        if not self.productos_snapshot:
+        if not self.snapshot_version:
             self._crear_snapshot_productos()
             return {'agregados': [], 'modificados': [], 'eliminados': []}
         
         try:
-            import json
-            productos_originales = json.loads(self.productos_snapshot)
-            productos_actuales = []
-            
-            for line in self.order_line:
-                productos_actuales.append({
-                    'product_id': line.product_id.id,
-                    'name': line.name,
-                    'product_uom_qty': line.product_uom_qty,
-                    'price_unit': line.price_unit
-                })
-            
-            # Crear diccionarios para comparación usando product_id como clave
-            orig_dict = {p['product_id']: p for p in productos_originales}
-            actual_dict = {p['product_id']: p for p in productos_actuales}
+            originales = {fila.linea_id: fila for fila in self.snapshot_linea_ids}
             
             agregados = []
             modificados = []
-            eliminados = []
-            
-            # Productos agregados
-            for pid, producto in actual_dict.items():
-                if pid not in orig_dict:
+            for line in self.order_line:
+                fila = originales.pop(line.id, None)
+                if not fila:
                     agregados.append({
-                        'name': producto['name'],
-                        'qty': producto['product_uom_qty'],
+                        'name': line.name,
+                        'qty': line.product_uom_qty,
                         'tipo': 'agregado'
                     })
-            
-            # Productos eliminados
-            for pid, producto in orig_dict.items():
-                if pid not in actual_dict:
-                    eliminados.append({
-                        'name': producto['name'],
-                        'qty': producto['product_uom_qty'],
-                        'tipo': 'eliminado'
+                elif fila.huella != line._hash_cocina() or fila.price_unit != line.price_unit:
+                    modificados.append({
+                        'name': line.name,
+                        'qty_original': fila.product_uom_qty,
+                        'qty_nueva': line.product_uom_qty,
+                        'precio_original': fila.price_unit,
+                        'precio_nuevo': line.price_unit,
+                        'tipo': 'modificado'
                     })
             
-            # Productos modificados (cantidad o precio)
-            for pid, producto_actual in actual_dict.items():
-                if pid in orig_dict:
-                    producto_orig = orig_dict[pid]
-                    if (producto_actual['product_uom_qty'] != producto_orig['product_uom_qty'] or
-                        producto_actual['price_unit'] != producto_orig['price_unit']):
-                        modificados.append({
-                            'name': producto_actual['name'],
-                            'qty_original': producto_orig['product_uom_qty'],
-                            'qty_nueva': producto_actual['product_uom_qty'],
-                            'precio_original': producto_orig['price_unit'],
-                            'precio_nuevo': producto_actual['price_unit'],
-                            'tipo': 'modificado'
-                        })
+            # Lo que queda del snapshot son líneas eliminadas
+            eliminados = [{
+                'name': fila.name,
+                'qty': fila.product_uom_qty,
+                'tipo': 'eliminado'
+            } for fila in originales.values()]
             
             return {
                 'agregados': agregados,
@@ -387,68 +504,51 @@ class SaleOrder(models.Model):
             return {'agregados': [], 'modificados': [], 'eliminados': []}
     
     def _detectar_tipo_entrega(self):
-        """Detectar si es para envío o retiro en local"""
-        # Buscar producto "Envío estándar" o similares
-        tiene_envio = any(
-            'envío estándar' in line.product_id.name.lower() or
-            'envio estandar' in line.product_id.name.lower() or
-            'envío' in line.product_id.name.lower() or 
-            'envio' in line.product_id.name.lower() or
-            'delivery' in line.product_id.name.lower() or
-            'shipping' in line.product_id.name.lower() or
-            'entrega' in line.product_id.name.lower()
-            for line in self.order_line
-        )
-        
-        # Verificar si tiene producto de recolección en tienda
-        tiene_recoleccion = any(
-            'recolección en tienda' in line.product_id.name.lower() or
-            'recoleccion en tienda' in line.product_id.name.lower() or
-            'retiro en tienda' in line.product_id.name.lower() or
-            'pickup' in line.product_id.name.lower()
-            for line in self.order_line
-        )
-        
-        # Si tiene envío = True, si tiene recolección = False, si no tiene ninguno = False (retiro)
-        self.es_para_envio = tiene_envio and not tiene_recoleccion
-        
-        self.es_para_envio = tiene_envio
-        
-        # Si es para envío, obtener dirección completa
-        if tiene_envio:
-            partner = self.partner_shipping_id or self.partner_id
-            if partner:
-                direccion_parts = []
-                if partner.street:
-                    direccion_parts.append(partner.street)
-                if partner.street2:
-                    direccion_parts.append(partner.street2)
-                if partner.city:
-                    direccion_parts.append(partner.city)
-                if partner.state_id:
-                    direccion_parts.append(partner.state_id.name)
-                if partner.zip:
-                    direccion_parts.append(partner.zip)
-                
-                self.direccion_entrega_completa = ', '.join(direccion_parts)
-        else:
-            self.direccion_entrega_completa = ''
+        """Detectar si es para envío o retiro en local.
+
+        Es para envío si alguna línea tiene un producto clasificado como envío
+        (``product.template.tipo_entrega_producto``). Trabaja sobre todo el
+        recordset y solo escribe los pedidos cuyo valor cambia, con un ``write``
+        por conjunto de valores.
+        """
+        grupos = {}
+        for order_id, vals in self._valores_tipo_entrega().items():
+            grupo = grupos.setdefault(tuple(sorted(vals.items())), [vals, []])
+            grupo[1].append(order_id)
+        for vals, ids in grupos.values():
+            self.browse(ids).write(vals)
     
-    def action_siguiente_estado(self):
-        """Avanza al siguiente estado en la secuencia"""
-        try:
-            estados_orden = ["nuevo", "aceptado", "preparacion", "terminado", "despachado", "entregado"]
-            if self.estado_rapido in estados_orden:
-                indice_actual = estados_orden.index(self.estado_rapido)
-                if indice_actual < len(estados_orden) - 1:
-                    nuevo_estado = estados_orden[indice_actual + 1]
-                    self.action_cambiar_estado(nuevo_estado)
-            return True
-        except Exception as e:
-            import logging
-            _logger = logging.getLogger(__name__)
-            _logger.error(f"Error en action_siguiente_estado: {e}")
-            return False
+    def _valores_tipo_entrega(self):
+        """``{id: valores}`` de tipo de entrega de los pedidos cuyo valor guardado difiere.
+
+        Los pedidos con envío se obtienen con un solo ``_read_group`` sobre las líneas.
+        """
+        if not self.ids:
+            return {}
+        con_envio = {
+            order.id for order, in self.env['sale.order.line'].sudo()._read_group(
+                [('order_id', 'in', self.ids), ('product_id.product_tmpl_id.tipo_entrega_producto', '=', 'envio')],
+                ['order_id'],
+            )
+        }
+        valores = {}
+        for order in self:
+            tiene_envio = order.id in con_envio
+            direccion = order._direccion_entrega() if tiene_envio else ''
+            vals = {}
+            if order.es_para_envio != tiene_envio:
+                vals['es_para_envio'] = tiene_envio
+            if (order.direccion_entrega_completa or '') != direccion:
+                vals['direccion_entrega_completa'] = direccion
+            if vals:
+                valores[order.id] = vals
+        return valores
+    
+    def _direccion_entrega(self):
+        """Dirección completa de entrega a partir del cliente de envío"""
+        partner = self.partner_shipping_id or self.partner_id
+        partes = [partner.street, partner.street2, partner.city, partner.state_id.name, partner.zip]
+        return ', '.join(parte for parte in partes if parte)
     
     def _notificar_delivery_terminado(self):
         """Notificar que pedido delivery está terminado"""
@@ -547,114 +647,335 @@ class SaleOrder(models.Model):
         self.action_cambiar_estado('despachado')
         return {'type': 'ir.actions.act_window_close'}
     
+    @api.model
+    def _cron_normalizar_pedidos_cocina(self, limite=LOTE_NORMALIZACION_COCINA):
+        """Dar estado de cocina a pedidos que quedaron sin él.
 
+        Cubre pedidos enviados desde el PoS (con ``referencia_cocina``) y pedidos
+        web confirmados que no pasaron por los hooks de confirmación. Procesa un
+        lote por ejecución y reprograma el cron si quedan pendientes.
+        """
+        dominios = [
+            [('estado_rapido', '=', False), ('referencia_cocina', '!=', False)],
+            [('estado_rapido', '=', False), ('website_id', '!=', False), ('state', '=', 'sale')],
+        ]
+        pendientes = False
+        for dominio in dominios:
+            pedidos = self.sudo().search(dominio, limit=limite, order='id')
+            if not pedidos:
+                continue
+            ahora = fields.Datetime.now()
+            pedidos.write({
+                'estado_rapido': 'nuevo',
+                'tiempo_inicio_estado': ahora,
+                'tiempo_inicio_total': ahora,
+                'sonido_activo': True,
+            })
+            pedidos._detectar_tipo_entrega()
+            _logger.info(f"Normalizados {len(pedidos)} pedidos de cocina")
+            pendientes = pendientes or len(pedidos) == limite
+        
+        if pendientes:
+            cron = self.env.ref('tu_pedido_v2.ir_cron_normalizar_pedidos_cocina', raise_if_not_found=False)
+            if cron:
+                cron._trigger()
+    
+    @api.model
+    def _formatear_referencia_cocina(self, session_id, tracking_number):
+        """Clave única de un pedido PoS en cocina: el tracking se reinicia en cada sesión"""
+        return f"{session_id}-{tracking_number}"
+    
+    @api.model
+    def _buscar_por_referencia_cocina(self, referencia, solo_activos=False):
+        """Buscar el pedido de cocina por su referencia (búsqueda por índice único)"""
+        if not referencia:
+            return self.browse()
+        dominio = [('referencia_cocina', '=', referencia)]
+        if solo_activos:
+            dominio.append(('estado_rapido', 'in', ESTADOS_COCINA_ACTIVOS))
+        return self.sudo().search(dominio, limit=1)
     
     @api.model
-    def get_pedidos_dashboard(self):
-        """Método para obtener datos del dashboard"""
-        pedidos = self.search([('estado_rapido', '!=', 'entregado')])
+    def _ingerir_pedido_cocina(self, vals):
+        """Crear el pedido de cocina o devolver el ya existente con la misma referencia.
+
+        Es idempotente sin bloqueos: el índice único de ``referencia_cocina`` hace
+        de árbitro como un ``INSERT ... ON CONFLICT``. Si una transacción
+        concurrente insertó la misma referencia y todavía no es visible en esta
+        instantánea, se lanza un error de serialización para que Odoo reintente
+        la petición completa, que entonces encuentra el pedido.
+
+        Sin ``referencia_cocina`` no se crea nada: un envío repetido crearía otro pedido.
+
+        :return: tupla ``(pedido, creado)``
+        """
+        SaleOrder = self.sudo()
+        referencia = vals.get('referencia_cocina')
+        if not referencia:
+            raise ValueError("Los pedidos de cocina se crean con referencia_cocina")
+        existente = SaleOrder._buscar_por_referencia_cocina(referencia)
+        if existente:
+            return existente, False
+        
+        try:
+            with self.env.cr.savepoint():
+                return SaleOrder.create(vals), True
+        except pg_errors.UniqueViolation:
+            self.env.invalidate_all()
+        
+        existente = SaleOrder._buscar_por_referencia_cocina(referencia)
+        if existente:
+            return existente, False
+        raise pg_errors.SerializationFailure(
+            f"Pedido de cocina {referencia} creado por una transacción concurrente"
+        )
+    
+    def _vals_lineas_desde_pos(self, products):
+        """Valores de las líneas de un pedido enviado desde el botón del PoS.
+
+        Los productos se resuelven por nombre exacto con la caché de
+        ``product.product._ids_por_nombre_cocina``.
+        """
+        product_ids = self.env['product.product'].sudo()._ids_por_nombre_cocina(
+            [product_data.get('name') or 'Producto PoS' for product_data in products]
+        )
+        
+        vals_list = []
+        for product_data in products:
+            product_name = product_data.get('name', '')
+            product_note = product_data.get('note', '')
+            
+            # Construir nombre con combo items si existen
+            combo_items = product_data.get('combo_items', [])
+            if combo_items:
+                combo_names = [item.get('name', '') for item in combo_items]
+                final_product_name = f"{product_name} ({', '.join(combo_names)})"
+            else:
+                final_product_name = product_name
+            
+            # Agregar nota si existe
+            if product_note:
+                final_product_name = f"{final_product_name} - {product_note}"
+            
+            vals_list.append({
+                'product_id': product_ids[product_name or 'Producto PoS'],
+                'product_uom_qty': product_data.get('qty', 1),
+                'price_unit': 0.0,
+                'name': final_product_name,
+            })
+        return vals_list
+    
+    def _crear_lineas_desde_pos(self, products):
+        """Crear en un solo ``create`` las líneas de un pedido enviado desde el PoS"""
+        self.ensure_one()
+        return self.env['sale.order.line'].sudo().create([
+            dict(vals, order_id=self.id) for vals in self._vals_lineas_desde_pos(products)
+        ])
+    
+    def _aplicar_lineas_cocina(self, vals_list):
+        """Llevar las líneas del pedido a ``vals_list`` escribiendo solo las diferencias.
+
+        Las líneas se comparan por ``hash_linea_cocina``: las iguales no se tocan
+        y conservan su marca en ``productos_completados``; las que cambian de
+        cantidad o nombre se actualizan sobre una línea sobrante del mismo
+        producto, y el resto se elimina y se crea en una sola operación cada uno.
+
+        :return: True si hubo cambios en las líneas
+        """
+        self.ensure_one()
+        Linea = self.env['sale.order.line'].sudo()
+        
+        existentes = {}
+        for linea in self.order_line.sorted(lambda l: (l.sequence, l.id)):
+            existentes.setdefault(linea._hash_cocina(), []).append(linea)
+        
+        pendientes = []
+        for vals in vals_list:
+            iguales = existentes.get(hash_linea_cocina(vals['product_id'], vals['product_uom_qty'], vals['name']))
+            if iguales:
+                iguales.pop(0)
+            else:
+                pendientes.append(vals)
+        
+        sobrantes = {}
+        for lineas in existentes.values():
+            for linea in lineas:
+                sobrantes.setdefault(linea.product_id.id, []).append(linea)
+        
+        actualizaciones = []
+        nuevas = []
+        for vals in pendientes:
+            candidatas = sobrantes.get(vals['product_id'])
+            if candidatas:
+                actualizaciones.append((candidatas.pop(0), vals))
+            else:
+                nuevas.append(vals)
+        eliminadas = Linea.concat(*(linea for lineas in sobrantes.values() for linea in lineas))
+        
+        if not (actualizaciones or nuevas or eliminadas):
+            return False
+        
+        # Las marcas de la cocina solo valen para las líneas que no cambiaron
+        tocadas = set(eliminadas.ids) | {linea.id for linea, _vals in actualizaciones}
+        completados = self.env['tu_pedido.dashboard.serializer']._ids_completados(self.productos_completados)
+        if completados & tocadas:
+            self.productos_completados = json.dumps(sorted(completados - tocadas))
+        
+        for linea, vals in actualizaciones:
+            linea.write({
+                campo: vals[campo]
+                for campo in ('name', 'product_uom_qty', 'price_unit')
+                if campo in vals and linea[campo] != vals[campo]
+            })
+        if eliminadas:
+            eliminadas.unlink()
+        if nuevas:
+            Linea.create([dict(vals, order_id=self.id) for vals in nuevas])
+        return True
+    
+    @api.model
+    def _canal_cocina(self, company_id):
+        """Canal de bus.bus donde se publican los cambios del tablero de cocina"""
+        return f"tu_pedido_kitchen_{company_id}"
+    
+    def _id_tarjeta_cocina(self):
+        """Identificador de la tarjeta del pedido en el dashboard"""
+        return self.id
+    
+    def _encolar_evento_cocina(self, evento):
+        """Encolar un evento de cocina para los pedidos que están en el tablero"""
+        pedidos = self.filtered('estado_rapido')
+        self.env['sale.order']._registrar_eventos_cocina(self._name, pedidos.ids, evento)
+    
+    @api.model
+    def _registrar_eventos_cocina(self, modelo, ids, evento):
+        """Acumular eventos en la transacción y publicarlos una sola vez antes del commit"""
+        if not ids:
+            return
+        precommit = self.env.cr.precommit
+        eventos = precommit.data.get(CLAVE_EVENTOS_COCINA)
+        if eventos is None:
+            eventos = precommit.data[CLAVE_EVENTOS_COCINA] = {}
+            precommit.add(self._publicar_eventos_cocina)
+        for record_id in ids:
+            anterior = eventos.get((modelo, record_id))
+            if anterior is None or PRIORIDAD_EVENTOS_COCINA[evento] > PRIORIDAD_EVENTOS_COCINA[anterior]:
+                eventos[(modelo, record_id)] = evento
+    
+    def _publicar_eventos_cocina(self):
+        """Actualizar analytics y publicar en el canal de cada compañía un evento compacto por pedido"""
+        eventos = self.env.cr.precommit.data.pop(CLAVE_EVENTOS_COCINA, {})
+        por_modelo = {}
+        for (modelo, record_id), evento in eventos.items():
+            por_modelo.setdefault(modelo, {})[record_id] = evento
+        
+        try:
+            with self.env.cr.savepoint():
+                self.env['tu_pedido.analytics'].sudo()._sincronizar_pedidos(
+                    sale_order_ids=list(por_modelo.get('sale.order', {})),
+                    pos_order_ids=list(por_modelo.get('pos.order', {})),
+                )
+        except Exception as e:
+            _logger.error(f"Error sincronizando analytics de pedidos: {e}")
+        
+        try:
+            notificaciones = []
+            for modelo, por_id in por_modelo.items():
+                for registro in self.env[modelo].sudo().browse(list(por_id)).exists():
+                    notificaciones.append((
+                        self._canal_cocina(registro.company_id.id),
+                        'tu_pedido_kitchen_update',
+                        {
+                            'id': registro._id_tarjeta_cocina(),
+                            'estado_rapido': registro.estado_rapido,
+                            'evento': por_id[registro.id],
+                        }
+                    ))
+            if notificaciones:
+                self.env['bus.bus'].sudo()._sendmany(notificaciones)
+                self.env.flush_all()
+        except Exception as e:
+            _logger.error(f"Error publicando eventos de cocina: {e}")
+    
+
+    
+    @api.model
+    def get_pedidos_dashboard(self, limite=None, despues=None):
+        """Método para obtener datos del dashboard: pedidos activos en cocina, en una
+        página acotada por ``tu_pedido.dashboard.serializer.dominio_listado``"""
+        from .dashboard_serializer import ORDEN_LISTADO_COCINA
+        serializer = self.env['tu_pedido.dashboard.serializer']
+        pedidos = self.search(
+            serializer.dominio_listado([('estado_rapido', 'in', ESTADOS_COCINA_ACTIVOS)], despues),
+            order=ORDEN_LISTADO_COCINA, limit=serializer.limite_listado(limite),
+        )
         return pedidos.read([
             'name', 'partner_id', 'estado_rapido', 'nota_cocina', 
             'tiempo_estado_minutos', 'tiempo_total_minutos', 'sonido_activo',
-            'order_line'
+            'order_line', 'create_date', 'tiempo_inicio_total'
         ])
 
 class SaleOrderLine(models.Model):
     _inherit = "sale.order.line"
     
-    @api.model
-    def create(self, vals):
-        result = super().create(vals)
-        if result.order_id and result.order_id.estado_rapido not in ['nuevo', 'entregado', 'rechazado']:
-            # Si no hay snapshot, crearlo ANTES de detectar cambios
-            if not result.order_id.productos_snapshot:
-                # Crear snapshot con productos actuales MENOS la línea recién creada
-                productos_anteriores = []
-                for line in result.order_id.order_line:
-                    if line.id != result.id:  # Excluir la línea recién creada
-                        productos_anteriores.append({
-                            'product_id': line.product_id.id,
-                            'name': line.name,
-                            'product_uom_qty': line.product_uom_qty,
-                            'price_unit': line.price_unit
-                        })
-                import json
-                result.order_id.productos_snapshot = json.dumps(productos_anteriores)
-            
-            if not result.order_id.productos_modificados:
-                result.order_id._detectar_cambios_productos()
-        return result
+    def _hash_cocina(self):
+        self.ensure_one()
+        return hash_linea_cocina(self.product_id.id, self.product_uom_qty, self.name)
+    
+    def _pedidos_a_comparar(self, lineas_nuevas=False):
+        """Pedidos aceptados y sin cambios pendientes; a los que no tienen snapshot se les crea ahora.
+
+        :param lineas_nuevas: True si ``self`` son líneas recién creadas, que quedan fuera del snapshot
+        """
+        pendientes = self.env.cr.precommit.data.get(CLAVE_PRODUCTOS_MODIFICADOS, ())
+        pedidos = self.order_id.filtered(
+            lambda o: o.estado_rapido in ESTADOS_SNAPSHOT_COCINA and not o.productos_modificados and o.id not in pendientes
+        )
+        pedidos.filtered(lambda o: not o.snapshot_version)._crear_snapshot_productos(
+            excluir=self if lineas_nuevas else None
+        )
+        return pedidos
+    
+    @api.model_create_multi
+    def create(self, vals_list):
+        lines = super().create(vals_list)
+        # Una línea nueva nunca está en el snapshot: el pedido queda modificado
+        lines._pedidos_a_comparar(lineas_nuevas=True)._marcar_productos_modificados()
+        lines.order_id.filtered(lambda o: o.estado_rapido not in (False, 'entregado', 'rechazado'))._detectar_tipo_entrega()
+        lines.order_id._tocar_pedidos_cocina()
+        lines.order_id._encolar_evento_cocina('lineas')
+        return lines
     
     def write(self, vals):
-        # Guardar estado anterior para crear snapshot si es necesario
-        orders_to_check = set()
-        snapshots_to_create = {}
-        
-        for record in self:
-            if (record.order_id and 
-                record.order_id.estado_rapido not in ['nuevo', 'entregado', 'rechazado'] and
-                not record.order_id.productos_modificados):
-                
-                # Si no hay snapshot, crear uno con el estado ANTES del cambio
-                if not record.order_id.productos_snapshot:
-                    productos_anteriores = []
-                    for line in record.order_id.order_line:
-                        productos_anteriores.append({
-                            'product_id': line.product_id.id,
-                            'name': line.name,
-                            'product_uom_qty': line.product_uom_qty,
-                            'price_unit': line.price_unit
-                        })
-                    import json
-                    snapshots_to_create[record.order_id] = json.dumps(productos_anteriores)
-                
-                orders_to_check.add(record.order_id)
-        
-        # Crear snapshots antes de hacer cambios
-        for order, snapshot in snapshots_to_create.items():
-            order.productos_snapshot = snapshot
+        # El snapshot se toma con el estado ANTES del cambio
+        pedidos = self._pedidos_a_comparar() if CAMPOS_HUELLA_LINEA.intersection(vals) else self.order_id.browse()
         
         result = super().write(vals)
         
-        # Detectar cambios después de hacer cambios
-        for order in orders_to_check:
-            order._detectar_cambios_productos()
+        if pedidos:
+            pedidos._detectar_cambios_lineas(self.filtered(lambda l: l.order_id in pedidos))
         
+        if 'product_id' in vals:
+            self.order_id.filtered(lambda o: o.estado_rapido not in (False, 'entregado', 'rechazado'))._detectar_tipo_entrega()
+        self.order_id._tocar_pedidos_cocina()
+        self.order_id._encolar_evento_cocina('lineas')
         return result
     
     def unlink(self):
-        # Obtener órdenes y crear snapshots ANTES de eliminar
-        orders_to_check = set()
-        snapshots_to_create = {}
-        
-        for record in self:
-            if (record.order_id and 
-                record.order_id.estado_rapido not in ['nuevo', 'entregado', 'rechazado'] and
-                not record.order_id.productos_modificados):
-                
-                # Si no hay snapshot, crear uno con el estado ANTES de eliminar
-                if not record.order_id.productos_snapshot:
-                    productos_anteriores = []
-                    for line in record.order_id.order_line:
-                        productos_anteriores.append({
-                            'product_id': line.product_id.id,
-                            'name': line.name,
-                            'product_uom_qty': line.product_uom_qty,
-                            'price_unit': line.price_unit
-                        })
-                    import json
-                    snapshots_to_create[record.order_id] = json.dumps(productos_anteriores)
-                
-                orders_to_check.add(record.order_id)
-        
-        # Crear snapshots antes de eliminar
-        for order, snapshot in snapshots_to_create.items():
-            order.productos_snapshot = snapshot
+        orders = self.order_id
+        # Pedidos que pierden una línea de su snapshot, calculado ANTES de eliminar
+        pedidos = self._pedidos_a_comparar()
+        huellas = pedidos._huellas_snapshot()
+        modificados = pedidos.filtered(
+            lambda o: any(line.id in huellas[o.id] for line in self if line.order_id == o)
+        )
         
         result = super().unlink()
         
-        # Detectar cambios después de eliminar
-        for order in orders_to_check:
-            order._detectar_cambios_productos()
+        modificados._marcar_productos_modificados()
         
+        orders = orders.exists()
+        orders.filtered(lambda o: o.estado_rapido not in (False, 'entregado', 'rechazado'))._detectar_tipo_entrega()
+        orders._tocar_pedidos_cocina()
+        orders._encolar_evento_cocina('lineas')
         return result
\ No newline at end of file
@@ -0,0 +1,30 @@
+from odoo import models, fields, api
+
+
+class SnapshotLinea(models.Model):
+    _name = 'tu_pedido.snapshot.linea'
+    _description = 'Línea del snapshot de productos de un pedido'
+    _order = 'pedido_id, id'
+
+    pedido_id = fields.Many2one('sale.order', string='Pedido', required=True, ondelete='cascade', index=True)
+    version = fields.Integer(string='Versión', required=True)
+    # Sin clave foránea: la línea puede borrarse y el snapshot debe recordarla
+    linea_id = fields.Integer(string='Línea')
+    huella = fields.Char(string='Huella', required=True, help="Hash de producto, cantidad y nombre de la línea")
+    product_id = fields.Many2one('product.product', string='Producto', ondelete='set null')
+    name = fields.Char(string='Descripción')
+    product_uom_qty = fields.Float(string='Cantidad')
+    price_unit = fields.Float(string='Precio')
+
+    @api.model
+    def _vals_desde_linea(self, linea, version):
+        return {
+            'pedido_id': linea.order_id.id,
+            'version': version,
+            'linea_id': linea.id,
+            'huella': linea._hash_cocina(),
+            'product_id': linea.product_id.id,
+            'name': linea.name,
+            'product_uom_qty': linea.product_uom_qty,
+            'price_unit': linea.price_unit,
+        }
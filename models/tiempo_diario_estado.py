@@ -1,4 +1,5 @@
 from odoo import models, fields, api, tools
+from .estado_historial import DIAS_SEMANA, SQL_POSICION_ESTADO, SQL_TIEMPOS_ESTADO
 
 class TiempoDiarioEstado(models.Model):
     _name = 'tu_pedido.tiempo.diario.estado'
@@ -26,10 +27,8 @@ class TiempoDiarioEstado(models.Model):
     tiempo_maximo = fields.Integer(string='Tiempo Máximo (min)')
     
     # Campos para filtros
-    dia_semana = fields.Selection([
-        ('1', 'Lunes'), ('2', 'Martes'), ('3', 'Miércoles'),
-        ('4', 'Jueves'), ('5', 'Viernes'), ('6', 'Sábado'), ('7', 'Domingo')
-    ], string='Día de la Semana')
+    dia_semana = fields.Selection(DIAS_SEMANA, string='Día de la Semana')
+    semana_iso = fields.Char(string='Semana ISO')
     
     mes = fields.Selection([
         ('1', 'Enero'), ('2', 'Febrero'), ('3', 'Marzo'),
@@ -41,30 +40,28 @@ class TiempoDiarioEstado(models.Model):
     def init(self):
         """Crear vista SQL para tiempos diarios por estado"""
         tools.drop_view_if_exists(self.env.cr, self._table)
+        # Id determinista a partir de (fecha, estado), sin row_number(): los filtros
+        # por fecha, semana o mes llegan a los índices del historial y del resumen
         self.env.cr.execute("""
             CREATE OR REPLACE VIEW %s AS (
                 SELECT 
-                    row_number() OVER () AS id,
-                    DATE(eh.fecha_cambio) as fecha,
-                    eh.estado_anterior as estado,
-                    COUNT(*) as total_pedidos,
-                    FLOOR(AVG(eh.minutos_en_estado_anterior))::integer as tiempo_promedio,
-                    SUM(eh.minutos_en_estado_anterior) as tiempo_total,
-                    MIN(eh.minutos_en_estado_anterior) as tiempo_minimo,
-                    MAX(eh.minutos_en_estado_anterior) as tiempo_maximo,
-                    EXTRACT(dow FROM eh.fecha_cambio) as dia_semana,
-                    EXTRACT(month FROM eh.fecha_cambio) as mes
-                FROM tu_pedido_estado_historial eh
-                WHERE eh.estado_anterior IS NOT NULL 
-                    AND eh.minutos_en_estado_anterior >= 0
-                    AND eh.minutos_en_estado_anterior IS NOT NULL
+                    (d.fecha - DATE '2000-01-01') * 10 + %s AS id,
+                    d.fecha as fecha,
+                    d.estado as estado,
+                    SUM(d.total_pedidos) as total_pedidos,
+                    FLOOR(SUM(d.tiempo_total)::numeric / SUM(d.total_pedidos))::integer as tiempo_promedio,
+                    SUM(d.tiempo_total) as tiempo_total,
+                    MIN(d.tiempo_minimo) as tiempo_minimo,
+                    MAX(d.tiempo_maximo) as tiempo_maximo,
+                    d.dia_semana as dia_semana,
+                    d.semana_iso as semana_iso,
+                    d.mes as mes
+                FROM (%s) d
                 GROUP BY 
-                    DATE(eh.fecha_cambio),
-                    eh.estado_anterior,
-                    EXTRACT(dow FROM eh.fecha_cambio),
-                    EXTRACT(month FROM eh.fecha_cambio)
-                ORDER BY 
-                    DATE(eh.fecha_cambio) DESC,
-                    eh.estado_anterior
+                    d.fecha,
+                    d.estado,
+                    d.dia_semana,
+                    d.semana_iso,
+                    d.mes
             )
-        """ % self._table)
\ No newline at end of file
+        """ % (self._table, SQL_POSICION_ESTADO.format(columna='d.estado'), SQL_TIEMPOS_ESTADO))
\ No newline at end of file
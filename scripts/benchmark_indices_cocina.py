@@ -0,0 +1,137 @@
+"""Benchmark de los índices parciales de pedidos activos en cocina.
+
+Uso (no deja cambios en la base, todo se revierte al final)::
+
+    odoo-bin shell -d <base> < scripts/benchmark_indices_cocina.py
+
+Siembra un año de pedidos entregados copiando un sale.order y un pos.order
+existentes, y mide las consultas del dashboard y de las notificaciones PoS
+sin los índices parciales y con ellos.
+"""
+import time
+
+from odoo.addons.tu_pedido_v2.controllers.dashboard_controller import (
+    DOMINIO_POS_ACTIVO,
+    DOMINIO_VENTA_ACTIVO,
+)
+
+PEDIDOS_POR_DIA = 100
+DIAS = 365
+REPETICIONES = 20
+
+INDICES = {
+    'sale_order': [
+        'sale_order_tu_pedido_activo_idx',
+        'sale_order_tu_pedido_web_entrada_idx',
+        'sale_order_tu_pedido_write_date_idx',
+    ],
+    'pos_order': [
+        'pos_order_tu_pedido_activo_idx',
+        'pos_order_tu_pedido_write_date_idx',
+    ],
+}
+
+
+def clonar(cr, tabla, plantilla_id, cantidad, valores):
+    """Insertar ``cantidad`` copias de una fila con algunas columnas reemplazadas"""
+    cr.execute("""
+        SELECT column_name FROM information_schema.columns
+         WHERE table_name = %s AND column_name != 'id'
+    """, [tabla])
+    columnas = [fila[0] for fila in cr.fetchall()]
+    expresiones = [valores.get(columna, f'"{columna}"') for columna in columnas]
+    cr.execute(f"""
+        INSERT INTO {tabla} ({', '.join(f'"{c}"' for c in columnas)})
+        SELECT {', '.join(expresiones)}
+          FROM {tabla}, generate_series(1, %s) AS g
+         WHERE {tabla}.id = %s
+    """, [cantidad, plantilla_id])
+
+
+def sembrar(env):
+    venta = env['sale.order'].search([('estado_rapido', '!=', False)], limit=1)
+    pos = env['pos.order'].search([('enviado_a_cocina', '=', True)], limit=1)
+    if not venta or not pos:
+        raise SystemExit("Se necesita al menos un sale.order y un pos.order enviados a cocina")
+
+    cantidad = PEDIDOS_POR_DIA * DIAS
+    fecha = f"now() - g * interval '{24 * 60 // PEDIDOS_POR_DIA} minutes'"
+    comunes = {
+        'estado_rapido': "'entregado'",
+        'create_date': fecha,
+        'write_date': fecha,
+    }
+    clonar(env.cr, 'sale_order', venta.id, cantidad, dict(
+        comunes,
+        name="'BENCH-' || g",
+        referencia_cocina='NULL',
+        access_token='NULL',
+    ))
+    clonar(env.cr, 'pos_order', pos.id, cantidad, dict(
+        comunes,
+        name="'BENCH-POS-' || g",
+        pos_reference="'BENCH-POS-' || g",
+        uuid="md5(random()::text || g)",
+        access_token='NULL',
+    ))
+    env.cr.execute("ANALYZE sale_order; ANALYZE pos_order")
+    return cantidad
+
+
+def medir(nombre, funcion):
+    inicio = time.perf_counter()
+    for _i in range(REPETICIONES):
+        funcion()
+    promedio = (time.perf_counter() - inicio) * 1000 / REPETICIONES
+    print(f"  {nombre:<32} {promedio:8.2f} ms")
+
+
+def consultas(env):
+    serializer = env['tu_pedido.dashboard.serializer'].sudo()
+    SaleOrder = env['sale.order'].sudo()
+    PosOrder = env['pos.order'].sudo()
+
+    def dashboard():
+        serializer.tarjetas_venta(DOMINIO_VENTA_ACTIVO)
+        serializer.tarjetas_pos(DOMINIO_POS_ACTIVO)
+        env.invalidate_all()
+
+    def delivery():
+        PosOrder.search([('enviado_a_cocina', '=', True), ('is_delivery', '=', True), ('estado_rapido', '=', 'terminado')])
+        SaleOrder.search([('es_para_envio', '=', True), ('estado_rapido', '=', 'terminado')])
+
+    def pickup():
+        PosOrder.search([('enviado_a_cocina', '=', True), ('is_delivery', '=', False), ('estado_rapido', '=', 'terminado')])
+        SaleOrder.search([('es_para_envio', '=', False), ('estado_rapido', '=', 'terminado')])
+
+    def web():
+        SaleOrder.search([('website_id', '!=', False), ('estado_rapido', 'in', ['nuevo', 'aceptado', 'preparacion', 'terminado'])])
+
+    medir('dashboard_data (completo)', dashboard)
+    medir('pos_delivery_notifications', delivery)
+    medir('pos_pickup_notifications', pickup)
+    medir('pos_web_notifications', web)
+    medir('pos_feed (las tres listas)', serializer.feed_pos)
+
+
+def main(env):
+    try:
+        cantidad = sembrar(env)
+        print(f"Sembrados {cantidad} pedidos entregados por tabla")
+
+        for tabla, indices in INDICES.items():
+            for indice in indices:
+                env.cr.execute(f'DROP INDEX IF EXISTS "{indice}"')
+        print("Sin índices parciales:")
+        consultas(env)
+
+        env['sale.order'].init()
+        env['pos.order'].init()
+        env.cr.execute("ANALYZE sale_order; ANALYZE pos_order")
+        print("Con índices parciales:")
+        consultas(env)
+    finally:
+        env.cr.rollback()
+
+
+main(env)  # noqa: F821 - ``env`` lo provee odoo-bin shell
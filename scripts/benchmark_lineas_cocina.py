@@ -0,0 +1,104 @@
+"""Benchmark de creación de líneas de pedidos enviados desde el PoS.
+
+Uso (no deja cambios en la base, todo se revierte al final)::
+
+    odoo-bin shell -d <base> < scripts/benchmark_lineas_cocina.py
+
+Compara la creación línea por línea (una búsqueda y un ``create`` por producto)
+con ``sale.order._crear_lineas_desde_pos`` para pedidos de 5, 20 y 50 líneas, y
+la modificación de un pedido aceptado (una cantidad cambiada) borrando y
+recreando todas las líneas frente a ``sale.order._aplicar_lineas_cocina``.
+"""
+import time
+
+TAMANIOS = [5, 20, 50]
+REPETICIONES = 10
+
+
+def productos_pos(env, cantidad):
+    nombres = env['product.product'].search_read([('sale_ok', '=', True)], ['name'], limit=cantidad)
+    if len(nombres) < cantidad:
+        raise SystemExit(f"Se necesitan al menos {cantidad} productos vendibles")
+    return [{'name': p['name'], 'qty': 1, 'note': '', 'combo_items': []} for p in nombres]
+
+
+def nuevo_pedido(env):
+    return env['sale.order'].create({
+        'partner_id': env.ref('base.public_partner').id,
+        'estado_rapido': 'nuevo',
+    })
+
+
+def linea_por_linea(env, order, products):
+    for product_data in products:
+        product = env['product.product'].search([('name', '=', product_data['name'])], limit=1)
+        env['sale.order.line'].create({
+            'order_id': order.id,
+            'product_id': product.id,
+            'product_uom_qty': product_data['qty'],
+            'price_unit': 0.0,
+            'name': product_data['name'],
+        })
+
+
+def en_lote(env, order, products):
+    order._crear_lineas_desde_pos(products)
+
+
+def borrar_y_recrear(env, order, products):
+    order.order_line.unlink()
+    order._crear_lineas_desde_pos(products)
+
+
+def aplicar_diff(env, order, products):
+    order._aplicar_lineas_cocina(order._vals_lineas_desde_pos(products))
+
+
+def medir_modificacion(env, nombre, funcion, products):
+    modificados = [dict(p) for p in products]
+    modificados[0]['qty'] = 2
+    total = 0.0
+    consultas = 0
+    for _i in range(REPETICIONES):
+        order = nuevo_pedido(env)
+        order._crear_lineas_desde_pos(products)
+        order.estado_rapido = 'aceptado'
+        env.flush_all()
+        inicio = time.perf_counter()
+        consultas_inicio = env.cr.sql_log_count
+        funcion(env, order, modificados)
+        env.flush_all()
+        consultas += env.cr.sql_log_count - consultas_inicio
+        total += time.perf_counter() - inicio
+    print(f"  {nombre:<16} {total * 1000 / REPETICIONES:8.2f} ms {consultas / REPETICIONES:8.1f} consultas")
+
+
+def medir(env, nombre, funcion, products):
+    total = 0.0
+    for _i in range(REPETICIONES):
+        order = nuevo_pedido(env)
+        env.flush_all()
+        inicio = time.perf_counter()
+        funcion(env, order, products)
+        env.flush_all()
+        total += time.perf_counter() - inicio
+    print(f"  {nombre:<16} {total * 1000 / REPETICIONES:8.2f} ms")
+
+
+def main(env):
+    try:
+        # Calentar la caché de nombres como en un servidor en uso
+        env['product.product']._ids_por_nombre_cocina([p['name'] for p in productos_pos(env, max(TAMANIOS))])
+        for tamanio in TAMANIOS:
+            products = productos_pos(env, tamanio)
+            print(f"Pedido de {tamanio} líneas:")
+            medir(env, 'línea por línea', linea_por_linea, products)
+            medir(env, 'en lote', en_lote, products)
+            print(f"Modificación de un pedido aceptado de {tamanio} líneas:")
+            medir_modificacion(env, 'borrar y recrear', borrar_y_recrear, products)
+            medir_modificacion(env, 'diff por hash', aplicar_diff, products)
+    finally:
+        env.cr.rollback()
+
+
+main(env)  # noqa: F821 - ``env`` lo provee odoo-bin shell
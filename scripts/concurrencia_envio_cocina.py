@@ -0,0 +1,85 @@
+"""Prueba de concurrencia del envío a cocina: 50 envíos simultáneos del mismo ticket.
+
+Uso (contra un servidor Odoo en marcha con workers, no deja cambios si se usa
+una base de pruebas desechable)::
+
+    python scripts/concurrencia_envio_cocina.py http://localhost:8069 <base> <usuario> <clave> <session_id>
+
+Dispara en paralelo ``/tu_pedido_v2/crear_pedido_simple`` con el mismo
+tracking y sesión PoS, y comprueba que todas las respuestas sean correctas y
+que exista un único sale.order con esa ``referencia_cocina``.
+"""
+import json
+import sys
+import threading
+import time
+import urllib.request
+from http.cookiejar import CookieJar
+
+ENVIOS = 50
+
+
+def rpc(opener, url, params):
+    cuerpo = json.dumps({'jsonrpc': '2.0', 'method': 'call', 'params': params}).encode()
+    peticion = urllib.request.Request(url, cuerpo, {'Content-Type': 'application/json'})
+    with opener.open(peticion) as respuesta:
+        datos = json.load(respuesta)
+    if 'error' in datos:
+        raise RuntimeError(datos['error'].get('data', {}).get('message') or datos['error'])
+    return datos['result']
+
+
+def main(servidor, base, usuario, clave, session_id):
+    opener = urllib.request.build_opener(urllib.request.HTTPCookieProcessor(CookieJar()))
+    rpc(opener, f'{servidor}/web/session/authenticate', {'db': base, 'login': usuario, 'password': clave})
+
+    tracking = f'C{int(time.time()) % 100000}'
+    pedido = {
+        'tracking_number': tracking,
+        'session_id': int(session_id),
+        'table_name': 'Mostrador',
+        'customer_name': 'Cliente PoS',
+        'products': [{'name': 'Producto concurrencia', 'qty': 1}],
+    }
+    salida = threading.Barrier(ENVIOS)
+    resultados = []
+    errores = []
+
+    def enviar():
+        salida.wait()
+        try:
+            resultados.append(rpc(opener, f'{servidor}/tu_pedido_v2/crear_pedido_simple', pedido))
+        except Exception as e:
+            errores.append(str(e))
+
+    hilos = [threading.Thread(target=enviar) for _i in range(ENVIOS)]
+    inicio = time.perf_counter()
+    for hilo in hilos:
+        hilo.start()
+    for hilo in hilos:
+        hilo.join()
+    duracion = time.perf_counter() - inicio
+
+    referencia = f'{session_id}-{tracking}'
+    cantidad = rpc(opener, f'{servidor}/web/dataset/call_kw', {
+        'model': 'sale.order', 'method': 'search_count',
+        'args': [[('referencia_cocina', '=', referencia)]], 'kwargs': {},
+    })
+    pedidos = {resultado.get('order_id') for resultado in resultados}
+    fallidos = [resultado for resultado in resultados if not resultado.get('success')]
+
+    print(f"{ENVIOS} envíos de {referencia} en {duracion:.2f} s")
+    print(f"  respuestas correctas: {len(resultados) - len(fallidos)}, fallidas: {len(fallidos)}, errores: {len(errores)}")
+    print(f"  order_id distintos en respuestas: {len(pedidos)}")
+    print(f"  sale.order con la referencia: {cantidad}")
+    if cantidad != 1 or len(pedidos) != 1 or fallidos or errores:
+        for detalle in (fallidos + errores)[:5]:
+            print(f"  -> {detalle}")
+        raise SystemExit(1)
+    print("OK: un único pedido de cocina")
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 6:
+        raise SystemExit(__doc__)
+    main(*sys.argv[1:])
@@ -3,10 +3,17 @@
 import { Component, onWillStart, useState, onMounted, onWillUnmount, useRef } from "@odoo/owl";
 import { registry } from "@web/core/registry";
 import { rpc } from "@web/core/network/rpc";
+import { useService } from "@web/core/utils/hooks";
+
+// Cada cuánto se pide el tablero completo aunque haya una revisión válida
+const FULL_RELOAD_MS = 10 * 60 * 1000;
+// Los cambios llegan por bus.bus; el polling queda solo como respaldo ante desconexiones
+const FALLBACK_REFRESH_MS = 2 * 60 * 1000;
 
 class PedidoDashboard extends Component {
     setup() {
         this.dashboardRef = useRef("dashboard");
+        this.busService = useService("bus_service");
         
         this.state = useState({
             state_columns: [],
@@ -49,6 +56,13 @@ class PedidoDashboard extends Component {
 
         this.refreshInterval = null;
         this.soundInterval = null;
+        this.revision = null;
+        this.ultimaCargaCompleta = 0;
+        // Diferencia entre el reloj del servidor y el del navegador (ms)
+        this.desfaseReloj = 0;
+        this.canalCocina = null;
+        this.busReloadTimeout = null;
+        this.onBusNotification = this.onBusNotification.bind(this);
         this.audioContext = null;
 
         onWillStart(async () => {
@@ -56,6 +70,7 @@ class PedidoDashboard extends Component {
         });
 
         onMounted(() => {
+            this.busService.addEventListener("notification", this.onBusNotification);
             this.setupDragAndDrop();
             this.startAutoRefresh();
             this.initAudio();
@@ -65,6 +80,13 @@ class PedidoDashboard extends Component {
         });
 
         onWillUnmount(() => {
+            this.busService.removeEventListener("notification", this.onBusNotification);
+            if (this.canalCocina) {
+                this.busService.deleteChannel(this.canalCocina);
+            }
+            if (this.busReloadTimeout) {
+                clearTimeout(this.busReloadTimeout);
+            }
             if (this.refreshInterval) {
                 clearInterval(this.refreshInterval);
             }
@@ -78,21 +100,37 @@ class PedidoDashboard extends Component {
     }
 
     async loadData() {
-        this.state.loading = true;
+        const completo = !this.revision || Date.now() - this.ultimaCargaCompleta > FULL_RELOAD_MS;
+        if (completo) {
+            this.state.loading = true;
+        }
         this.state.error = null;
         
         try {
-            const result = await rpc("/tu_pedido_v2/dashboard_data", {});
-            this.state.all_columns = result?.columns || [];
-            this.applyFilters();
-            this.checkForNewOrders();
-            
-            setTimeout(() => {
-                this.addProductEventListeners();
-                this.initializeDragAndDrop();
-                this.initializeTimeCounters();
-            }, 200);
+            const result = await rpc("/tu_pedido_v2/dashboard_data", completo ? {} : {
+                revision: this.revision
+            });
+            if (result?.completo === false) {
+                this.applyChanges(result);
+            } else {
+                this.state.all_columns = result?.columns || [];
+                this.ultimaCargaCompleta = Date.now();
+            }
+            this.revision = result?.revision || null;
+            if (result?.server_time) {
+                this.desfaseReloj = Date.parse(result.server_time) - Date.now();
+            }
+            // Páginas siguientes del tablero (más pedidos activos que el tope por página)
+            let siguiente = result?.siguiente;
+            while (siguiente && (siguiente.venta || siguiente.pos)) {
+                const pagina = await rpc("/tu_pedido_v2/dashboard_data", { despues: siguiente });
+                this.applyChanges(pagina);
+                siguiente = pagina?.siguiente;
+            }
+            this.subscribeKitchenChannel(result?.canal);
+            this.refreshBoard();
         } catch (error) {
+            this.revision = null;
             this.state.error = "Error cargando datos del dashboard: " + error.message;
             this.state.state_columns = [];
         } finally {
@@ -100,6 +138,110 @@ class PedidoDashboard extends Component {
         }
     }
 
+    refreshBoard() {
+        this.updateElapsedTimes();
+        this.applyFilters();
+        this.checkForNewOrders();
+        
+        setTimeout(() => {
+            this.addProductEventListeners();
+            this.initializeDragAndDrop();
+        }, 200);
+    }
+
+    subscribeKitchenChannel(canal) {
+        if (!canal || canal === this.canalCocina) return;
+        if (this.canalCocina) {
+            this.busService.deleteChannel(this.canalCocina);
+        }
+        this.canalCocina = canal;
+        this.busService.addChannel(canal);
+    }
+
+    onBusNotification({ detail: notifications }) {
+        let recargar = false;
+        for (const { payload, type } of notifications) {
+            if (type !== "tu_pedido_kitchen_update") continue;
+            // Un cambio de estado de una tarjeta conocida se aplica sin ir al servidor
+            if (payload.evento === 'estado' && this.moveOrder(payload.id, payload.estado_rapido)) continue;
+            recargar = true;
+        }
+        if (recargar) {
+            this.scheduleDeltaLoad();
+        }
+    }
+
+    moveOrder(orderId, estado) {
+        let pedido = null;
+        const columns = this.state.all_columns.map(col => {
+            const orders = col.orders.filter(order => {
+                if (String(order.id) === String(orderId)) {
+                    pedido = order;
+                    return false;
+                }
+                return true;
+            });
+            return { ...col, orders };
+        });
+        if (!pedido) return false;
+        
+        if (pedido.estado_rapido !== estado) {
+            pedido.estado_rapido = estado;
+            pedido.tiempo_inicio_estado = new Date(this.serverNow()).toISOString();
+            if (estado !== 'nuevo') {
+                pedido.sonido_activo = false;
+            }
+        }
+        // Los estados sin columna (entregado) salen del tablero
+        const col = columns.find(c => c.key === estado);
+        if (col) {
+            col.orders.push(pedido);
+        }
+        columns.forEach(c => {
+            c.count = c.orders.length;
+        });
+        this.state.all_columns = columns;
+        this.refreshBoard();
+        return true;
+    }
+
+    scheduleDeltaLoad() {
+        // Agrupar ráfagas de eventos en una sola consulta incremental
+        if (this.busReloadTimeout) {
+            clearTimeout(this.busReloadTimeout);
+        }
+        this.busReloadTimeout = setTimeout(() => {
+            this.busReloadTimeout = null;
+            this.loadData();
+        }, 500);
+    }
+
+    applyChanges(result) {
+        // Quitar las versiones anteriores de los pedidos tocados y los que salieron del tablero
+        const tocados = new Set([
+            ...(result.removed || []),
+            ...(result.orders || []).map(order => order.id),
+        ].map(String));
+        
+        const columns = this.state.all_columns.map(col => ({
+            ...col,
+            orders: col.orders.filter(order => !tocados.has(String(order.id))),
+        }));
+        
+        // Ubicar cada pedido actualizado en la columna de su estado
+        for (const order of result.orders || []) {
+            const col = columns.find(c => c.key === order.estado_rapido);
+            if (col) {
+                col.orders.push(order);
+            }
+        }
+        
+        columns.forEach(col => {
+            col.count = col.orders.length;
+        });
+        this.state.all_columns = columns;
+    }
+
     checkForNewOrders() {
         // Verificar si hay pedidos nuevos con sonido activo
         const nuevosConSonido = this.state.state_columns
@@ -165,7 +307,7 @@ class PedidoDashboard extends Component {
     startAutoRefresh() {
         this.refreshInterval = setInterval(() => {
             this.loadData();
-        }, 30000); // Actualizar cada 30 segundos
+        }, FALLBACK_REFRESH_MS);
     }
 
     setupDragAndDrop() {
@@ -543,26 +685,28 @@ class PedidoDashboard extends Component {
     }
     
     startRealTimeTimer() {
-        // Inicializar contadores al cargar datos
-        setTimeout(() => {
-            this.initializeTimeCounters();
-        }, 500);
-        
+        // Los minutos se calculan en el navegador a partir de los inicios que envía el servidor
         this.timerInterval = setInterval(() => {
             this.updateTimeCounters();
         }, 1000);
     }
     
-    initializeTimeCounters() {
-        // Inicializar tiempo base para cada pedido
-        this.state.state_columns.forEach(column => {
-            column.orders.forEach(order => {
-                if (!order.tiempo_inicial_guardado) {
-                    order.tiempo_inicial_guardado = order.tiempo_total || 0;
-                    order.tiempo_inicio_contador = Date.now();
-                }
-            });
-        });
+    serverNow() {
+        return Date.now() + this.desfaseReloj;
+    }
+    
+    minutesSince(startTime) {
+        if (!startTime) return 0;
+        return Math.max(0, Math.floor((this.serverNow() - Date.parse(startTime)) / 60000));
+    }
+    
+    updateElapsedTimes() {
+        for (const column of this.state.all_columns || []) {
+            for (const order of column.orders) {
+                order.tiempo_estado = this.minutesSince(order.tiempo_inicio_estado);
+                order.tiempo_total = this.minutesSince(order.tiempo_inicio_total);
+            }
+        }
     }
     
     updateTimeCounters() {
@@ -574,19 +718,17 @@ class PedidoDashboard extends Component {
             const order = this.findOrderById(orderId);
             if (!order) return;
             
-            // Incrementar tiempo_total cada segundo (1/60 de minuto)
-            if (!order.tiempo_inicial_guardado) {
-                order.tiempo_inicial_guardado = order.tiempo_total || 0;
-                order.tiempo_inicio_contador = Date.now();
-            }
-            
-            const segundosTranscurridos = Math.floor((Date.now() - order.tiempo_inicio_contador) / 1000);
-            const tiempoTotal = order.tiempo_inicial_guardado + Math.floor(segundosTranscurridos / 60);
+            const tiempoTotal = this.minutesSince(order.tiempo_inicio_total);
             const { clase, texto } = this.getTimeStatus(tiempoTotal);
             
             tiempoElement.textContent = texto;
             tiempoElement.className = `tiempo-contador ${clase}`;
             
+            const estadoElement = card.querySelector('.tiempo-estado');
+            if (estadoElement) {
+                estadoElement.textContent = `${this.minutesSince(order.tiempo_inicio_estado)}m`;
+            }
+            
             // Actualizar clases de la tarjeta
             card.className = card.className.replace(/tiempo-(normal|advertencia|critico)/g, '');
             card.classList.add(`tiempo-${clase}`);
@@ -601,12 +743,6 @@ class PedidoDashboard extends Component {
         return null;
     }
     
-    calculateRealTime(startTime, now) {
-        if (!startTime) return 0;
-        const start = new Date(startTime);
-        return Math.floor((now - start) / (1000 * 60));
-    }
-    
     getTimeStatus(minutes) {
         if (minutes >= 60) {
             return {
@@ -8,85 +8,75 @@ class PosDeliveryNotifications {
     constructor(pos) {
         this.pos = pos;
         this.checkInterval = null;
+        this.busCheckTimeout = null;
         this.currentNotifications = [];
+        this.feedEtag = null;
         this.init();
     }
 
     init() {
-        // Iniciar revisión cada 15 segundos
+        // Los cambios de cocina llegan por el canal de la compañía
+        const busService = this.pos.env.services.bus_service;
+        if (busService && this.pos.company) {
+            busService.addChannel(`tu_pedido_kitchen_${this.pos.company.id}`);
+            busService.addEventListener("notification", this.onBusNotification.bind(this));
+        }
+        
+        // Revisión periódica solo como respaldo ante desconexiones del bus
         this.checkInterval = setInterval(() => {
             this.checkDeliveryNotifications();
-        }, 15000);
+        }, 60000);
         
         // Revisar inmediatamente después de 3 segundos
         setTimeout(() => this.checkDeliveryNotifications(), 3000);
     }
 
+    onBusNotification({ detail: notifications }) {
+        if (!notifications.some(({ type }) => type === "tu_pedido_kitchen_update")) return;
+        // Agrupar ráfagas de eventos en una sola revisión
+        if (this.busCheckTimeout) {
+            clearTimeout(this.busCheckTimeout);
+        }
+        this.busCheckTimeout = setTimeout(() => {
+            this.busCheckTimeout = null;
+            this.checkDeliveryNotifications();
+        }, 1000);
+    }
+
     async checkDeliveryNotifications() {
         try {
-            // Verificar notificaciones de delivery
-            const deliveryResponse = await fetch('/tu_pedido_v2/pos_delivery_notifications', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({})
+            // Una sola llamada para las tres listas; 304 si nada cambió desde la última
+            const headers = this.feedEtag ? { 'If-None-Match': this.feedEtag } : {};
+            const sessionId = this.pos.session ? this.pos.session.id : '';
+            const response = await fetch(`/tu_pedido_v2/pos_feed?session_id=${sessionId}`, {
+                method: 'GET',
+                headers: headers,
+                cache: 'no-store'
             });
             
-            const deliveryResult = await deliveryResponse.json();
-            
-            if (deliveryResult.result && deliveryResult.result.notifications && deliveryResult.result.notifications.length > 0) {
-                this.showNotifications(deliveryResult.result.notifications);
+            if (response.status === 304 || !response.ok) {
+                return;
             }
+            this.feedEtag = response.headers.get('ETag');
+            const feed = await response.json();
             
-            // Verificar notificaciones de pedidos web nuevos
-            const webResponse = await fetch('/tu_pedido_v2/pos_web_notifications', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({})
-            });
-            
-            const webResult = await webResponse.json();
+            // Pedidos listos para enviar
+            this.showNotifications(feed.delivery || []);
             
-            if (webResult.result && webResult.result.notifications) {
-                // Obtener IDs de pedidos actuales del servidor
-                const serverOrderIds = webResult.result.notifications.map(n => n.id.toString());
-                
-                // Remover pedidos que ya no están en el servidor (fueron despachados)
-                if (this.currentWebNotifications) {
-                    this.currentWebNotifications = this.currentWebNotifications.filter(notif => 
-                        serverOrderIds.includes(notif.id.toString())
-                    );
-                }
-                
-                // Agregar nuevos pedidos
-                if (webResult.result.notifications.length > 0) {
-                    this.showWebNotifications(webResult.result.notifications);
-                }
-                
-                // Actualizar botón
-                this.updateWebFloatingButton();
+            // Pedidos web: remover los que ya no están en el servidor (fueron despachados)
+            const webNotifications = feed.web || [];
+            const serverOrderIds = webNotifications.map(n => n.id.toString());
+            if (this.currentWebNotifications) {
+                this.currentWebNotifications = this.currentWebNotifications.filter(notif => 
+                    serverOrderIds.includes(notif.id.toString())
+                );
             }
             
-            // Verificar notificaciones de pedidos listos para retirar
-            const pickupResponse = await fetch('/tu_pedido_v2/pos_pickup_notifications', {
-                method: 'POST',
-                headers: {
-                    'Content-Type': 'application/json',
-                },
-                body: JSON.stringify({})
-            });
-            
-            const pickupResult = await pickupResponse.json();
+            // Agregar nuevos pedidos y actualizar botón
+            this.showWebNotifications(webNotifications);
             
-            if (pickupResult.result && pickupResult.result.notifications && pickupResult.result.notifications.length > 0) {
-                this.showPickupNotifications(pickupResult.result.notifications);
-            } else {
-                this.currentPickupNotifications = [];
-                this.updatePickupFloatingButton();
-            }
+            // Pedidos listos para retirar
+            this.showPickupNotifications(feed.pickup || []);
         } catch (error) {
             console.log('Error checking notifications:', error);
         }
@@ -219,6 +209,8 @@ class PosDeliveryNotifications {
             const exists = this.currentWebNotifications.find(existing => existing.id == newNotif.id);
             if (!exists) {
                 this.currentWebNotifications.push(newNotif);
+            } else {
+                exists.visto = newNotif.visto;
             }
         });
         
@@ -236,7 +228,8 @@ class PosDeliveryNotifications {
                 floatingBtn.onclick = () => this.showWebModal();
                 document.body.appendChild(floatingBtn);
             }
-            floatingBtn.innerHTML = `🌐 Pedidos Web <span class="badge">${count}</span>`;
+            const nuevos = this.currentWebNotifications.filter(n => !n.visto).length;
+            floatingBtn.innerHTML = `🌐 Pedidos Web <span class="badge">${count}</span>` + (nuevos > 0 ? ` • ${nuevos} nuevos` : '');
         } else {
             if (floatingBtn) {
                 floatingBtn.remove();
@@ -269,6 +262,34 @@ class PosDeliveryNotifications {
             }
         };
         document.addEventListener('keydown', closeHandler);
+        
+        this.markWebListAsSeen();
+    }
+    
+    async markWebListAsSeen() {
+        // Confirmar de una vez todos los pedidos web mostrados en esta terminal
+        const pendientes = this.currentWebNotifications.filter(n => !n.visto);
+        if (!pendientes.length || !this.pos.session) return;
+        try {
+            await fetch('/tu_pedido_v2/pos_notificaciones_vistas', {
+                method: 'POST',
+                headers: {
+                    'Content-Type': 'application/json',
+                },
+                body: JSON.stringify({
+                    jsonrpc: '2.0',
+                    method: 'call',
+                    params: {
+                        session_id: this.pos.session.id,
+                        pedido_web_ids: pendientes.map(n => n.id)
+                    }
+                })
+            });
+            pendientes.forEach(n => { n.visto = true; });
+            this.updateWebFloatingButton();
+        } catch (error) {
+            console.error('Error marking web orders as seen:', error);
+        }
     }
     
     createWebModalItem(notification) {
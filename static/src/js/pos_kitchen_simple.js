@@ -29,6 +29,7 @@ patch(ActionpadWidget.prototype, {
             
             const orderData = {
                 tracking_number: currentOrder.tracking_number,
+                session_id: currentOrder.session_id?.id || this.pos.session.id,
                 table_name: tableName,  // Problema 2: nombre completo de mesa
                 customer_name: currentOrder.partner_id ? currentOrder.partner_id.name : 'Cliente PoS',
                 general_note: currentOrder.general_note || currentOrder['general_note'] || '',  // Acceso directo al campo
@@ -0,0 +1,3 @@
+from . import test_notificaciones_vistas
+from . import test_dashboard_queries
+from . import test_ingesta_cocina
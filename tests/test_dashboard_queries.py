@@ -0,0 +1,74 @@
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestDashboardQueries(TransactionCase):
+    """La cantidad de consultas del serializador no depende del tamaño del tablero"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.Serializer = cls.env['tu_pedido.dashboard.serializer']
+        cls.productos = cls.env['product.product'].create([
+            {'name': 'Hamburguesa', 'list_price': 10.0},
+            {'name': 'Papas fritas', 'list_price': 4.0},
+        ])
+        config = cls.env['pos.config'].create({'name': 'Caja Cocina'})
+        cls.sesion = cls.env['pos.session'].create({'config_id': config.id, 'user_id': cls.env.uid})
+
+    def _pedidos_venta(self, cantidad):
+        clientes = self.env['res.partner'].create([{'name': f'Cliente {i}'} for i in range(cantidad)])
+        return self.env['sale.order'].create([{
+            'partner_id': cliente.id,
+            'order_line': [(0, 0, {'product_id': producto.id, 'product_uom_qty': 1}) for producto in self.productos],
+        } for cliente in clientes])
+
+    def _pedidos_pos(self, cantidad):
+        clientes = self.env['res.partner'].create([{'name': f'Cliente PoS {i}'} for i in range(cantidad)])
+        pedidos = self.env['pos.order'].create([{
+            'session_id': self.sesion.id,
+            'partner_id': cliente.id,
+            'amount_tax': 0.0,
+            'amount_total': 14.0,
+            'amount_paid': 0.0,
+            'amount_return': 0.0,
+            'lines': [(0, 0, {
+                'product_id': producto.id,
+                'qty': 1,
+                'price_unit': producto.list_price,
+                'price_subtotal': producto.list_price,
+                'price_subtotal_incl': producto.list_price,
+            }) for producto in self.productos],
+        } for cliente in clientes])
+        pedidos.write({
+            'enviado_a_cocina': True,
+            'estado_rapido': 'nuevo',
+            'tiempo_inicio_estado': '2025-01-15 12:00:00',
+            'tiempo_inicio_total': '2025-01-15 12:00:00',
+        })
+        return pedidos
+
+    def _consultas(self, tarjetas_modelo, pedidos):
+        """Consultas de una lectura de tarjetas con la caché del ORM vacía"""
+        self.env.flush_all()
+        self.env.invalidate_all()
+        antes = self.cr.sql_log_count
+        tarjetas_modelo([('id', 'in', pedidos.ids)])
+        return self.cr.sql_log_count - antes
+
+    def _comprobar_consultas_constantes(self, tarjetas_modelo, crear_pedidos):
+        chico, grande = crear_pedidos(2), crear_pedidos(25)
+        # Primera lectura para cargar las cachés del registro (modelos, reglas de acceso)
+        tarjetas_modelo([('id', 'in', chico.ids)])
+        consultas = self._consultas(tarjetas_modelo, chico)
+        self.env.invalidate_all()
+        with self.assertQueryCount(consultas):
+            tarjetas = tarjetas_modelo([('id', 'in', grande.ids)])
+        self.assertEqual(len(tarjetas), 25)
+        self.assertTrue(all(len(tarjeta['productos']) == 2 for tarjeta in tarjetas))
+
+    def test_tarjetas_venta_consultas_constantes(self):
+        self._comprobar_consultas_constantes(self.Serializer.tarjetas_venta, self._pedidos_venta)
+
+    def test_tarjetas_pos_consultas_constantes(self):
+        self._comprobar_consultas_constantes(self.Serializer.tarjetas_pos, self._pedidos_pos)
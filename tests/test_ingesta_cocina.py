@@ -0,0 +1,138 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from unittest.mock import patch
+
+from psycopg2 import errors as pg_errors
+
+from odoo import SUPERUSER_ID, api, sql_db
+from odoo.tests import BaseCase, TransactionCase, tagged
+from odoo.tests.common import get_db_name
+from odoo.tools import mute_logger
+
+ENVIOS_CONCURRENTES = 8
+REINTENTOS_ENVIO = 5
+
+
+@tagged('post_install', '-at_install')
+class TestIngestaCocina(TransactionCase):
+    """Creación idempotente de pedidos de cocina por ``referencia_cocina``"""
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.SaleOrder = cls.env['sale.order']
+        cls.cliente = cls.env['res.partner'].create({'name': 'Cliente PoS'})
+
+    def _vals(self, referencia):
+        return {'partner_id': self.cliente.id, 'referencia_cocina': referencia}
+
+    def test_envio_repetido_devuelve_el_mismo_pedido(self):
+        pedido, creado = self.SaleOrder._ingerir_pedido_cocina(self._vals('7-001'))
+        self.assertTrue(creado)
+        repetido, creado = self.SaleOrder._ingerir_pedido_cocina(self._vals('7-001'))
+        self.assertFalse(creado)
+        self.assertEqual(repetido, pedido)
+        self.assertEqual(self.SaleOrder.search_count([('referencia_cocina', '=', '7-001')]), 1)
+
+    def test_sin_referencia_no_crea(self):
+        with self.assertRaises(ValueError):
+            self.SaleOrder._ingerir_pedido_cocina(self._vals(False))
+
+    @mute_logger('odoo.sql_db')
+    def test_conflicto_visible_tras_el_insert_devuelve_el_existente(self):
+        """El pedido concurrente no se vio antes del insert pero sí después del conflicto"""
+        pedido, _creado = self.SaleOrder._ingerir_pedido_cocina(self._vals('7-002'))
+        buscar = type(self.SaleOrder)._buscar_por_referencia_cocina
+        llamadas = []
+
+        def buscar_tras_conflicto(modelo, referencia, solo_activos=False):
+            llamadas.append(referencia)
+            return modelo.browse() if len(llamadas) == 1 else buscar(modelo, referencia, solo_activos)
+
+        with patch.object(type(self.SaleOrder), '_buscar_por_referencia_cocina', buscar_tras_conflicto):
+            existente, creado = self.SaleOrder._ingerir_pedido_cocina(self._vals('7-002'))
+        self.assertFalse(creado)
+        self.assertEqual(existente, pedido)
+
+    @mute_logger('odoo.sql_db')
+    def test_conflicto_invisible_pide_reintento(self):
+        """Si el pedido concurrente sigue invisible en la instantánea, Odoo debe reintentar"""
+        self.SaleOrder._ingerir_pedido_cocina(self._vals('7-003'))
+        with patch.object(type(self.SaleOrder), '_buscar_por_referencia_cocina', lambda modelo, *args, **kwargs: modelo.browse()):
+            with self.assertRaises(pg_errors.SerializationFailure):
+                self.SaleOrder._ingerir_pedido_cocina(self._vals('7-003'))
+
+    def test_error_de_serializacion_llega_al_reintento(self):
+        """``enviar_orden_dashboard`` no convierte el conflicto en un ``False``"""
+        config = self.env['pos.config'].create({'name': 'Caja Ingesta'})
+        sesion = self.env['pos.session'].create({'config_id': config.id, 'user_id': self.env.uid})
+        pedido_pos = self.env['pos.order'].create({
+            'session_id': sesion.id,
+            'amount_tax': 0.0,
+            'amount_total': 0.0,
+            'amount_paid': 0.0,
+            'amount_return': 0.0,
+        })
+        conflicto = pg_errors.SerializationFailure('concurrente')
+        with patch.object(type(pedido_pos), 'action_enviar_a_cocina', side_effect=conflicto):
+            with self.assertRaises(pg_errors.SerializationFailure):
+                self.env['pos.order'].enviar_orden_dashboard(pedido_pos.id)
+
+
+@tagged('post_install', '-at_install')
+class TestIngestaCocinaConcurrente(BaseCase):
+    """Envíos simultáneos de la misma referencia en transacciones reales.
+
+    Cada envío usa su propia conexión y confirma (sin el cursor de prueba, que
+    serializa las transacciones); los datos creados se eliminan al terminar.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.dbname = get_db_name()
+        with self._cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            self.cliente_id = env['res.partner'].create({'name': 'Cliente concurrente'}).id
+        self.addCleanup(self._limpiar)
+
+    def _cursor(self):
+        return sql_db.db_connect(self.dbname).cursor()
+
+    def _limpiar(self):
+        with self._cursor() as cr:
+            env = api.Environment(cr, SUPERUSER_ID, {})
+            pedidos = env['sale.order'].search([('referencia_cocina', 'like', 'concurrente-%')])
+            pedidos.unlink()
+            env['tu_pedido.baja.cocina'].search([('modelo', '=', 'sale.order'), ('pedido_id', 'in', pedidos.ids)]).unlink()
+            env['res.partner'].browse(self.cliente_id).unlink()
+
+    def _enviar(self, referencia, barrera):
+        """Un envío como lo haría una petición: reintenta ante errores de serialización"""
+        barrera.wait()
+        for _intento in range(REINTENTOS_ENVIO):
+            with self._cursor() as cr:
+                env = api.Environment(cr, SUPERUSER_ID, {})
+                try:
+                    pedido, creado = env['sale.order']._ingerir_pedido_cocina({
+                        'partner_id': self.cliente_id, 'referencia_cocina': referencia,
+                    })
+                    cr.commit()
+                    return pedido.id, creado
+                except pg_errors.SerializationFailure:
+                    cr.rollback()
+        raise AssertionError(f"{referencia}: sin resultado tras {REINTENTOS_ENVIO} intentos")
+
+    @mute_logger('odoo.sql_db')
+    def test_envios_simultaneos_crean_un_solo_pedido(self):
+        referencia = 'concurrente-001'
+        barrera = threading.Barrier(ENVIOS_CONCURRENTES)
+        with ThreadPoolExecutor(max_workers=ENVIOS_CONCURRENTES) as ejecutor:
+            resultados = list(ejecutor.map(
+                lambda _i: self._enviar(referencia, barrera), range(ENVIOS_CONCURRENTES)
+            ))
+
+        self.assertEqual(len({pedido_id for pedido_id, _creado in resultados}), 1)
+        self.assertEqual(sum(creado for _pedido_id, creado in resultados), 1)
+        with self._cursor() as cr:
+            cr.execute("SELECT count(*) FROM sale_order WHERE referencia_cocina = %s", [referencia])
+            self.assertEqual(cr.fetchone()[0], 1)
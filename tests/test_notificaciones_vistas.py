@@ -0,0 +1,54 @@
+from odoo.tests import TransactionCase, tagged
+
+
+@tagged('post_install', '-at_install')
+class TestNotificacionesVistas(TransactionCase):
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        cls.website = cls.env['website'].search([], limit=1) or cls.env['website'].create({'name': 'Tienda'})
+        cls.cliente = cls.env['res.partner'].create({'name': 'Cliente Web'})
+        cls.producto = cls.env['product.product'].create({'name': 'Hamburguesa', 'list_price': 10.0})
+        config = cls.env['pos.config'].create({'name': 'Caja Notificaciones'})
+        cls.sesion = cls.env['pos.session'].create({'config_id': config.id, 'user_id': cls.env.uid})
+        cls.Serializer = cls.env['tu_pedido.dashboard.serializer']
+
+    def _carrito(self):
+        return self.env['sale.order'].create({
+            'partner_id': self.cliente.id,
+            'website_id': self.website.id,
+            'order_line': [(0, 0, {'product_id': self.producto.id, 'product_uom_qty': 1})],
+        })
+
+    def _vistos_en_feed(self, *pedidos):
+        return {
+            fila['id']: fila['visto'] for fila in self.Serializer.feed_pos(self.sesion.id)['web']
+            if fila['id'] in pedidos
+        }
+
+    def test_carrito_antiguo_confirmado_despues_no_figura_visto(self):
+        """Un carrito más antiguo confirmado después de otro ya visto sigue siendo nuevo"""
+        carrito_antiguo = self._carrito()
+        carrito_nuevo = self._carrito()
+        self.assertLess(carrito_antiguo.id, carrito_nuevo.id)
+
+        pedidos = (carrito_antiguo.id, carrito_nuevo.id)
+
+        carrito_nuevo.action_confirm()
+        self.assertEqual(self._vistos_en_feed(*pedidos), {carrito_nuevo.id: False})
+        self.env['tu_pedido.notificacion.vista']._confirmar_vistos(self.sesion.id, [carrito_nuevo.id])
+        self.assertEqual(self._vistos_en_feed(*pedidos), {carrito_nuevo.id: True})
+
+        carrito_antiguo.action_confirm()
+        self.assertEqual(self._vistos_en_feed(*pedidos), {carrito_nuevo.id: True, carrito_antiguo.id: False})
+
+    def test_confirmar_vistos_es_por_sesion_e_idempotente(self):
+        pedido = self._carrito()
+        pedido.action_confirm()
+        Vista = self.env['tu_pedido.notificacion.vista']
+        self.assertEqual(Vista._confirmar_vistos(self.sesion.id, [pedido.id]), [pedido.id])
+        self.assertEqual(Vista._confirmar_vistos(self.sesion.id, [pedido.id]), [pedido.id])
+        self.assertEqual(Vista.search_count([('session_id', '=', self.sesion.id)]), 1)
+        # Sin sesión no hay nada visto
+        self.assertFalse(any(fila['visto'] for fila in self.Serializer.feed_pos()['web'] if fila['id'] == pedido.id))
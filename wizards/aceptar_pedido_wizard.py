@@ -1,4 +1,5 @@
 from odoo import models, fields, api
+from odoo.exceptions import UserError
 
 class AceptarPedidoWizard(models.TransientModel):
     _name = 'tu_pedido_v2.aceptar_pedido_wizard'
@@ -21,13 +22,11 @@ class AceptarPedidoWizard(models.TransientModel):
                 record.direccion_entrega = ''
 
     def action_aceptar(self):
-        self.order_id.write({
-            'estado_rapido': 'aceptado',
+        if not self.order_id.action_cambiar_estado('aceptado', {
             'tiempo_estimado_entrega': self.tiempo_estimado,
-            'tiempo_inicio_estado': fields.Datetime.now(),
-            'sonido_activo': False,
             'nota_cocina': self.notas_adicionales or self.order_id.nota_cocina
-        })
+        }):
+            raise UserError(f"No se pudo aceptar el pedido {self.order_id.name}")
         return {'type': 'ir.actions.act_window_close'}
 
 
@@ -39,11 +38,10 @@ class RechazarPedidoWizard(models.TransientModel):
     motivo_rechazo = fields.Text(string='Motivo del rechazo', required=True)
 
     def action_rechazar(self):
-        self.order_id.write({
-            'estado_rapido': 'rechazado',
+        if not self.order_id.action_cambiar_estado('rechazado', {
             'motivo_rechazo': self.motivo_rechazo,
-            'tiempo_inicio_estado': fields.Datetime.now(),
             'sonido_activo': False
-        })
+        }):
+            raise UserError(f"No se pudo rechazar el pedido {self.order_id.name}")
         self.order_id.action_cancel()
         return {'type': 'ir.actions.act_window_close'}
\ No newline at end of file